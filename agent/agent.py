@@ -1,7 +1,11 @@
+import time
+# Time-to-first-verification is measured from here, before the heavy imports
+STARTED_AT = time.monotonic()
+
 from dotenv import load_dotenv
 load_dotenv()
 
-import os, requests, json, base64
+import os, threading, asyncio
 from web3 import Web3
 from uagents import Context, Protocol, Agent
 from uagents_core.contrib.protocols.chat import (
@@ -11,22 +15,29 @@ from uagents_core.contrib.protocols.chat import (
     TextContent,
     chat_protocol_spec,
 )
-from openai import OpenAI
 from datetime import datetime
 from uuid import uuid4
+from state import AgentState
+from pipeline import JobDeferred, Stage, VerificationJob
+from transactions import TransactionManager
+from multicall import Multicall, MULTICALL3_ABI, MULTICALL3_ADDRESS, call_many
+from events import LogPoller
+from rpc_metrics import rpc_metrics_middleware
+from profiling import StackSampler, routes as sampling_routes
+from shards import ShardPool
+# Verification stages and settings, and the stores shared with shard workers
+import verification
+from verification import (
+    VerificationResult, VECTOR_STORE_BACKEND, TILED_INDEX, VERIFY_QUEUE_SIZE, VERIFY_DEADLINE,
+    build_pipeline, ensure_qdrant_collection, fetch_image, embed_image, embed_image_crops,
+)
+import metrics
 
 
 # ============================================================================
 # ABI Definitions
 # ============================================================================
 
-# VerificationResult enum values (matching the Solidity enum)
-class VerificationResult:
-    NONE = 0
-    VERIFIED = 1
-    MODIFIED = 2
-    NOT_VERIFIED = 3
-
 # OrderType enum values (matching the Solidity enum)
 class OrderType:
     NONE = 0
@@ -68,71 +79,6 @@ ERC20_ABI = [
 # Legacy compatibility - for code that uses REALIA_ABI
 REALIA_ABI = REALIA_FACTORY_ABI
 
-# ============================================================================
-# Qdrant Functions
-# ============================================================================
-
-def ensure_qdrant_collection():
-    BASE_URL = os.getenv("QDRANT_BASE_URL")
-    QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-    r = requests.get(f"{BASE_URL}/collections/realia", headers={"api-key": QDRANT_API_KEY})
-    if r.status_code != 200:
-        payload = {"vectors": {"size": 512, "distance": "Cosine"}}
-        res = requests.put(f"{BASE_URL}/collections/realia", headers={"Content-Type": "application/json", "api-key": QDRANT_API_KEY}, data=json.dumps(payload))
-        return "created"
-    else:
-        return "already exists"
-
-def create_point(id, vector, payload=None):
-    BASE_URL = os.getenv("QDRANT_BASE_URL")
-    QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-    data = {"points": [{"id": id, "vector": vector, "payload": payload or {}}]}
-    r = requests.put(f"{BASE_URL}/collections/realia/points",
-                     headers={"Content-Type": "application/json", "api-key": QDRANT_API_KEY},
-                     data=json.dumps(data))
-    return r.json()
-
-def search_points(vector, limit=5):
-    BASE_URL = os.getenv("QDRANT_BASE_URL")
-    QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-    data = {"vector": vector, "limit": limit}
-    r = requests.post(f"{BASE_URL}/collections/realia/points/search",
-                      headers={"Content-Type": "application/json", "api-key": QDRANT_API_KEY},
-                      data=json.dumps(data))
-    return r.json()
-
-def ipfs_to_https(uri):
-    if uri.startswith("ipfs://"):
-        return uri.replace("ipfs://", "https://ipfs.io/ipfs/")
-    return uri
-
-def get_embeddings(uri):
-    EMBEDDING_URL = os.getenv("EMBEDDING_URL")
-    r = requests.get(ipfs_to_https(uri))
-    imageLink = r.json()["image"]
-    r = requests.get(ipfs_to_https(imageLink))
-    b64 = base64.b64encode(r.content).decode("utf-8")
-    payload = {"image": b64}
-    r = requests.post(EMBEDDING_URL, json=payload)
-    embedding = r.json()["embedding"]
-    return embedding
-
-def get_point_count():
-    BASE_URL = os.getenv("QDRANT_BASE_URL")
-    QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-    r = requests.get(f"{BASE_URL}/collections/realia",
-                     headers={"api-key": QDRANT_API_KEY})
-    if r.status_code == 200:
-        return r.json()["result"]["points_count"]
-    return 0
-
-def point_exists(point_id):
-    BASE_URL = os.getenv("QDRANT_BASE_URL")
-    QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-    r = requests.get(f"{BASE_URL}/collections/realia/points/{point_id}",
-                     headers={"api-key": QDRANT_API_KEY})
-    return r.status_code == 200
-
 # ============================================================================
 # Agent Setup
 # ============================================================================
@@ -140,29 +86,123 @@ ALCHEMY_API_KEY = os.getenv("ALCHEMY_API_KEY")
 FACTORY_ADDRESS = os.getenv("REALIA_FACTORY_CONTRACT_ADDRESS")
 NFT_ADDRESS = os.getenv("REALIA_NFT_CONTRACT_ADDRESS")
 WALLET_SEED = os.getenv("WALLET_SEED")
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-QDRANT_BASE_URL = os.getenv("QDRANT_BASE_URL")
-EMBEDDING_URL = os.getenv("EMBEDDING_URL")
 WALLET_PRIVATE_KEY = os.getenv("WALLET_PRIVATE_KEY")
 ASI_ONE_API_KEY = os.getenv("ASI_ONE_API_KEY")
+AGENT_STATE_PATH = os.getenv("AGENT_STATE_PATH", ".cache/agent_state.json")
+# "incremental" indexes only tokens minted since the last sync, "full" rescans every tick
+NFT_SYNC_MODE = os.getenv("NFT_SYNC_MODE", "incremental")
+NFT_RECONCILE_PERIOD = float(os.getenv("NFT_RECONCILE_PERIOD", "600"))
+# Tokens indexed between watermark updates, so an interrupted backfill resumes where it stopped
+NFT_SYNC_CHUNK = int(os.getenv("NFT_SYNC_CHUNK", "100"))
+# A token that fails to index this many times (dead metadata, oversized image) is
+# skipped so it cannot hold back the watermark; reconciliations still retry it
+NFT_INDEX_MAX_ATTEMPTS = int(os.getenv("NFT_INDEX_MAX_ATTEMPTS", "5"))
+# Warm start: trust the registration cached in AGENT_STATE_PATH and re-check it in
+# the background, and skip the startup reconciliation if the last one is recent
+WARM_START = os.getenv("WARM_START", "true").lower() == "true"
+# Optional LocalVectorStore snapshot loaded into an empty local index at startup
+LOCAL_INDEX_SNAPSHOT = os.getenv("LOCAL_INDEX_SNAPSHOT", "")
+# Parallel response transactions; the other pipeline settings are in verification.py
+VERIFY_SUBMIT_CONCURRENCY = int(os.getenv("VERIFY_SUBMIT_CONCURRENCY", "4"))
+# Verification shard processes (0: verify in the agent process); see shards.py
+VERIFY_WORKERS = int(os.getenv("VERIFY_WORKERS", "0"))
+# Transactions: responses queued within TX_BATCH_WAIT_MS are broadcast in one JSON-RPC batch
+TX_BATCH_SIZE = int(os.getenv("TX_BATCH_SIZE", "1"))
+TX_BATCH_WAIT_MS = float(os.getenv("TX_BATCH_WAIT_MS", "50"))
+TX_BUMP_AFTER = float(os.getenv("TX_BUMP_AFTER", "60"))
+# Set to an empty string to fall back to one hasAgentResponded call per request
+MULTICALL_ADDRESS = os.getenv("MULTICALL_ADDRESS", MULTICALL3_ADDRESS)
+# "events" follows VerificationRequested logs and only runs the full
+# syncPendingVerifications scan every VERIFICATION_RECONCILE_PERIOD seconds;
+# "poll" scans syncPendingVerifications every 5 seconds
+VERIFICATION_INTAKE = os.getenv("VERIFICATION_INTAKE", "events")
+VERIFICATION_RECONCILE_PERIOD = float(os.getenv("VERIFICATION_RECONCILE_PERIOD", "60"))
+EVENT_POLL_PERIOD = float(os.getenv("EVENT_POLL_PERIOD", "2"))
+EVENT_CONFIRMATIONS = int(os.getenv("EVENT_CONFIRMATIONS", "20"))
+# Prometheus /metrics (and the /debug/sampling profiler switches) next to the uAgents server on 8001; 0 disables
+METRICS_PORT = int(os.getenv("METRICS_PORT", "8002"))
+# Loopback only by default; set 0.0.0.0 for a remote Prometheus
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# The /debug/sampling switches are unauthenticated, so they are only served on a
+# loopback METRICS_HOST unless explicitly enabled
+PROFILE_ROUTES = os.getenv(
+    "PROFILE_ROUTES", str(METRICS_HOST in ("127.0.0.1", "localhost", "::1"))
+).lower() == "true"
+# Start the stack sampler at boot instead of waiting for /debug/sampling/start
+PROFILE_SAMPLING = os.getenv("PROFILE_SAMPLING", "false").lower() == "true"
+PROFILE_SAMPLING_INTERVAL = float(os.getenv("PROFILE_SAMPLING_INTERVAL", "0.01"))
 
 w3 = Web3(Web3.HTTPProvider(f"https://arb-sepolia.g.alchemy.com/v2/{ALCHEMY_API_KEY}"))
+# Counts RPC calls per method and per contract function (rpc_requests_total)
+w3.middleware_onion.add(rpc_metrics_middleware(REALIA_FACTORY_ABI, REALIA_NFT_ABI, ERC20_ABI, MULTICALL3_ABI))
 factory_contract = w3.eth.contract(address=FACTORY_ADDRESS, abi=REALIA_FACTORY_ABI)
 nft_contract = w3.eth.contract(address=NFT_ADDRESS, abi=REALIA_NFT_ABI)
+multicall = Multicall(w3, MULTICALL_ADDRESS) if MULTICALL_ADDRESS else None
 
 # Setup agent wallet
 agent_account = w3.eth.account.from_key(WALLET_PRIVATE_KEY)
 AGENT_EVM_ADDRESS = agent_account.address
+tx_manager = TransactionManager(
+    w3, agent_account,
+    batch_size=TX_BATCH_SIZE, batch_wait_ms=TX_BATCH_WAIT_MS, bump_after=TX_BUMP_AFTER,
+)
+# Request ids whose response transaction has been sent but not yet mined
+awaiting_receipt = set()
 
 # --- Agent Setup ---
 agent = Agent(name="realia_agent", seed=WALLET_SEED, port=8001)
 subject_matter = "the sun"
-client = OpenAI(
-    base_url='https://api.asi1.ai/v1',
-    api_key=ASI_ONE_API_KEY,
-)
+client = None
+
+def chat_client():
+    """The ASI:One client, created (and openai imported) on the first chat message"""
+    global client
+    if client is None:
+        from openai import OpenAI
+        client = OpenAI(
+            base_url='https://api.asi1.ai/v1',
+            api_key=ASI_ONE_API_KEY,
+        )
+    return client
 
 protocol = Protocol(spec=chat_protocol_spec)
+agent_state = AgentState(AGENT_STATE_PATH)
+sampler = StackSampler(PROFILE_SAMPLING_INTERVAL)
+# Request ids this agent is known to have answered on-chain, persisted across restarts
+answered_requests = set(agent_state.get("answered_request_ids", []))
+answered_lock = threading.Lock()  # receipts are recorded from the transaction tracker thread
+verification_events = LogPoller(
+    w3, factory_contract, ["VerificationRequested", "VerificationResponseByAgent"],
+    agent_state, "verification_events_block", confirmations=EVENT_CONFIRMATIONS,
+)
+# Set once every minted NFT is indexed; until then only VERIFIED answers are sent
+index_ready = threading.Event()
+# Incremental sync and reconciliation run in worker threads; never both at once
+nft_sync_lock = threading.Lock()
+# Acquired (and never released) by the first response sent
+first_verification = threading.Lock()
+
+def registration_key(ctx: Context):
+    return {"factory": FACTORY_ADDRESS, "evm_address": AGENT_EVM_ADDRESS, "agent_address": ctx.agent.address}
+
+def remember_registration(ctx: Context):
+    agent_state.set("registration", registration_key(ctx))
+
+def cached_registration(ctx: Context):
+    """True if this agent was registered with its current address on a previous run"""
+    return agent_state.get("registration") == registration_key(ctx)
+
+def contract_constants():
+    """MIN_AGENT_STAKING and the PYUSD address, read from the factory once and cached"""
+    constants = agent_state.get("contract_constants", {})
+    if constants.get("factory") != FACTORY_ADDRESS:
+        constants = {
+            "factory": FACTORY_ADDRESS,
+            "min_staking": factory_contract.functions.MIN_AGENT_STAKING().call(),
+            "pyusd": factory_contract.functions.PYUSD().call(),
+        }
+        agent_state.set("contract_constants", constants)
+    return constants["min_staking"], constants["pyusd"]
 
 async def check_and_register_agent(ctx: Context):
     """Check if agent is registered, if not attempt to register"""
@@ -183,27 +223,23 @@ async def check_and_register_agent(ctx: Context):
             # Check if agent address needs to be updated
             if registered_agent_address != current_agent_address:
                 ctx.logger.warning(f"Agent address mismatch! Updating...")
-                update_tx = factory_contract.functions.updateAgentAddress(current_agent_address).build_transaction({
-                    'from': AGENT_EVM_ADDRESS,
-                    'nonce': w3.eth.get_transaction_count(AGENT_EVM_ADDRESS)
-                })
-                signed_update = agent_account.sign_transaction(update_tx)
-                update_hash = w3.eth.send_raw_transaction(signed_update.rawTransaction)
-                update_receipt = w3.eth.wait_for_transaction_receipt(update_hash)
+                update_receipt = tx_manager.transact(
+                    factory_contract.functions.updateAgentAddress(current_agent_address), "updateAgentAddress")
+                update_hash = update_receipt['transactionHash']
                 
                 if update_receipt['status'] != 1:
-                    raise Exception(f"Update agent address transaction failed! TX: {update_hash.hex()}")
+                    raise Exception(f"Update agent address transaction failed! TX: {update_hash}")
                 
-                ctx.logger.info(f"✓ Agent address updated! TX: {update_hash.hex()}")
+                ctx.logger.info(f"✓ Agent address updated! TX: {update_hash}")
             
+            remember_registration(ctx)
             return True
         
         ctx.logger.warning(f"Agent not registered: {AGENT_EVM_ADDRESS}")
         ctx.logger.info("Attempting to register agent...")
         
         # Get contract constants
-        min_staking = factory_contract.functions.MIN_AGENT_STAKING().call()
-        pyusd_address = factory_contract.functions.PYUSD().call()
+        min_staking, pyusd_address = contract_constants()
         
         # Create PYUSD contract instance
         pyusd_contract = w3.eth.contract(address=pyusd_address, abi=ERC20_ABI)
@@ -220,44 +256,36 @@ async def check_and_register_agent(ctx: Context):
         
         # Approve PYUSD for contract
         ctx.logger.info("Approving PYUSD for contract...")
-        approve_tx = pyusd_contract.functions.approve(FACTORY_ADDRESS, min_staking).build_transaction({
-            'from': AGENT_EVM_ADDRESS,
-            'nonce': w3.eth.get_transaction_count(AGENT_EVM_ADDRESS)
-        })
-        signed_approve = agent_account.sign_transaction(approve_tx)
-        approve_hash = w3.eth.send_raw_transaction(signed_approve.rawTransaction)
-        approve_receipt = w3.eth.wait_for_transaction_receipt(approve_hash)
+        approve_receipt = tx_manager.transact(
+            pyusd_contract.functions.approve(FACTORY_ADDRESS, min_staking), "approve")
+        approve_hash = approve_receipt['transactionHash']
         
         if approve_receipt['status'] != 1:
-            raise Exception(f"Approval transaction failed! TX: {approve_hash.hex()}")
+            raise Exception(f"Approval transaction failed! TX: {approve_hash}")
         
-        ctx.logger.info(f"✓ Approval transaction: {approve_hash.hex()}")
+        ctx.logger.info(f"✓ Approval transaction: {approve_hash}")
         
         # Register agent
         ctx.logger.info("Registering agent...")
         ctx.logger.info(f"Agent address to register: {ctx.agent.address}")
         
-        register_tx = factory_contract.functions.registerAgent(ctx.agent.address).build_transaction({
-            'from': AGENT_EVM_ADDRESS,
-            'nonce': w3.eth.get_transaction_count(AGENT_EVM_ADDRESS)
-        })
+        register = tx_manager.submit(factory_contract.functions.registerAgent(ctx.agent.address), "registerAgent")
+        register_hash = register.sent.result(timeout=120)
         
-        ctx.logger.info(f"Transaction details: gas={register_tx.get('gas')}, gasPrice={register_tx.get('gasPrice')}")
-        
-        signed_register = agent_account.sign_transaction(register_tx)
-        register_hash = w3.eth.send_raw_transaction(signed_register.rawTransaction)
-        ctx.logger.info(f"Transaction sent: {register_hash.hex()}")
+        ctx.logger.info(f"Transaction details: gas={register.tx.get('gas')}, gasPrice={register.tx.get('gasPrice')}")
+        ctx.logger.info(f"Transaction sent: {register_hash}")
         ctx.logger.info("Waiting for confirmation...")
         
-        register_receipt = w3.eth.wait_for_transaction_receipt(register_hash, timeout=120)
+        register_receipt = register.receipt.result(timeout=120)
         
         if register_receipt['status'] != 1:
-            ctx.logger.error(f"Registration transaction reverted! TX: {register_hash.hex()}")
+            ctx.logger.error(f"Registration transaction reverted! TX: {register_hash}")
             ctx.logger.error(f"Receipt: {register_receipt}")
-            raise Exception(f"Registration transaction failed! Check transaction: {register_hash.hex()}")
+            raise Exception(f"Registration transaction failed! Check transaction: {register_hash}")
         
-        ctx.logger.info(f"✓ Registration transaction: {register_hash.hex()}")
+        ctx.logger.info(f"✓ Registration transaction: {register_hash}")
         ctx.logger.info(f"🎉 Agent successfully registered!")
+        remember_registration(ctx)
         
         return True
         
@@ -268,107 +296,151 @@ async def check_and_register_agent(ctx: Context):
         ctx.logger.error(f"Failed to check/register agent: {e}")
         raise e
 
-@agent.on_interval(period=5)
-async def sync_verification_requests(ctx: Context):
-    """Poll for pending verification requests every 5 seconds using syncPendingVerifications"""
-    processed_requests = set()  # Track which requests we've already processed locally
+# ============================================================================
+# Verification Responses
+# ============================================================================
+
+def submit_stage(job: VerificationJob):
+    if job.result != VerificationResult.VERIFIED and not index_ready.is_set():
+        # The real match may be among the NFTs not indexed yet
+        raise JobDeferred("NFT index backfill in progress")
+    
+    response = submit_response(job.request_id, job.result, job.matched_token_id, job.logger)
+    response.sent.result()
+
+def submit_response(request_id, result, matched_token_id, logger):
+    """Queue the responseVerification transaction; the receipt is tracked in the background"""
+    result_name = ["NONE", "VERIFIED", "MODIFIED", "NOT_VERIFIED"][result]
+    logger.info(f"Submitting response for #{request_id}: result={result_name}, tokenId={matched_token_id}")
+    
+    def on_sent(future):
+        if future.exception() is not None:
+            return
+        logger.info(f"Transaction sent: {future.result()}")
+        if first_verification.acquire(blocking=False):
+            elapsed = time.monotonic() - STARTED_AT
+            metrics.gauge("time_to_first_verification_seconds").set(elapsed)
+            logger.info(f"⏱️ First verification answered {elapsed:.2f}s after startup")
+    
+    def on_receipt(future):
+        # Stay known (awaiting_receipt) until answered_requests has the request, so intake cannot re-enqueue it
+        try:
+            response_receipt = future.result()
+            if response_receipt['status'] != 1:
+                logger.error(f"Verification response transaction reverted! TX: {response_receipt['transactionHash']}")
+            else:
+                mark_answered([request_id])
+                logger.info(f"🎉 Verification #{request_id} completed successfully!")
+        except Exception as e:
+            logger.error(f"Verification response for #{request_id} failed: {e}")
+        finally:
+            awaiting_receipt.discard(request_id)
     
+    awaiting_receipt.add(request_id)
+    response = tx_manager.submit(
+        factory_contract.functions.responseVerification(request_id, result, matched_token_id),
+        f"responseVerification #{request_id}",
+        on_receipt,
+    )
+    response.sent.add_done_callback(on_sent)
+    return response
+
+verification_pipeline = build_pipeline(
+    Stage("submit", submit_stage, VERIFY_SUBMIT_CONCURRENCY, enforce_deadline=False)
+)
+# Coordinator side of VERIFY_WORKERS shard processes (None: verify in this process)
+shard_pool = None
+
+def handle_shard_result(request_id, result, matched_token_id):
+    """Submit a shard worker's decision unless the request is already answered or being answered"""
+    logger = shard_pool.logger
+    with answered_lock:
+        if request_id in answered_requests or request_id in awaiting_receipt:
+            return
+        if result != VerificationResult.VERIFIED and not index_ready.is_set():
+            logger.info(f"Verification #{request_id} deferred: NFT index backfill in progress")
+            return
+        submit_response(request_id, result, matched_token_id, logger)
+
+if VERIFY_WORKERS:
+    shard_pool = ShardPool(VERIFY_WORKERS, handle_shard_result, queue_size=VERIFY_QUEUE_SIZE)
+
+def mark_answered(request_ids):
+    with answered_lock:
+        answered_requests.update(request_ids)
+        agent_state.set("answered_request_ids", sorted(answered_requests))
+
+def prune_answered(pending_ids):
+    """Forget answered requests that are no longer pending so the index stays small"""
+    with answered_lock:
+        stale = answered_requests - set(pending_ids)
+        if stale:
+            answered_requests.difference_update(stale)
+            agent_state.set("answered_request_ids", sorted(answered_requests))
+
+def has_responded_many(request_ids):
+    """Return hasAgentResponded for each request id, in one eth_call when Multicall3 is available"""
+    calls = [factory_contract.functions.hasAgentResponded(request_id, AGENT_EVM_ADDRESS) for request_id in request_ids]
+    return call_many(multicall, calls)
+
+def is_known_request(request_id):
+    """True if the request is answered, being processed or awaiting its receipt"""
+    with answered_lock:
+        if request_id in answered_requests:
+            return True
+    if shard_pool is not None and request_id in shard_pool.in_flight:
+        return True
+    return request_id in verification_pipeline.in_flight or request_id in awaiting_receipt
+
+def enqueue_verification(ctx: Context, request_id, uri, user, response_count):
+    """Hand a verification request to the pipeline (or its shard worker); returns False if it is full"""
+    if shard_pool is not None:
+        accepted = shard_pool.dispatch(request_id, uri)
+    else:
+        accepted = verification_pipeline.try_submit(VerificationJob(request_id, uri, VERIFY_DEADLINE, ctx.logger))
+    if not accepted:
+        ctx.logger.warning("Verification pipeline is full, deferring remaining requests")
+        return False
+    ctx.logger.info(f"🔍 Found pending verification request! ID: {request_id}, User: {user}, Responses: {response_count}/5")
+    return True
+
+@agent.on_interval(period=5 if VERIFICATION_INTAKE == "poll" else VERIFICATION_RECONCILE_PERIOD)
+@metrics.timed("sync_tick_seconds", task="verification_requests")
+async def sync_verification_requests(ctx: Context):
+    """Scan all pending verification requests and feed unanswered ones to the pipeline.
+
+    In "events" intake mode this is the slow catch-up path for anything the log
+    poller missed (e.g. requests made while the agent was offline).
+    """
     try:
             # Call syncPendingVerifications to get all pending verifications
-            pending_count, request_ids, users, uris, response_counts = factory_contract.functions.syncPendingVerifications().call()
+            # (RPC calls run in a thread so they do not stall the event loop)
+            pending_count, request_ids, users, uris, response_counts = await asyncio.to_thread(
+                factory_contract.functions.syncPendingVerifications().call
+            )
+            metrics.gauge("verification_pending_requests").set(pending_count)
+            prune_answered(request_ids)
             
             if pending_count > 0:
                 ctx.logger.info(f"Syncing pending verification request(s) from contract")
                 
+                # Skip requests that are already answered, being processed or awaiting their receipt
+                candidates = [i for i in range(pending_count) if not is_known_request(request_ids[i])]
+                
+                # Check which of them this agent has already responded to on-chain
+                responded = await asyncio.to_thread(has_responded_many, [request_ids[i] for i in candidates]) if candidates else []
+                already_answered = [request_ids[i] for i, has_responded in zip(candidates, responded) if has_responded]
+                if already_answered:
+                    mark_answered(already_answered)
+                metrics.gauge("verification_unanswered_requests").set(len(candidates) - len(already_answered))
+                
                 new_pending = 0
-                for i in range(pending_count):
-                    request_id = request_ids[i]
-                    user = users[i]
-                    uri = uris[i]
-                    response_count = response_counts[i]
-                    
-                    # Check if we've already processed this request locally
-                    if request_id in processed_requests:
+                for i, has_responded in zip(candidates, responded):
+                    if has_responded:
                         continue
-                    
-                    # Check if this agent has already responded on-chain
-                    has_responded = factory_contract.functions.hasAgentResponded(request_id, AGENT_EVM_ADDRESS).call()
-                    
-                    if not has_responded:
-                        ctx.logger.info(f"🔍 Found pending verification request! ID: {request_id}, User: {user}, Responses: {response_count}/5")
-                        new_pending += 1
-                        
-                        # Mark as being processed locally
-                        processed_requests.add(request_id)
-                        
-                        # Handle verification inline
-                        try:
-                            ctx.logger.info(f"Verification URI: {uri}")
-                            
-                            # Get embedding for the verification image
-                            ctx.logger.info("Generating embedding for verification image...")
-                            verification_embedding = get_embeddings(uri)
-                            ctx.logger.info("✓ Embedding generated")
-                            
-                            # Search Qdrant for similar NFTs
-                            ctx.logger.info("Searching for matching NFTs...")
-                            search_response = search_points(verification_embedding, limit=5)
-                            search_results = search_response.get("result", []) if isinstance(search_response, dict) else []
-                            
-                            if not search_results or len(search_results) == 0:
-                                ctx.logger.warning("No matching NFTs found. Responding with NOT_VERIFIED")
-                                verification_result = VerificationResult.NOT_VERIFIED
-                                matched_token_id = 0
-                            else:
-                                # Get the best match
-                                best_match = search_results[0]
-                                similarity_score = best_match.get("score", 0)
-                                matched_token_id = best_match.get("payload", {}).get("tokenId", 0)
-                                
-                                ctx.logger.info(f"Search results: {len(search_results)} matches found")
-                                
-                                ctx.logger.info(f"Best match: NFT #{matched_token_id}, Similarity: {similarity_score:.4f}")
-                                
-                                # Thresholds for verification
-                                VERIFIED_THRESHOLD = 0.95
-                                MODIFIED_THRESHOLD = 0.75
-                                
-                                if similarity_score >= VERIFIED_THRESHOLD:
-                                    verification_result = VerificationResult.VERIFIED
-                                    ctx.logger.info(f"✓ VERIFIED! Exact match with NFT #{matched_token_id}")
-                                elif similarity_score >= MODIFIED_THRESHOLD:
-                                    verification_result = VerificationResult.MODIFIED
-                                    ctx.logger.info(f"⚠ MODIFIED! Similar to NFT #{matched_token_id} but with modifications")
-                                else:
-                                    verification_result = VerificationResult.NOT_VERIFIED
-                                    matched_token_id = 0
-                                    ctx.logger.info(f"✗ NOT_VERIFIED. Similarity too low.")
-                            
-                            # Submit verification response to blockchain
-                            result_name = ["NONE", "VERIFIED", "MODIFIED", "NOT_VERIFIED"][verification_result]
-                            ctx.logger.info(f"Submitting response: result={result_name}, tokenId={matched_token_id}")
-                            
-                            response_tx = factory_contract.functions.responseVerification(
-                                request_id,
-                                verification_result,
-                                matched_token_id
-                            ).build_transaction({
-                                'from': AGENT_EVM_ADDRESS,
-                                'nonce': w3.eth.get_transaction_count(AGENT_EVM_ADDRESS)
-                            })
-                            
-                            signed_response = agent_account.sign_transaction(response_tx)
-                            response_hash = w3.eth.send_raw_transaction(signed_response.rawTransaction)
-                            ctx.logger.info(f"Transaction sent: {response_hash.hex()}")
-                            
-                            response_receipt = w3.eth.wait_for_transaction_receipt(response_hash)
-                            
-                            if response_receipt['status'] != 1:
-                                ctx.logger.error(f"Verification response transaction reverted! TX: {response_hash.hex()}")
-                            else:
-                                ctx.logger.info(f"🎉 Verification #{request_id} completed successfully!")
-                        except Exception as e:
-                            ctx.logger.error(f"Failed to handle verification #{request_id}: {e}")
+                    if not enqueue_verification(ctx, request_ids[i], uris[i], users[i], response_counts[i]):
+                        break
+                    new_pending += 1
                 
                 if new_pending > 0:
                     ctx.logger.info(f"Processing {new_pending} new verification request(s)")
@@ -376,42 +448,228 @@ async def sync_verification_requests(ctx: Context):
     except Exception as e:
         ctx.logger.error(f"Error polling for verification requests: {e}")
 
+@agent.on_interval(period=EVENT_POLL_PERIOD)
+@metrics.timed("sync_tick_seconds", task="verification_events")
+async def process_verification_events(ctx: Context):
+    """Pick up new verification requests from VerificationRequested logs as soon as they are mined"""
+    if VERIFICATION_INTAKE != "events":
+        return
+    try:
+        # eth_getLogs and the request lookups are blocking RPC calls: keep them off the event loop
+        for event in await asyncio.to_thread(verification_events.poll):
+            request_id = event["args"]["requestId"]
+            metrics.counter("contract_events_total", event=event["event"]).inc()
+            if event["event"] == "VerificationResponseByAgent":
+                if event["args"]["agent"] == AGENT_EVM_ADDRESS:
+                    mark_answered([request_id])
+                continue
+            
+            if is_known_request(request_id):
+                continue
+            user, uri, processed, _ = await asyncio.to_thread(factory_contract.functions.verificationRequests(request_id).call)
+            if processed:
+                continue
+            if not enqueue_verification(ctx, request_id, uri, user, 0):
+                # Left for the catch-up scan
+                break
+    except Exception as e:
+        ctx.logger.error(f"Error processing verification events: {e}")
+
+def index_nft(ctx: Context, nft_id, nft_uri):
+    """Embed an NFT and buffer it for the vector store; returns True on success.
+
+    Callers must `vector_store.flush()` before relying on the point being stored.
+    """
+    ctx.logger.info(f"Creating embedding for NFT #{nft_id}")
+    try:
+        image_bytes = fetch_image(nft_uri)
+        if TILED_INDEX:
+            embedding = embed_image_crops(image_bytes)
+        else:
+            embedding = embed_image(image_bytes)
+        verification.vector_store.add(nft_id, embedding, {"tokenId": nft_id, "uri": nft_uri})
+        verification.image_index.add(nft_id, image_bytes)
+        verification.tile_store.add(nft_id, image_bytes)
+        ctx.logger.info(f"✓ Created embedding for NFT #{nft_id}")
+        metrics.counter("nfts_indexed_total").inc()
+        forget_index_failures(nft_id)
+        return True
+    except Exception as e:
+        metrics.counter("nft_index_failures_total").inc()
+        ctx.logger.error(f"Failed to create embedding for NFT #{nft_id}: {e}")
+        return False
+
+def skip_failed_nft(ctx: Context, nft_id):
+    """Count a failed attempt to index a token; True once it has failed NFT_INDEX_MAX_ATTEMPTS times"""
+    failures = agent_state.get("nft_index_failures", {})
+    attempts = failures.get(str(nft_id), 0) + 1
+    agent_state.set("nft_index_failures", {**failures, str(nft_id): attempts})
+    if attempts == NFT_INDEX_MAX_ATTEMPTS:
+        metrics.counter("nft_index_skipped_total").inc()
+        ctx.logger.warning(f"⚠️ Skipping NFT #{nft_id} after {attempts} failed attempts; reconciliation will retry it")
+    return attempts >= NFT_INDEX_MAX_ATTEMPTS
+
+def forget_index_failures(nft_id):
+    failures = agent_state.get("nft_index_failures", {})
+    if str(nft_id) in failures:
+        agent_state.set("nft_index_failures", {k: v for k, v in failures.items() if k != str(nft_id)})
+
+@metrics.timed("sync_tick_seconds", task="nft_full")
+def full_nft_sync(ctx: Context):
+    """Scan every NFT via syncAgent and create any embeddings missing from Qdrant"""
+    # Call syncAgent function from smart contract (RealiaFactory)
+    total_count, nft_ids, nft_uris = factory_contract.functions.syncAgent().call()
+    ctx.logger.info(f"Syncing {total_count} NFTs from blockchain")
+    
+    # Look up which NFTs are already stored in one bulk request, then create the missing ones
+    existing = verification.vector_store.existing_ids(nft_ids)
+    failed = 0
+    for i in range(len(nft_ids)):
+        nft_id = nft_ids[i]
+        nft_uri = nft_uris[i]
+        
+        if nft_id not in existing:
+            if not index_nft(ctx, nft_id, nft_uri) and not skip_failed_nft(ctx, nft_id):
+                failed += 1
+        elif nft_id not in verification.image_index or nft_id not in verification.tile_store:
+            # Indexed before the prefilter/re-rank existed: backfill its hashes and tile descriptor
+            try:
+                image_bytes = fetch_image(nft_uri)
+                verification.image_index.add(nft_id, image_bytes)
+                verification.tile_store.add(nft_id, image_bytes)
+            except Exception as e:
+                ctx.logger.error(f"Failed to hash NFT #{nft_id}: {e}")
+                if not skip_failed_nft(ctx, nft_id):
+                    failed += 1
+        else:
+            ctx.logger.debug(f"Embedding already exists for NFT #{nft_id}")
+    verification.vector_store.flush()
+    if not failed:
+        # Every token is indexed, or skipped after NFT_INDEX_MAX_ATTEMPTS failures
+        mark_index_ready(ctx)
+    
+    ctx.logger.info(f"Sync complete. Total NFTs: {total_count}")
+    return total_count, failed
+
+@metrics.timed("sync_tick_seconds", task="nft_incremental")
+def incremental_nft_sync(ctx: Context):
+    """Index only tokens minted after the persisted high-water mark.
+
+    Token ids are assigned sequentially by RealiaNFT, so `tokenId()` is the id of
+    the latest mint and everything above `last_synced_token_id` is new.
+    """
+    last_synced = agent_state.get("last_synced_token_id", 0)
+    latest = nft_contract.functions.tokenId().call()
+    metrics.gauge("nft_sync_lag_tokens").set(max(latest - last_synced, 0))
+    if latest <= last_synced:
+        mark_index_ready(ctx)
+        return 0
+    
+    ctx.logger.info(f"Syncing NFTs #{last_synced + 1}..#{latest} from blockchain")
+    indexed = 0
+    for start in range(last_synced + 1, latest + 1, NFT_SYNC_CHUNK):
+        chunk = range(start, min(start + NFT_SYNC_CHUNK, latest + 1))
+        # Tokens restored from a snapshot or created by a reconciliation are already stored
+        existing = verification.vector_store.existing_ids(list(chunk))
+        done = 0
+        for nft_id in chunk:
+            if nft_id not in existing:
+                nft_uri = nft_contract.functions.tokenURI(nft_id).call()
+                if not index_nft(ctx, nft_id, nft_uri) and not skip_failed_nft(ctx, nft_id):
+                    break
+            done += 1
+        
+        # Only advance the watermark once the buffered points are applied
+        verification.vector_store.flush()
+        indexed += done
+        if done:
+            agent_state.set("last_synced_token_id", last_synced + indexed)
+            metrics.gauge("nft_sync_lag_tokens").set(latest - last_synced - indexed)
+        if done < len(chunk):
+            # Stop at the first failure so the watermark only skips tokens given up on
+            break
+    if last_synced + indexed >= latest:
+        mark_index_ready(ctx)
+    
+    ctx.logger.info(f"Sync complete. Indexed {indexed} new NFT(s), latest: #{latest}")
+    return indexed
+
+def mark_index_ready(ctx: Context):
+    """Record that every minted NFT is indexed, so MODIFIED/NOT_VERIFIED answers are safe"""
+    if index_ready.is_set():
+        return
+    index_ready.set()
+    elapsed = time.monotonic() - STARTED_AT
+    metrics.gauge("nft_backfill_seconds").set(elapsed)
+    ctx.logger.info(f"📚 NFT index complete {elapsed:.2f}s after startup")
+
+def run_nft_sync(sync, ctx: Context):
+    with nft_sync_lock:
+        return sync(ctx)
+
 @agent.on_interval(period=5)
 async def sync_nft_embeddings(ctx: Context):
     """Sync NFT embeddings from blockchain to Qdrant"""
     try:
-        # Call syncAgent function from smart contract (RealiaFactory)
-        total_count, nft_ids, nft_uris = factory_contract.functions.syncAgent().call()
-        ctx.logger.info(f"Syncing {total_count} NFTs from blockchain")
-        
-        # Check each NFT and create embedding if missing
-        for i in range(len(nft_ids)):
-            nft_id = nft_ids[i]
-            nft_uri = nft_uris[i]
-            
-            if not point_exists(nft_id):
-                ctx.logger.info(f"Creating embedding for NFT #{nft_id}")
-                try:
-                    embedding = get_embeddings(nft_uri)
-                    create_point(nft_id, embedding, {"tokenId": nft_id, "uri": nft_uri})
-                    ctx.logger.info(f"✓ Created embedding for NFT #{nft_id}")
-                except Exception as e:
-                    ctx.logger.error(f"Failed to create embedding for NFT #{nft_id}: {e}")
-            else:
-                ctx.logger.debug(f"Embedding already exists for NFT #{nft_id}")
-        
-        ctx.logger.info(f"Sync complete. Total NFTs: {total_count}")
+        # In a worker thread, so a long backfill does not hold up verification intake
+        if NFT_SYNC_MODE == "full":
+            await asyncio.to_thread(run_nft_sync, full_nft_sync, ctx)
+        else:
+            await asyncio.to_thread(run_nft_sync, incremental_nft_sync, ctx)
     except Exception as e:
         ctx.logger.error(f"Sync error: {e}")
 
+@agent.on_interval(period=NFT_RECONCILE_PERIOD)
+async def reconcile_nft_embeddings(ctx: Context):
+    """Periodically re-check every NFT so points lost from Qdrant get recreated"""
+    if NFT_SYNC_MODE == "full":
+        return
+    last_reconciled = agent_state.get("last_reconciled_at", 0)
+    if WARM_START and time.monotonic() - STARTED_AT < NFT_RECONCILE_PERIOD and time.time() - last_reconciled < NFT_RECONCILE_PERIOD:
+        ctx.logger.info("Skipping startup reconciliation: the last one finished less than a period ago")
+        return
+    try:
+        await asyncio.to_thread(run_nft_sync, reconcile_nfts, ctx)
+    except Exception as e:
+        ctx.logger.error(f"Reconciliation error: {e}")
+
+def reconcile_nfts(ctx: Context):
+    total_count, failed = full_nft_sync(ctx)
+    if not failed:
+        if total_count > agent_state.get("last_synced_token_id", 0):
+            agent_state.set("last_synced_token_id", total_count)
+        agent_state.set("last_reconciled_at", time.time())
+
+@agent.on_interval(period=60)
+async def log_http_latency(ctx: Context):
+    """Log per-host request latency so the slowest dependency is visible"""
+    for host, summary in verification.http.latency_summary().items():
+        ctx.logger.info(
+            f"HTTP {host}: {summary['count']} requests, mean {summary['mean'] * 1000:.0f}ms, "
+            f"p50 <= {summary['p50'] * 1000:.0f}ms, p95 <= {summary['p95'] * 1000:.0f}ms"
+        )
+
 @agent.on_event("startup")
 async def start(ctx: Context):
     ctx.logger.info("Starting Realia Agent...")
     ctx.logger.info(f"Agent EVM Address: {AGENT_EVM_ADDRESS}")
     
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT, METRICS_HOST, routes=sampling_routes(sampler) if PROFILE_ROUTES else None)
+        ctx.logger.info(f"📈 Metrics on {METRICS_HOST}:{METRICS_PORT}/metrics")
+    if PROFILE_SAMPLING:
+        sampler.start()
+    
+    # All on-chain writes go through the transaction manager, which owns the wallet nonce
+    tx_manager.start()
+    
     # Check and register agent if needed
     try:
-        await check_and_register_agent(ctx)
+        if WARM_START and cached_registration(ctx):
+            ctx.logger.info("✓ Agent registration cached from a previous run, re-checking in the background")
+            threading.Thread(target=recheck_registration, args=(ctx,), name="registration-check", daemon=True).start()
+        else:
+            await check_and_register_agent(ctx)
     except ValueError as e:
         ctx.logger.error(f"❌ Cannot start agent: {e}")
         ctx.logger.error("Please fund the agent wallet with sufficient PYUSD and restart.")
@@ -420,11 +678,34 @@ async def start(ctx: Context):
         ctx.logger.error(f"❌ Agent registration check failed: {e}")
         raise e
     
-    # Initialize Qdrant collection
+    # Initialize vector store collection
     qdrant_result = ensure_qdrant_collection()
-    ctx.logger.info(f"QDRANT collection: {qdrant_result}")
+    ctx.logger.info(f"Vector store ({VECTOR_STORE_BACKEND}) collection: {qdrant_result}")
+    if VECTOR_STORE_BACKEND == "local" and LOCAL_INDEX_SNAPSHOT and os.path.exists(LOCAL_INDEX_SNAPSHOT) \
+            and not verification.vector_store.count():
+        # The grouped (tiles) store wraps the LocalVectorStore that owns the files
+        getattr(verification.vector_store, "store", verification.vector_store).restore(LOCAL_INDEX_SNAPSHOT)
+        ctx.logger.info(f"Restored {verification.vector_store.count()} point(s) from {LOCAL_INDEX_SNAPSHOT}")
     
-    ctx.logger.info("🚀 All services running!")
+    # Verifications are served while the NFT backfill runs; until it completes
+    # only VERIFIED answers are sent and the rest are deferred (see submit_stage)
+    if shard_pool is not None:
+        shard_pool.start(ctx.logger)
+        ctx.logger.info(f"🧩 Verifying in {VERIFY_WORKERS} shard process(es)")
+    else:
+        verification_pipeline.start(ctx.logger)
+    
+    elapsed = time.monotonic() - STARTED_AT
+    metrics.gauge("startup_seconds").set(elapsed)
+    ctx.logger.info(f"🚀 All services running! ({elapsed:.2f}s after startup)")
+
+def recheck_registration(ctx: Context):
+    """Confirm a cached registration against the chain (registering or updating it if needed)"""
+    try:
+        asyncio.run(check_and_register_agent(ctx))
+    except Exception as e:
+        agent_state.set("registration", None)
+        ctx.logger.error(f"❌ Cached agent registration is no longer valid: {e}")
 
 
 @protocol.on_message(ChatMessage)
@@ -448,7 +729,7 @@ async def handle_message(ctx: Context, sender: str, msg: ChatMessage):
     
     response = 'I am afraid something went wrong and I am unable to answer your question at the moment'
     try:
-        r = client.chat.completions.create(
+        r = chat_client().chat.completions.create(
             model="asi1-mini",
             messages=[
                 {"role": "system", "content": f"""
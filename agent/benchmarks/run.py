@@ -0,0 +1,339 @@
+"""End-to-end benchmark of agent.py against local stand-ins.
+
+Starts an IPFS gateway, Qdrant and embedding service stand-in on localhost,
+points the agent at them through its environment variables, swaps the
+factory/NFT contracts and the transaction manager for in-memory fakes, then
+measures:
+
+- sync time as a function of NFT count (cold incremental sync, then a full
+  reconciliation scan where nothing is missing)
+- verification throughput and p50/p95/p99 latency per pipeline stage, driving
+  requests through `sync_verification_requests` like the interval handler does
+
+    cd agent
+    python benchmarks/run.py --nfts 100,500,1000 --verifications 300
+    python benchmarks/run.py --embed-latency 0.05 --ipfs-latency 0.2 --json results.json
+
+Stand-in latencies default to zero, so the numbers show the agent's own
+overhead; set them to model real services.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AGENT_DIR)
+
+import numpy as np  # noqa: E402
+
+from stand_ins import (  # noqa: E402
+    EmbeddingServer,
+    FakeFactory,
+    FakeNft,
+    FakeTransactionManager,
+    IpfsServer,
+    QdrantServer,
+    fresh_dir,
+    make_corpus,
+)
+
+# Digits only, so already valid checksum addresses
+FACTORY_ADDRESS = "0x" + "11" * 20
+NFT_ADDRESS = "0x" + "22" * 20
+USER_ADDRESS = "0x" + "33" * 20
+
+
+class BenchmarkContext:
+    """The part of uagents' Context the agent's functions use"""
+
+    def __init__(self, logger):
+        self.logger = logger
+
+
+def configure_environment(tmp, ipfs, qdrant, embedder, args):
+    """Point agent.py at the stand-ins; must run before it is imported"""
+    os.environ.update({
+        "ALCHEMY_API_KEY": "benchmark",
+        "REALIA_FACTORY_CONTRACT_ADDRESS": FACTORY_ADDRESS,
+        "REALIA_NFT_CONTRACT_ADDRESS": NFT_ADDRESS,
+        "WALLET_SEED": "realia benchmark agent",
+        "WALLET_PRIVATE_KEY": "0x" + "01" * 32,
+        "ASI_ONE_API_KEY": "benchmark",
+        "QDRANT_API_KEY": "benchmark",
+        "QDRANT_BASE_URL": qdrant.url,
+        "EMBEDDING_URL": f"{embedder.url}/get_image_embedding",
+        "IPFS_GATEWAYS": f"{ipfs.url}/ipfs/",
+        "VECTOR_STORE_BACKEND": args.backend,
+        "EMBEDDING_INDEX_MODE": args.index_mode,
+        # The Qdrant stand-in serves one collection, in tiles mode too
+        "QDRANT_TILES_COLLECTION": qdrant.collection,
+        "MULTICALL_ADDRESS": "",
+        "AGENT_STATE_PATH": os.path.join(tmp, "agent_state.json"),
+        "EMBEDDING_CACHE_DIR": os.path.join(tmp, "embeddings"),
+        "IPFS_CACHE_DIR": os.path.join(tmp, "ipfs"),
+        "LOCAL_INDEX_DIR": os.path.join(tmp, "vector_index"),
+        "IMAGE_HASH_INDEX_PATH": os.path.join(tmp, "image_hashes.txt"),
+        "TILE_DESCRIPTOR_DIR": os.path.join(tmp, "tile_descriptors"),
+    })
+
+
+def reset_agent(agent, tmp, qdrant, factory, nft, args):
+    """Give the agent empty caches, state and vector store, and the fake chain"""
+    from embedding_cache import EmbeddingCache
+    from image_hash import ImageHashIndex
+    from tile_descriptors import TileDescriptorStore
+    from ipfs import IpfsClient
+    from state import AgentState
+    from vector_store import GroupedVectorStore, QdrantVectorStore, SearchBatcher
+    import verification
+
+    run_dir = fresh_dir(tmp, "run")
+    agent.agent_state = AgentState(os.path.join(run_dir, "agent_state.json"))
+    agent.answered_requests.clear()
+    agent.awaiting_receipt.clear()
+    # The stages and the agent's sync both use the stores in verification.py
+    verification.embedding_cache = EmbeddingCache(os.path.join(run_dir, "embeddings"),
+                                                  verification.embedding_cache.model_name)
+    verification.ipfs = IpfsClient(verification.http, verification.IPFS_GATEWAYS, os.path.join(run_dir, "ipfs"),
+                                   hedge_delay=verification.IPFS_HEDGE_DELAY)
+    verification.image_index = ImageHashIndex(os.path.join(run_dir, "image_hashes.txt"))
+    verification.tile_store = TileDescriptorStore(os.path.join(run_dir, "tile_descriptors"))
+
+    if args.backend == "local":
+        from local_vector_store import LocalVectorStore
+        index_dir = os.path.join(run_dir, "vector_index")
+        verification.vector_store = LocalVectorStore(f"{index_dir}-tiles" if verification.TILED_INDEX else index_dir)
+    else:
+        qdrant.reset()
+        verification.vector_store = QdrantVectorStore(verification.http, qdrant.url, "benchmark",
+                                                      batch_size=verification.QDRANT_UPSERT_BATCH_SIZE)
+    if verification.TILED_INDEX:
+        verification.vector_store = GroupedVectorStore(verification.vector_store,
+                                                       group_size=1 + verification.EMBEDDING_CROP_GRID ** 2)
+    verification.vector_store.ensure_collection()
+    verification.search_batcher = SearchBatcher(verification.vector_store,
+                                                max_batch_size=verification.QDRANT_SEARCH_BATCH_SIZE)
+
+    agent.factory_contract = factory
+    agent.nft_contract = nft
+    agent.multicall = None
+    agent.tx_manager = FakeTransactionManager(factory, agent.AGENT_EVM_ADDRESS, args.confirm_delay)
+    return run_dir
+
+
+def start_shards(agent, ctx, run_dir, args):
+    """Start shard processes that open this run's stores read-only, as under VERIFY_WORKERS"""
+    from shards import ShardPool
+
+    os.environ.update({
+        "EMBEDDING_CACHE_DIR": os.path.join(run_dir, "embeddings"),
+        "IPFS_CACHE_DIR": os.path.join(run_dir, "ipfs"),
+        "LOCAL_INDEX_DIR": os.path.join(run_dir, "vector_index"),
+        "IMAGE_HASH_INDEX_PATH": os.path.join(run_dir, "image_hashes.txt"),
+        "TILE_DESCRIPTOR_DIR": os.path.join(run_dir, "tile_descriptors"),
+        "METRICS_PORT": "0",
+        "SHARD_LOG_LEVEL": "WARNING",
+    })
+    agent.shard_pool = ShardPool(args.workers, agent.handle_shard_result, queue_size=agent.VERIFY_QUEUE_SIZE)
+    agent.shard_pool.start(ctx.logger)
+    deadline = time.perf_counter() + 60
+    while len(agent.shard_pool.connections) < args.workers and time.perf_counter() < deadline:
+        time.sleep(0.05)
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0, "p50": 0.0, "p95": 0.0, "p99": 0.0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"count": len(values), "p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def mint_all(ipfs, nft, images):
+    for image in images:
+        nft.mint(ipfs.add_nft(image))
+
+# ============================================================================
+# Benchmarks
+# ============================================================================
+
+def bench_sync(agent, ctx, tmp, ipfs, qdrant, images, counts, args):
+    rows = []
+    for count in counts:
+        nft = FakeNft(args.rpc_latency)
+        factory = FakeFactory(nft, args.rpc_latency)
+        mint_all(ipfs, nft, images[:count])
+        reset_agent(agent, tmp, qdrant, factory, nft, args)
+
+        start = time.perf_counter()
+        indexed = agent.incremental_nft_sync(ctx)
+        incremental = time.perf_counter() - start
+
+        start = time.perf_counter()
+        agent.full_nft_sync(ctx)
+        reconcile = time.perf_counter() - start
+
+        rows.append({
+            "nfts": count,
+            "indexed": indexed,
+            "incremental_sync_s": incremental,
+            "nfts_per_sec": indexed / incremental if incremental else 0.0,
+            "reconcile_s": reconcile,
+            "rpc_calls": {**nft.rpc_calls, **factory.rpc_calls},
+        })
+        print(f"  {count:>6} NFTs: incremental sync {incremental:7.2f}s ({rows[-1]['nfts_per_sec']:7.1f}/s), "
+              f"reconcile {reconcile:6.2f}s")
+    return rows
+
+
+async def bench_verify(agent, ctx, tmp, ipfs, qdrant, images, queries, args):
+    from pipeline import VerificationJob
+
+    nft = FakeNft(args.rpc_latency)
+    factory = FakeFactory(nft, args.rpc_latency)
+    mint_all(ipfs, nft, images)
+    run_dir = reset_agent(agent, tmp, qdrant, factory, nft, args)
+    agent.incremental_nft_sync(ctx)
+
+    jobs = []
+    first_seen = {}
+    if args.workers:
+        # Jobs run in the shard processes: time them from dispatch instead
+        start_shards(agent, ctx, run_dir, args)
+        dispatch = agent.shard_pool.dispatch
+
+        def recording_dispatch(request_id, uri):
+            accepted = dispatch(request_id, uri)
+            if accepted:
+                first_seen.setdefault(request_id, time.monotonic())
+            return accepted
+
+        agent.shard_pool.dispatch = recording_dispatch
+
+    class RecordingJob(VerificationJob):
+        def __init__(self, *job_args, **kwargs):
+            super().__init__(*job_args, **kwargs)
+            # Jobs refused by a full pipeline are recreated on the next scan
+            jobs.append(self)
+            first_seen.setdefault(self.request_id, self.created)
+
+    agent.VerificationJob = RecordingJob
+    expected = {}
+    for request_id, (image, label, _) in enumerate(queries, start=1):
+        factory.request_verification(request_id, USER_ADDRESS, ipfs.add_nft(image))
+        expected[request_id] = label
+
+    if not args.workers:
+        agent.verification_pipeline.start(ctx.logger)
+    start = time.perf_counter()
+    deadline = start + args.timeout
+    while len(factory.responses) < len(queries) and time.perf_counter() < deadline:
+        await agent.sync_verification_requests(ctx)
+        await asyncio.sleep(args.intake_period)
+    elapsed = time.perf_counter() - start
+    if args.workers:
+        agent.shard_pool.stop()
+        agent.shard_pool = None
+    else:
+        await agent.verification_pipeline.stop()
+    agent.VerificationJob = VerificationJob
+
+    names = ["NONE", "VERIFIED", "MODIFIED", "NOT_VERIFIED"]
+    outcomes = {}
+    for request_id, responses in factory.responses.items():
+        result = names[responses[agent.AGENT_EVM_ADDRESS][0]]
+        key = f"{expected[request_id]} -> {result}"
+        outcomes[key] = outcomes.get(key, 0) + 1
+
+    stages = {stage.name: percentiles([job.timings[stage.name] for job in jobs if stage.name in job.timings])
+              for stage in agent.verification_pipeline.stages}
+    stages["end_to_end"] = percentiles([factory.responded_at[request_id] - created
+                                        for request_id, created in first_seen.items()
+                                        if request_id in factory.responded_at])
+    return {
+        "nfts": len(images),
+        "requests": len(queries),
+        "answered": len(factory.responses),
+        "seconds": elapsed,
+        "verifications_per_sec": len(factory.responses) / elapsed if elapsed else 0.0,
+        "workers": args.workers,
+        "failed": agent.verification_pipeline.failed,
+        "expired": agent.verification_pipeline.expired,
+        "outcomes": outcomes,
+        "stages": stages,
+        "rpc_calls": factory.rpc_calls,
+    }
+
+
+def print_verify(report):
+    print(f"  {report['answered']}/{report['requests']} answered in {report['seconds']:.2f}s: "
+          f"{report['verifications_per_sec']:.1f} verifications/sec "
+          f"(failed {report['failed']}, expired {report['expired']})")
+    print(f"  {'stage':<12} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, s in report["stages"].items():
+        if not s["count"] and name != "end_to_end":
+            # Stages that ran in shard processes
+            continue
+        print(f"  {name:<12} {s['count']:>6} {s['p50'] * 1000:>9.1f} {s['p95'] * 1000:>9.1f} {s['p99'] * 1000:>9.1f}")
+    for outcome, count in sorted(report["outcomes"].items()):
+        print(f"  {outcome:<28} {count:>5}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nfts", default="100,500,1000", help="comma-separated NFT counts for the sync benchmark")
+    parser.add_argument("--verifications", type=int, default=300, help="verification requests to process")
+    parser.add_argument("--verify-nfts", type=int, default=500, help="NFTs indexed for the verification benchmark")
+    parser.add_argument("--backend", choices=["qdrant", "local"], default="qdrant", help="vector store backend")
+    parser.add_argument("--index-mode", choices=["single", "tiles"], default="single",
+                        help="one vector per NFT, or the full image plus crops")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="verify in this many shard processes (VERIFY_WORKERS) instead of in-process")
+    parser.add_argument("--rpc-latency", type=float, default=0.0, help="seconds per fake contract call")
+    parser.add_argument("--ipfs-latency", type=float, default=0.0, help="seconds per IPFS gateway request")
+    parser.add_argument("--qdrant-latency", type=float, default=0.0, help="seconds per Qdrant request")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="seconds per embedding request")
+    parser.add_argument("--confirm-delay", type=float, default=0.0, help="seconds until a transaction is mined")
+    parser.add_argument("--intake-period", type=float, default=0.05, help="seconds between pending-request scans")
+    parser.add_argument("--timeout", type=float, default=300.0, help="give up on the verification run after this")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    counts = [int(count) for count in args.nfts.split(",") if count]
+    logging.basicConfig(level=logging.WARNING)
+    ctx = BenchmarkContext(logging.getLogger("benchmark"))
+
+    with tempfile.TemporaryDirectory(prefix="realia-bench-") as tmp:
+        ipfs = IpfsServer(args.ipfs_latency)
+        qdrant = QdrantServer(latency=args.qdrant_latency)
+        embedder = EmbeddingServer(args.embed_latency)
+        configure_environment(tmp, ipfs, qdrant, embedder, args)
+        import agent
+
+        print("Generating synthetic corpus...")
+        images, queries = make_corpus(max(counts + [args.verify_nfts]), args.verifications, args.seed)
+
+        print("Sync time vs NFT count:")
+        sync = bench_sync(agent, ctx, tmp, ipfs, qdrant, images, counts, args)
+
+        print(f"Verification pipeline ({args.verify_nfts} NFTs indexed):")
+        verify = asyncio.run(bench_verify(agent, ctx, tmp, ipfs, qdrant, images[:args.verify_nfts],
+                                          [query for query in queries if query[2] is None or query[2] < args.verify_nfts],
+                                          args))
+        print_verify(verify)
+
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({"args": vars(args), "sync": sync, "verify": verify}, f, indent=2)
+
+        for server in (ipfs, qdrant, embedder):
+            server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+"""Local stand-ins for the agent's external dependencies.
+
+- `FakeFactory` / `FakeNft`: in-memory versions of the RealiaFactory and
+  RealiaNFT calls the agent makes, shaped like web3 contract functions
+  (`contract.functions.name(*args).call()`), with a simulated RPC latency.
+- `FakeTransactionManager`: accepts `responseVerification` submissions and
+  "mines" them after a confirmation delay, updating the fake factory.
+- `IpfsServer`, `QdrantServer`, `EmbeddingServer`: small threaded HTTP servers
+  speaking the subset of the IPFS gateway, Qdrant and embedding service APIs
+  the agent uses.
+- `make_corpus`: synthetic NFT images plus exact, modified and unrelated
+  verification queries.
+"""
+import base64
+import hashlib
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+from local_vector_store import LocalVectorStore
+from transactions import PendingTransaction
+
+# ============================================================================
+# Chain
+# ============================================================================
+
+class FakeCall:
+    def __init__(self, contract, name, args):
+        self.contract = contract
+        self.fn_name = name
+        self.args = args
+
+    def call(self):
+        with self.contract.lock:
+            self.contract.rpc_calls[self.fn_name] = self.contract.rpc_calls.get(self.fn_name, 0) + 1
+        if self.contract.rpc_latency:
+            time.sleep(self.contract.rpc_latency)
+        return getattr(self.contract, f"_{self.fn_name}")(*self.args)
+
+
+class FakeFunctions:
+    def __init__(self, contract):
+        self.contract = contract
+
+    def __getattr__(self, name):
+        return lambda *args: FakeCall(self.contract, name, args)
+
+
+class FakeContract:
+    def __init__(self, rpc_latency=0.0):
+        self.rpc_latency = rpc_latency
+        self.rpc_calls = {}
+        self.lock = threading.Lock()
+        self.functions = FakeFunctions(self)
+
+
+class FakeNft(FakeContract):
+    def __init__(self, rpc_latency=0.0):
+        super().__init__(rpc_latency)
+        self.uris = []
+
+    def mint(self, uri):
+        with self.lock:
+            self.uris.append(uri)
+            return len(self.uris)
+
+    def _tokenId(self):
+        return len(self.uris)
+
+    def _tokenURI(self, token_id):
+        return self.uris[token_id - 1]
+
+
+class FakeFactory(FakeContract):
+    def __init__(self, nft, rpc_latency=0.0):
+        super().__init__(rpc_latency)
+        self.nft = nft
+        self.requests = {}
+        self.responses = {}
+        self.responded_at = {}
+
+    def request_verification(self, request_id, user, uri):
+        with self.lock:
+            self.requests[request_id] = (user, uri)
+
+    def respond(self, agent, request_id, result, token_id):
+        with self.lock:
+            self.responses.setdefault(request_id, {})[agent] = (result, token_id)
+            self.responded_at.setdefault(request_id, time.monotonic())
+
+    def _syncAgent(self):
+        ids = list(range(1, len(self.nft.uris) + 1))
+        return len(ids), ids, list(self.nft.uris)
+
+    def _syncPendingVerifications(self):
+        with self.lock:
+            pending = [(request_id, request) for request_id, request in self.requests.items()
+                       if len(self.responses.get(request_id, {})) < 5]
+            counts = [len(self.responses.get(request_id, {})) for request_id, _ in pending]
+        return (
+            len(pending),
+            [request_id for request_id, _ in pending],
+            [user for _, (user, _) in pending],
+            [uri for _, (_, uri) in pending],
+            counts,
+        )
+
+    def _hasAgentResponded(self, request_id, agent):
+        with self.lock:
+            return agent in self.responses.get(request_id, {})
+
+    def _verificationRequests(self, request_id):
+        user, uri = self.requests[request_id]
+        return user, uri, False, 0
+
+
+class FakeTransactionManager:
+    """Drop-in for TransactionManager that confirms transactions after `confirm_delay` seconds"""
+
+    def __init__(self, factory, agent_address, confirm_delay=0.0):
+        self.factory = factory
+        self.agent_address = agent_address
+        self.confirm_delay = confirm_delay
+        self.sent = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        pass
+
+    def submit(self, call, label="", on_receipt=None):
+        pending = PendingTransaction(call, label, on_receipt)
+        with self.lock:
+            self.sent += 1
+            tx_hash = f"0x{self.sent:064x}"
+        pending.hashes.append(tx_hash)
+        pending.sent.set_result(tx_hash)
+        threading.Timer(self.confirm_delay, self._mine, (pending, tx_hash)).start()
+        return pending
+
+    def transact(self, call, label="", timeout=120):
+        return self.submit(call, label).receipt.result(timeout=timeout)
+
+    def pending_count(self):
+        return 0
+
+    def _mine(self, pending, tx_hash):
+        if pending.call.fn_name == "responseVerification":
+            self.factory.respond(self.agent_address, *pending.call.args)
+        pending.receipt.set_result({"status": 1, "transactionHash": tx_hash, "blockNumber": 0, "gasUsed": 0})
+
+# ============================================================================
+# HTTP services
+# ============================================================================
+
+class StandInServer:
+    """Runs a ThreadingHTTPServer on a free local port in a daemon thread"""
+
+    def __init__(self, handler, latency=0.0):
+        handler_class = type(handler.__name__, (handler,), {"service": self})
+        self.latency = latency
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler_class)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this, Nagle plus
+    # delayed ACKs add ~40ms to every keep-alive response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def reply(self, status, data, content_type="application/json"):
+        if not isinstance(data, bytes):
+            data = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def simulate_latency(self):
+        if self.service.latency:
+            time.sleep(self.service.latency)
+
+
+class IpfsHandler(Handler):
+    def do_GET(self):
+        self.simulate_latency()
+        data = self.service.objects.get(self.path.split("/ipfs/", 1)[-1])
+        if data is None:
+            self.reply(404, {"error": "not found"})
+        else:
+            self.reply(200, data, "application/octet-stream")
+
+
+class IpfsServer(StandInServer):
+    """Serves added objects under /ipfs/<cid>, like a gateway"""
+
+    def __init__(self, latency=0.0):
+        self.objects = {}
+        super().__init__(IpfsHandler, latency)
+
+    def add(self, data):
+        cid = f"bafy{hashlib.sha256(data).hexdigest()[:52]}"
+        self.objects[cid] = data
+        return f"ipfs://{cid}"
+
+    def add_nft(self, image_bytes):
+        """Store an image and its metadata; returns the metadata URI"""
+        return self.add(json.dumps({"name": "benchmark", "image": self.add(image_bytes)}).encode("utf-8"))
+
+
+class QdrantHandler(Handler):
+    def _route(self):
+        prefix = f"/collections/{self.service.collection}"
+        path = self.path.split("?", 1)[0]
+        if not path.startswith(prefix):
+            return None
+        return path[len(prefix):]
+
+    def do_GET(self):
+        self.simulate_latency()
+        route = self._route()
+        if route != "" or self.service.store is None:
+            self.reply(404, {"status": {"error": "Not found"}})
+            return
+        self.reply(200, {"result": {"points_count": self.service.store.count()}, "status": "ok"})
+
+    def do_PUT(self):
+        self.simulate_latency()
+        route = self._route()
+        body = json.loads(self.body() or b"{}")
+        if route == "":
+            self.service.create()
+            self.reply(200, {"result": True, "status": "ok"})
+        elif route == "/points":
+            for point in body["points"]:
+                self.service.store.add(point["id"], point["vector"], point.get("payload"))
+            self.reply(200, {"result": {"status": "completed"}, "status": "ok"})
+        else:
+            self.reply(404, {"status": {"error": "Not found"}})
+
+    def do_POST(self):
+        self.simulate_latency()
+        route = self._route()
+        body = json.loads(self.body() or b"{}")
+        store = self.service.store
+        if route == "/points/search":
+            self.reply(200, {"result": store.search(body["vector"], body.get("limit", 10)), "status": "ok"})
+        elif route == "/points/search/batch":
+            vectors = [search["vector"] for search in body["searches"]]
+            limit = max(search.get("limit", 10) for search in body["searches"])
+            self.reply(200, {"result": store.search_batch(vectors, limit), "status": "ok"})
+        elif route == "/points":
+            found = store.existing_ids(body["ids"])
+            self.reply(200, {"result": [{"id": id} for id in body["ids"] if id in found], "status": "ok"})
+        else:
+            self.reply(404, {"status": {"error": "Not found"}})
+
+
+class QdrantServer(StandInServer):
+    """Qdrant REST subset backed by a LocalVectorStore (exact search below its IVF threshold)"""
+
+    def __init__(self, collection="realia", latency=0.0):
+        self.collection = collection
+        self.store = None
+        self.tmp = tempfile.TemporaryDirectory(prefix="qdrant-")
+        super().__init__(QdrantHandler, latency)
+
+    def create(self):
+        self.store = LocalVectorStore(tempfile.mkdtemp(dir=self.tmp.name))
+
+    def reset(self):
+        self.store = None
+
+
+def fake_embedding(image_bytes, dim=512):
+    """Deterministic stand-in for CLIP: a mean-centred 16x32 grayscale thumbnail.
+
+    Identical images give identical vectors and lightly edited images stay
+    close, which is all the agent's thresholds need to exercise every branch.
+    """
+    return fake_image_embedding(Image.open(BytesIO(image_bytes)), dim)
+
+
+def fake_image_embedding(image, dim=512):
+    image = image.convert("L").resize((32, dim // 32), Image.Resampling.BILINEAR)
+    vector = np.asarray(image, dtype=np.float32).ravel()
+    vector -= vector.mean()
+    return (vector / max(float(np.linalg.norm(vector)), 1e-12)).tolist()
+
+
+def fake_crop_embeddings(image_bytes, grid):
+    """`fake_embedding` of the full image and grid x grid overlapping crops, as the real service cuts them"""
+    image = Image.open(BytesIO(image_bytes))
+    width, height = image.size
+    embeddings = [fake_image_embedding(image)]
+    for row in range(grid):
+        for col in range(grid):
+            x, y = col * width / (grid + 1), row * height / (grid + 1)
+            box = (round(x), round(y), round(x + 2 * width / (grid + 1)), round(y + 2 * height / (grid + 1)))
+            embeddings.append(fake_image_embedding(image.crop(box)))
+    return embeddings
+
+
+class EmbeddingHandler(Handler):
+    def do_POST(self):
+        body = self.body()
+        if self.path.startswith("/get_image_crop_embeddings"):
+            grid = int(parse_qs(urlsplit(self.path).query).get("grid", ["2"])[0])
+            self.simulate_latency()
+            self.service.requests += 1
+            self.reply(200, {"embeddings": fake_crop_embeddings(body, grid), "grid": grid})
+            return
+        if self.path.startswith("/get_image_embedding_raw"):
+            image_bytes = body
+        else:
+            image_bytes = base64.b64decode(json.loads(body)["image"])
+        self.simulate_latency()
+        self.service.requests += 1
+        self.reply(200, {"embedding": fake_embedding(image_bytes)})
+
+
+class EmbeddingServer(StandInServer):
+    """Embedding service stand-in; `latency` models the CLIP forward pass"""
+
+    def __init__(self, latency=0.0):
+        self.requests = 0
+        super().__init__(EmbeddingHandler, latency)
+
+# ============================================================================
+# Synthetic corpus
+# ============================================================================
+
+def synthetic_image(rng, size=512):
+    image = Image.new("RGB", (size, size), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.randint(4, 10)):
+        x0, y0 = rng.randrange(size), rng.randrange(size)
+        x1, y1 = x0 + rng.randint(size // 8, size // 2), y0 + rng.randint(size // 8, size // 2)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        if rng.random() < 0.5:
+            draw.rectangle((x0, y0, x1, y1), fill=color)
+        else:
+            draw.ellipse((x0, y0, x1, y1), fill=color)
+    return image
+
+
+def modify(image, rng):
+    """A light edit: blur plus a small overlay, the kind of change MODIFIED is for"""
+    image = image.filter(ImageFilter.GaussianBlur(2))
+    draw = ImageDraw.Draw(image)
+    x, y = rng.randrange(image.width // 2), rng.randrange(image.height // 2)
+    draw.rectangle((x, y, x + image.width // 10, y + image.height // 10), fill=(255, 255, 255))
+    return image
+
+
+def crop(image, rng):
+    """A cropped copy keeping 65-80% of each side, the case tiled indexing is for"""
+    width, height = int(image.width * rng.uniform(0.65, 0.8)), int(image.height * rng.uniform(0.65, 0.8))
+    x, y = rng.randrange(image.width - width + 1), rng.randrange(image.height - height + 1)
+    return image.crop((x, y, x + width, y + height))
+
+
+def encode(image, quality=90):
+    out = BytesIO()
+    image.save(out, format="JPEG", quality=quality)
+    return out.getvalue()
+
+
+def make_corpus(nft_count, query_count, seed=0):
+    """Return (nft_images, queries) where each query is (image_bytes, expected, source_index).
+
+    Queries cycle through exact copies of an NFT, modified copies, cropped
+    copies and unrelated images; `expected` is the VerificationResult name the
+    agent should reach (cropped copies count as MODIFIED).
+    """
+    rng = random.Random(seed)
+    images = [synthetic_image(rng) for _ in range(nft_count)]
+    nft_images = [encode(image) for image in images]
+    queries = []
+    for i in range(query_count):
+        kind = i % 4
+        if kind == 0:
+            source = rng.randrange(nft_count)
+            queries.append((nft_images[source], "VERIFIED", source))
+        elif kind == 1:
+            source = rng.randrange(nft_count)
+            queries.append((encode(modify(images[source], rng)), "MODIFIED", source))
+        elif kind == 2:
+            source = rng.randrange(nft_count)
+            queries.append((encode(crop(images[source], rng)), "MODIFIED", source))
+        else:
+            queries.append((encode(synthetic_image(rng)), "NOT_VERIFIED", None))
+    return nft_images, queries
+
+
+def fresh_dir(root, name):
+    path = os.path.join(root, f"{name}-{time.monotonic_ns()}")
+    os.makedirs(path)
+    return path
@@ -0,0 +1,79 @@
+"""Shared HTTP client for Qdrant, IPFS gateways and the embedding service.
+
+One keep-alive `requests.Session` per host with a sized connection pool, so
+repeated calls reuse TCP+TLS connections instead of handshaking every time.
+Requests get default connect/read timeouts, transient failures (connection
+errors, timeouts, 429/5xx) are retried with full-jitter exponential backoff,
+and every attempt's latency is recorded in a per-host histogram.
+"""
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class HttpClient:
+    def __init__(self, timeout=(3.05, 30), retries=3, backoff=0.25, max_backoff=5.0, pool_size=32):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def session(self, host):
+        with self.lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self.sessions[host] = session
+            return session
+
+    def _sleep_before_retry(self, attempt):
+        time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+
+    def request(self, method, url, **kwargs):
+        host = urlsplit(url).netloc
+        session = self.session(host)
+        kwargs.setdefault("timeout", self.timeout)
+        latency = metrics.histogram("http_request_seconds", host=host)
+
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                latency.observe(time.perf_counter() - start)
+                if attempt == self.retries:
+                    raise
+                self._sleep_before_retry(attempt)
+                continue
+            latency.observe(time.perf_counter() - start)
+            if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                response.close()
+                self._sleep_before_retry(attempt)
+                continue
+            return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def latency_summary(self):
+        return {dict(labels)["host"]: h.summary() for labels, h in metrics.histograms("http_request_seconds").items()}
@@ -0,0 +1,68 @@
+"""Bounded image downloads and pre-resizing before embedding.
+
+Downloads are streamed and abort as soon as they exceed a byte cap, so a huge
+or malicious file never has to fit in memory. Before an image is sent to the
+embedding service it is shrunk to what CLIP actually looks at: JPEGs are
+decoded at reduced scale with `Image.draft` (the DCT does the downscaling),
+then the shortest side is resized to `short_side` and the result re-encoded
+as a compact JPEG.
+"""
+from io import BytesIO
+
+from PIL import Image
+
+
+class ImageTooLarge(Exception):
+    pass
+
+
+class DownloadCancelled(Exception):
+    pass
+
+
+def download(http, url, max_bytes, chunk_size=64 * 1024, cancel=None):
+    """Stream `url` into memory, raising ImageTooLarge past `max_bytes`.
+
+    If `cancel` (a threading.Event) is set, the download stops at the next
+    chunk with DownloadCancelled and the connection is released.
+    """
+    r = http.get(url, stream=True)
+    try:
+        r.raise_for_status()
+        length = r.headers.get("Content-Length")
+        if length is not None and int(length) > max_bytes:
+            raise ImageTooLarge(f"{url} is {length} bytes (limit {max_bytes})")
+
+        data = bytearray()
+        for chunk in r.iter_content(chunk_size):
+            if cancel is not None and cancel.is_set():
+                raise DownloadCancelled(url)
+            data.extend(chunk)
+            if len(data) > max_bytes:
+                raise ImageTooLarge(f"{url} exceeds {max_bytes} bytes")
+        return bytes(data)
+    finally:
+        r.close()
+
+
+def downscale(image_bytes, short_side=448, quality=95):
+    """Return JPEG bytes whose shortest side is at most `short_side` pixels.
+
+    CLIP resizes the shortest side to 224 and centre-crops, so keeping twice
+    that leaves its own resampling unchanged in practice. Images that are
+    already small are returned untouched.
+    """
+    image = Image.open(BytesIO(image_bytes))
+    width, height = image.size
+    if min(width, height) <= short_side:
+        return image_bytes
+
+    scale = short_side / min(width, height)
+    target = (round(width * scale), round(height * scale))
+    # Only affects JPEGs: decode at the smallest 1/2^n scale still >= target
+    image.draft("RGB", target)
+    image = image.convert("RGB").resize(target, Image.Resampling.BICUBIC)
+
+    out = BytesIO()
+    image.save(out, format="JPEG", quality=quality)
+    return out.getvalue()
@@ -0,0 +1,179 @@
+"""Exact and perceptual image hashes with a BK-tree for near-duplicate lookup.
+
+Every indexed NFT gets a SHA-256 of its bytes plus two 64-bit perceptual
+hashes: pHash (sign of the low-frequency DCT coefficients of a 32x32
+grayscale thumbnail) and dHash (horizontal gradient signs of a 9x8 one).
+Re-encoded, resized or lightly recompressed copies keep almost all bits, so
+a small Hamming distance on both means "the same picture".
+
+`ImageHashIndex` answers byte-identical lookups from a dict and near
+duplicates from a BK-tree over the pHash codes, which only visits subtrees
+whose distance range can contain a match. Hashes are appended to a text file
+(`token sha256 phash dhash` per line) so a restart does not re-download
+every image. An index opened with `read_only=True` follows a file another
+process appends to, picking up new lines on `refresh()`.
+"""
+import hashlib
+import os
+import threading
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+_DCT_SIZE = 32
+# Orthogonal DCT-II basis, so a 2-D DCT is two matrix products
+_DCT = np.cos(np.pi * (2 * np.arange(_DCT_SIZE)[None, :] + 1) * np.arange(_DCT_SIZE)[:, None] / (2 * _DCT_SIZE))
+
+
+def _bits_to_int(bits):
+    return int("".join("1" if bit else "0" for bit in bits.ravel()), 2)
+
+
+def _grayscale(image, size):
+    return np.asarray(image.resize(size, Image.Resampling.LANCZOS), dtype=np.float64)
+
+
+def phash(image):
+    pixels = _grayscale(image, (_DCT_SIZE, _DCT_SIZE))
+    low = (_DCT @ pixels @ _DCT.T)[:8, :8]
+    # The DC term only reflects overall brightness
+    median = np.median(low.ravel()[1:])
+    return _bits_to_int(low > median)
+
+
+def dhash(image):
+    pixels = _grayscale(image, (9, 8))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def image_hashes(image_bytes):
+    """Return (sha256 hex, pHash, dHash) for encoded image bytes"""
+    image = Image.open(BytesIO(image_bytes))
+    # Only needs a thumbnail: let JPEGs decode at reduced scale
+    image.draft("L", (64, 64))
+    image = image.convert("L")
+    return hashlib.sha256(image_bytes).hexdigest(), phash(image), dhash(image)
+
+
+class BKTree:
+    """Metric tree over 64-bit codes under Hamming distance"""
+
+    def __init__(self):
+        # Node: [code, values, {distance: child}]
+        self.root = None
+        self.size = 0
+
+    def add(self, code, value):
+        self.size += 1
+        if self.root is None:
+            self.root = [code, [value], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(code, node[0])
+            if distance == 0:
+                node[1].append(value)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [code, [value], {}]
+                return
+            node = child
+
+    def search(self, code, max_distance):
+        """All (distance, value) pairs within `max_distance` of `code`, closest first"""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(code, node[0])
+            if distance <= max_distance:
+                found.extend((distance, value) for value in node[1])
+            # Triangle inequality: only children at distance d' with |d' - d| <= max can match
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        found.sort(key=lambda item: item[0])
+        return found
+
+
+class ImageHashIndex:
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self.lock = threading.Lock()
+        self.by_sha = {}
+        self.by_token = {}
+        self.tree = BKTree()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.offset = 0
+        self.refresh()
+        self.log = None if read_only else open(path, "a")
+
+    def refresh(self):
+        """Index the complete lines appended to the file since the last read"""
+        if not os.path.exists(self.path):
+            return
+        with self.lock, open(self.path, "rb") as f:
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Still being written
+                    break
+                self.offset += len(line)
+                parts = line.split()
+                if len(parts) == 4:
+                    self._insert(int(parts[0]), parts[1].decode("ascii"), int(parts[2], 16), int(parts[3], 16))
+
+    def _insert(self, token_id, sha, p, d):
+        if token_id in self.by_token:
+            return False
+        self.by_sha.setdefault(sha, token_id)
+        self.by_token[token_id] = (p, d)
+        self.tree.add(p, token_id)
+        return True
+
+    def __contains__(self, token_id):
+        with self.lock:
+            return token_id in self.by_token
+
+    def __len__(self):
+        with self.lock:
+            return len(self.by_token)
+
+    def add(self, token_id, image_bytes):
+        """Hash and index a token's image (no-op if the token is already indexed)"""
+        if token_id in self:
+            return
+        sha, p, d = image_hashes(image_bytes)
+        with self.lock:
+            if self._insert(token_id, sha, p, d):
+                self.log.write(f"{token_id} {sha} {p:016x} {d:016x}\n")
+                self.log.flush()
+
+    def match(self, image_bytes, max_phash_distance=2, max_dhash_distance=2):
+        """Return (token_id, kind, distance) for an identical or near-identical image, else None.
+
+        `kind` is "sha256" for byte-identical images and "phash" when both
+        perceptual hashes are within their distance limits.
+        """
+        sha = hashlib.sha256(image_bytes).hexdigest()
+        with self.lock:
+            token_id = self.by_sha.get(sha)
+        if token_id is not None:
+            return token_id, "sha256", 0
+
+        _, p, d = image_hashes(image_bytes)
+        with self.lock:
+            candidates = self.tree.search(p, max_phash_distance)
+            for distance, token_id in candidates:
+                if hamming(d, self.by_token[token_id][1]) <= max_dhash_distance:
+                    return token_id, "phash", distance
+        return None
@@ -0,0 +1,190 @@
+"""IPFS fetching with gateway racing and content-addressed caches.
+
+Requests are hedged across a list of gateways: the first gateway is tried
+immediately and another one is added every `hedge_delay` seconds until one
+answers successfully; the first good response wins and the slower downloads
+are cancelled. Because a CID always names the same bytes, every successful
+IPFS fetch is cached on disk under its `CID/path` (least recently used entries
+are evicted past `max_cache_bytes`), and metadata URI -> image URI
+resolutions are memoised, so re-verifying or re-syncing a token needs no
+network at all.
+"""
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from image_fetch import ImageTooLarge, download
+
+DEFAULT_GATEWAYS = [
+    "https://ipfs.io/ipfs/",
+    "https://gateway.pinata.cloud/ipfs/",
+    "https://dweb.link/ipfs/",
+    "https://w3s.link/ipfs/",
+]
+
+
+def ipfs_path(uri):
+    """Return `CID/optional/path` for ipfs:// URIs and gateway URLs, else None"""
+    if uri.startswith("ipfs://"):
+        return uri[len("ipfs://"):].lstrip("/")
+    if "/ipfs/" in uri:
+        return uri.split("/ipfs/", 1)[1]
+    return None
+
+
+class IpfsClient:
+    def __init__(self, http, gateways=DEFAULT_GATEWAYS, cache_dir=".cache/ipfs", hedge_delay=0.5,
+                 max_cache_bytes=2 * 1024 ** 3, max_workers=16):
+        self.http = http
+        self.gateways = [gateway if gateway.endswith("/") else f"{gateway}/" for gateway in gateways]
+        self.cache_dir = cache_dir
+        self.hedge_delay = hedge_delay
+        self.max_cache_bytes = max_cache_bytes
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ipfs")
+        self.image_uris = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_bytes = sum(entry.stat().st_size for entry in os.scandir(cache_dir) if entry.is_file())
+
+    # ------------------------------------------------------------------
+    # Disk cache
+    # ------------------------------------------------------------------
+
+    def _cache_file(self, path):
+        return os.path.join(self.cache_dir, hashlib.sha256(path.encode("utf-8")).hexdigest())
+
+    def _cache_get(self, path):
+        try:
+            with open(self._cache_file(path), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self.lock:
+                self.misses += 1
+            return None
+        try:
+            # The mtime orders entries for eviction, so a hit makes an entry recently used
+            os.utime(self._cache_file(path))
+        except FileNotFoundError:
+            pass
+        with self.lock:
+            self.hits += 1
+        return data
+
+    def _cache_put(self, path, data):
+        file = self._cache_file(path)
+        # Shard processes share the cache directory, and thread ids are only unique per process
+        tmp_file = f"{file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(data)
+        try:
+            # Concurrent misses for the same CID (or another shard) may have stored it already
+            replaced = os.stat(file).st_size
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmp_file, file)
+        with self.lock:
+            self.cache_bytes += len(data) - replaced
+            over_limit = self.cache_bytes > self.max_cache_bytes
+        if over_limit:
+            self._evict()
+
+    def _evict(self):
+        """Delete least recently used entries until the cache is at 90% of its limit"""
+        entries = sorted(
+            (entry for entry in os.scandir(self.cache_dir) if entry.is_file() and not entry.name.endswith(".tmp")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        with self.lock:
+            for entry in entries:
+                if self.cache_bytes <= self.max_cache_bytes * 0.9:
+                    break
+                try:
+                    size = entry.stat().st_size
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+                self.cache_bytes -= size
+
+    # ------------------------------------------------------------------
+    # Fetching
+    # ------------------------------------------------------------------
+
+    def _race(self, path, max_bytes):
+        """Fetch `path` from the gateways, hedging to the next one every `hedge_delay` seconds"""
+        pending = set()
+        errors = []
+        gateways = iter(self.gateways)
+        # Set once the race is decided, so the losing downloads stop streaming and free their threads
+        cancel = threading.Event()
+
+        def launch():
+            gateway = next(gateways, None)
+            if gateway is None:
+                return False
+            pending.add(self.executor.submit(download, self.http, f"{gateway}{path}", max_bytes, cancel=cancel))
+            return True
+
+        launch()
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=self.hedge_delay, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        return future.result()
+                    except ImageTooLarge:
+                        # Same bytes everywhere, so no other gateway will do better
+                        raise
+                    except Exception as e:
+                        errors.append(e)
+                # Nothing finished in time: hedge with one more gateway; otherwise replace the failures
+                for _ in range(len(done) or 1):
+                    launch()
+        finally:
+            cancel.set()
+            for future in pending:
+                # Not started yet: never runs; already running: stops at its next chunk
+                future.cancel()
+        raise RuntimeError(f"All IPFS gateways failed for {path}: {errors}")
+
+    def fetch(self, uri, max_bytes):
+        """Return the bytes behind `uri`, from the CID cache when possible"""
+        path = ipfs_path(uri)
+        if path is None:
+            return download(self.http, uri, max_bytes)
+
+        data = self._cache_get(path)
+        if data is not None:
+            if len(data) > max_bytes:
+                raise ImageTooLarge(f"{uri} is {len(data)} bytes (limit {max_bytes})")
+            return data
+        data = self._race(path, max_bytes)
+        self._cache_put(path, data)
+        return data
+
+    def resolve_image(self, metadata_uri, max_bytes):
+        """Map a token/verification metadata URI to its image URI (memoised)"""
+        with self.lock:
+            image_uri = self.image_uris.get(metadata_uri)
+        if image_uri is None:
+            image_uri = json.loads(self.fetch(metadata_uri, max_bytes))["image"]
+            if ipfs_path(metadata_uri) is not None:
+                # Only immutable metadata may be memoised
+                with self.lock:
+                    self.image_uris[metadata_uri] = image_uri
+        return image_uri
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "cache_bytes": self.cache_bytes,
+                "memoised_uris": len(self.image_uris),
+            }
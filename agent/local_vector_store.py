@@ -0,0 +1,327 @@
+"""In-process vector store backed by a memory-mapped NumPy array.
+
+Vectors are L2-normalised on insert so cosine similarity is a dot product.
+Small collections are searched exactly by brute force. Once the collection
+reaches `ivf_threshold` points, an IVF index (k-means centroids with inverted
+lists of rows) is built and searches only scan the `nprobe` closest lists.
+Points added after the build are appended to their closest list; the index is
+rebuilt when the collection doubles in size. Builds happen on `flush()` (or a
+read-only store's `refresh()`), never on the search path, and k-means runs
+outside the store lock, so searches keep using the previous index meanwhile.
+
+On disk, `vectors.f32` holds the raw float32 rows and `points.json` the id
+and payload of each row; `ivf.npz` keeps the IVF index so a restart does not
+re-run k-means before its first search. `snapshot()` writes the points into a
+single `.npz` file that `restore()` loads back.
+
+A store opened with `read_only=True` maps the same files without writing to
+them, for processes that share an index maintained by another one; `refresh()`
+picks up the points the writer has flushed since.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+from vector_store import VectorStore
+
+
+class LocalVectorStore(VectorStore):
+    def __init__(self, directory, dim=512, initial_capacity=1024, ivf_threshold=20000, nprobe=8, read_only=False):
+        self.directory = directory
+        self.dim = dim
+        self.read_only = read_only
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self.lock = threading.RLock()
+        # Held for the duration of an IVF build (k-means runs without `lock`)
+        self.ivf_lock = threading.Lock()
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.points_path = os.path.join(directory, "points.json")
+        self.ivf_path = os.path.join(directory, "ivf.npz")
+        os.makedirs(directory, exist_ok=True)
+
+        self.ids = []
+        self.payloads = []
+        self.points_version = None
+        points = self._read_points()
+        if points is not None:
+            self.ids = [id for id, _ in points]
+            self.payloads = [payload for _, payload in points]
+        self.rows = {id: row for row, id in enumerate(self.ids)}
+        self._open(max(initial_capacity, len(self.ids)))
+        self._reset_ivf()
+        self._load_ivf()
+
+    def _read_points(self):
+        """The flushed id/payload table, or None if it has not changed since the last read"""
+        try:
+            stat = os.stat(self.points_path)
+        except FileNotFoundError:
+            return None
+        version = (stat.st_mtime_ns, stat.st_size)
+        if version == self.points_version:
+            return None
+        with open(self.points_path) as f:
+            points = json.load(f)
+        self.points_version = version
+        return points
+
+    def _open(self, capacity):
+        if self.read_only:
+            capacity = os.path.getsize(self.vectors_path) // (self.dim * 4)
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(capacity, self.dim))
+            return
+        size = capacity * self.dim * 4
+        with open(self.vectors_path, "ab"):
+            pass
+        if os.path.getsize(self.vectors_path) < size:
+            os.truncate(self.vectors_path, size)
+        capacity = os.path.getsize(self.vectors_path) // (self.dim * 4)
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _reset_ivf(self):
+        self.centroids = None
+        self.lists = None
+        self.ivf_size = 0
+
+    def ensure_collection(self):
+        return "local"
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def _normalize(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def add(self, id, vector, payload=None):
+        """Write a point to the memory map; `flush` persists the id/payload table"""
+        vector = self._normalize(vector)
+        with self.lock:
+            row = self.rows.get(id)
+            if row is None:
+                row = len(self.ids)
+                if row >= self.vectors.shape[0]:
+                    self.vectors.flush()
+                    self._open(self.vectors.shape[0] * 2)
+                self.ids.append(id)
+                self.payloads.append(payload or {})
+                self.rows[id] = row
+                if self.centroids is not None:
+                    nearest = int(np.argmax(self.centroids @ vector))
+                    self.lists[nearest] = np.append(self.lists[nearest], row)
+            else:
+                self.payloads[row] = payload or {}
+            self.vectors[row] = vector
+
+    def upsert(self, id, vector, payload=None):
+        self.add(id, vector, payload)
+        self.flush()
+
+    def flush(self):
+        if self.read_only:
+            return
+        self._maybe_build_ivf()
+        with self.lock:
+            self.vectors.flush()
+            tmp_path = f"{self.points_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump([[id, payload] for id, payload in zip(self.ids, self.payloads)], f)
+            os.replace(tmp_path, self.points_path)
+            self._save_ivf()
+
+    def refresh(self):
+        """Read-only stores: load the points flushed by the writer since the last refresh"""
+        if not self.read_only:
+            return
+        with self.lock:
+            points = self._read_points()
+            if points is not None:
+                self._load_points(points)
+        # Also covers a store opened past the threshold without the writer's index
+        self._maybe_build_ivf()
+
+    def _load_points(self, points):
+        old_count = len(self.ids)
+        ids = [id for id, _ in points]
+        if ids[:old_count] != self.ids:
+            # Rewritten (e.g. restored from a snapshot) rather than appended to
+            old_count = 0
+            self._reset_ivf()
+        self.ids = ids
+        self.payloads = [payload for _, payload in points]
+        self.rows = {id: row for row, id in enumerate(self.ids)}
+        if len(self.ids) > self.vectors.shape[0]:
+            self._open(len(self.ids))
+        if self.centroids is not None:
+            self._assign_rows(np.arange(old_count, len(self.ids)))
+
+    # ------------------------------------------------------------------
+    # IVF index
+    # ------------------------------------------------------------------
+
+    def build_ivf(self, iterations=10, seed=0):
+        """Cluster the stored vectors into ~sqrt(N) inverted lists with spherical k-means"""
+        with self.ivf_lock:
+            self._build_ivf(iterations, seed)
+
+    def _build_ivf(self, iterations=10, seed=0):
+        with self.lock:
+            n = len(self.ids)
+            if n == 0:
+                return
+            ids = self.ids[:n]
+            # A view, not a copy: rows below n are only rewritten by upserts of existing ids
+            data = self.vectors[:n]
+        nlist = max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        centroids = data[rng.choice(n, nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, data)
+            counts = np.bincount(assignment, minlength=nlist)
+            nonempty = counts > 0
+            centroids[nonempty] = self._normalize(sums[nonempty])
+        assignment = np.argmax(data @ centroids.T, axis=1)
+        with self.lock:
+            if self.ids[:n] != ids:
+                # Rewritten (e.g. restored from a snapshot) during the build
+                return
+            self.centroids = centroids
+            self.lists = [np.flatnonzero(assignment == i) for i in range(nlist)]
+            self.ivf_size = n
+            # Points added while k-means ran
+            self._assign_rows(np.arange(n, len(self.ids)))
+
+    def _assign_rows(self, rows):
+        """Same as add(): each row joins its closest inverted list"""
+        if not len(rows):
+            return
+        nearest = np.argmax(self.vectors[rows] @ self.centroids.T, axis=1)
+        for row, list_index in zip(rows, nearest):
+            self.lists[list_index] = np.append(self.lists[list_index], row)
+
+    def _save_ivf(self):
+        if self.centroids is None:
+            if os.path.exists(self.ivf_path):
+                os.remove(self.ivf_path)
+            return
+        tmp_path = f"{self.ivf_path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            centroids=self.centroids,
+            rows=np.concatenate(self.lists),
+            offsets=np.cumsum([0] + [len(rows) for rows in self.lists]),
+            ivf_size=self.ivf_size,
+        )
+        os.replace(tmp_path, self.ivf_path)
+
+    def _load_ivf(self):
+        if not os.path.exists(self.ivf_path):
+            return
+        with np.load(self.ivf_path) as ivf:
+            rows, offsets = ivf["rows"], ivf["offsets"]
+            # Only trust an index written together with the current points table
+            if len(rows) != len(self.ids) or int(ivf["ivf_size"]) > len(self.ids):
+                return
+            self.centroids = ivf["centroids"]
+            self.lists = [rows[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+            self.ivf_size = int(ivf["ivf_size"])
+
+    def _maybe_build_ivf(self):
+        """Build the IVF index once the store reaches `ivf_threshold` points, and rebuild it when it doubles"""
+        with self.lock:
+            n = len(self.ids)
+            if n < self.ivf_threshold:
+                if self.centroids is not None:
+                    self._reset_ivf()
+                return
+            if self.centroids is not None and n < 2 * self.ivf_size:
+                return
+        # Another thread is already building one
+        if not self.ivf_lock.acquire(blocking=False):
+            return
+        try:
+            self._build_ivf()
+        finally:
+            self.ivf_lock.release()
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def _results(self, rows, scores, limit):
+        if len(rows) > limit:
+            top = np.argpartition(-scores, limit)[:limit]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores)
+        return [
+            {"id": self.ids[row], "score": float(score), "payload": self.payloads[row]}
+            for row, score in zip(rows[order], scores[order])
+        ]
+
+    def search_batch(self, vectors, limit=5):
+        queries = self._normalize(np.atleast_2d(vectors))
+        with self.lock:
+            n = len(self.ids)
+            if n == 0:
+                return [[] for _ in queries]
+
+            if self.centroids is None:
+                # Exact: one matrix product for the whole batch
+                scores = queries @ self.vectors[:n].T
+                rows = np.arange(n)
+                return [self._results(rows, query_scores, limit) for query_scores in scores]
+
+            nprobe = min(self.nprobe, len(self.lists))
+            probes = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :nprobe]
+            results = []
+            for query, probe in zip(queries, probes):
+                rows = np.concatenate([self.lists[i] for i in probe])
+                results.append(self._results(rows, self.vectors[rows] @ query, limit))
+            return results
+
+    def search(self, vector, limit=5):
+        return self.search_batch([vector], limit)[0]
+
+    def existing_ids(self, ids):
+        with self.lock:
+            return {id for id in ids if id in self.rows}
+
+    def count(self):
+        return len(self.ids)
+
+    # ------------------------------------------------------------------
+    # Snapshots
+    # ------------------------------------------------------------------
+
+    def snapshot(self, path):
+        """Write every point to a single compressed .npz file"""
+        with self.lock:
+            n = len(self.ids)
+            np.savez_compressed(
+                path,
+                vectors=np.asarray(self.vectors[:n]),
+                points=np.array(json.dumps([[id, payload] for id, payload in zip(self.ids, self.payloads)])),
+            )
+
+    def restore(self, path):
+        """Replace the store's contents with a snapshot written by `snapshot`"""
+        with np.load(path) as snapshot:
+            vectors = snapshot["vectors"]
+            points = json.loads(str(snapshot["points"]))
+        with self.lock:
+            self.ids = [id for id, _ in points]
+            self.payloads = [payload for _, payload in points]
+            self.rows = {id: row for row, id in enumerate(self.ids)}
+            if len(self.ids) > self.vectors.shape[0]:
+                self.vectors.flush()
+                self._open(len(self.ids))
+            self.vectors[:len(self.ids)] = vectors
+            self._reset_ivf()
+            self.flush()
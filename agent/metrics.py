@@ -0,0 +1,244 @@
+"""In-process metrics: labelled counters, gauges and latency histograms.
+
+Everything registered here is rendered in the Prometheus text exposition
+format by `render()`, and `serve()` exposes it over HTTP at /metrics (plus
+any extra routes, such as the profiling hooks in `profiling.py`).
+"""
+import functools
+import inspect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Upper bounds in seconds; the last bucket catches everything slower
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket containing it"""
+        with self.lock:
+            if not self.count:
+                return 0.0
+            rank = q * self.count
+            seen = 0
+            for bound, count in zip(self.buckets, self.counts):
+                seen += count
+                if seen >= rank:
+                    return bound
+            return self.buckets[-1]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+        self.lock = threading.Lock()
+
+    def set(self, value):
+        with self.lock:
+            self.value = value
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def set_function(self, function):
+        """Read the value from `function()` at scrape time instead"""
+        self.function = function
+
+    def get(self):
+        if self.function is not None:
+            return self.function()
+        return self.value
+
+
+_metrics = {"counter": {}, "gauge": {}, "histogram": {}}
+_metrics_lock = threading.Lock()
+_factories = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}
+
+
+def _get(kind, name, labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        registry = _metrics[kind]
+        if key not in registry:
+            registry[key] = _factories[kind]()
+        return registry[key]
+
+
+def histogram(name, **labels):
+    """Get or create the histogram for a metric name and label set"""
+    return _get("histogram", name, labels)
+
+
+def counter(name, **labels):
+    return _get("counter", name, labels)
+
+
+def gauge(name, **labels):
+    return _get("gauge", name, labels)
+
+
+def histograms(name):
+    """All histograms recorded under `name`, keyed by their label dicts' items"""
+    with _metrics_lock:
+        return {labels: h for (metric, labels), h in _metrics["histogram"].items() if metric == name}
+
+
+@contextmanager
+def timer(name, **labels):
+    """Observe the duration of the `with` block in seconds, even if it raises"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram(name, **labels).observe(time.perf_counter() - start)
+
+
+def timed(name, **labels):
+    """Decorator form of `timer` for plain and async functions"""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with timer(name, **labels):
+                    return await fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with timer(name, **labels):
+                    return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# ============================================================================
+# Prometheus exposition
+# ============================================================================
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _number(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def render():
+    """All metrics in the Prometheus text format (version 0.0.4)"""
+    with _metrics_lock:
+        snapshot = {kind: dict(registry) for kind, registry in _metrics.items()}
+
+    families = {}
+    for kind, registry in snapshot.items():
+        for (name, labels), metric in registry.items():
+            families.setdefault((name, kind), []).append((labels, metric))
+
+    lines = []
+    for (name, kind), series in sorted(families.items()):
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, metric in sorted(series, key=lambda item: item[0]):
+            if kind == "counter":
+                lines.append(f"{name}{_labels(labels)} {metric.value}")
+            elif kind == "gauge":
+                try:
+                    value = metric.get()
+                except Exception:
+                    continue
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+            else:
+                with metric.lock:
+                    counts, total, count = list(metric.counts), metric.sum, metric.count
+                cumulative = 0
+                for bound, bucket_count in zip(metric.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_labels(labels, [('le', _number(bound))])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def serve(port, host="127.0.0.1", routes=None):
+    """Serve /metrics on `port` from a daemon thread.
+
+    `routes` maps extra GET paths to `fn(query) -> (content_type, body)`,
+    where `query` is the parsed query string. A route raises ValueError to
+    reject its query with a 400.
+    """
+    routes = {"/metrics": lambda query: ("text/plain; version=0.0.4", render()), **(routes or {})}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            route = routes.get(url.path)
+            if route is None:
+                self.send_error(404)
+                return
+            try:
+                content_type, body = route(parse_qs(url.query))
+                status = 200
+            except ValueError as e:
+                content_type, body, status = "text/plain", f"{e}\n", 400
+            except Exception as e:
+                content_type, body, status = "text/plain", f"{e}\n", 500
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
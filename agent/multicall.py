@@ -0,0 +1,55 @@
+"""Aggregated contract reads through Multicall3.
+
+Multicall3 is deployed at the same address on nearly every EVM chain,
+including Arbitrum Sepolia, and lets many view calls be answered by a single
+`eth_call` to `aggregate3`.
+"""
+from web3 import Web3
+
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+MULTICALL3_ABI = [
+    {"inputs": [{"components": [{"internalType": "address", "name": "target", "type": "address"}, {"internalType": "bool", "name": "allowFailure", "type": "bool"}, {"internalType": "bytes", "name": "callData", "type": "bytes"}], "internalType": "struct Multicall3.Call3[]", "name": "calls", "type": "tuple[]"}], "name": "aggregate3", "outputs": [{"components": [{"internalType": "bool", "name": "success", "type": "bool"}, {"internalType": "bytes", "name": "returnData", "type": "bytes"}], "internalType": "struct Multicall3.Result[]", "name": "returnData", "type": "tuple[]"}], "stateMutability": "payable", "type": "function"}
+]
+
+
+class Multicall:
+    def __init__(self, w3, address=MULTICALL3_ADDRESS, chunk_size=500):
+        self.w3 = w3
+        self.contract = w3.eth.contract(address=Web3.to_checksum_address(address), abi=MULTICALL3_ABI)
+        # Keeps each eth_call well below node gas / response size limits
+        self.chunk_size = chunk_size
+
+    def call(self, calls):
+        """Execute bound contract view functions; returns decoded results, None for failed calls"""
+        results = []
+        for start in range(0, len(calls), self.chunk_size):
+            chunk = calls[start:start + self.chunk_size]
+            encoded = [
+                (fn.address, True, fn.selector + self.w3.codec.encode(fn.argument_types, fn.args).hex())
+                for fn in chunk
+            ]
+            for fn, (success, data) in zip(chunk, self.contract.functions.aggregate3(encoded).call()):
+                if not success:
+                    results.append(None)
+                    continue
+                output_types = [output["type"] for output in fn.abi["outputs"]]
+                decoded = self.w3.codec.decode(output_types, data)
+                results.append(decoded[0] if len(decoded) == 1 else decoded)
+        return results
+
+
+def call_many(multicall, calls):
+    """Results of bound view calls, through `multicall` when given.
+
+    Falls back to one eth_call per function if Multicall3 is unavailable or
+    any aggregated call failed.
+    """
+    if multicall is not None:
+        try:
+            results = multicall.call(calls)
+            if None not in results:
+                return results
+        except Exception:
+            pass
+    return [call.call() for call in calls]
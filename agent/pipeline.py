@@ -0,0 +1,182 @@
+"""Staged verification pipeline.
+
+Each verification request flows through a list of stages (fetch, embed,
+search, decide, submit). Every stage has its own pool of worker coroutines
+which run the blocking stage function in a shared thread pool, so a slow IPFS
+gateway only ties up fetch workers instead of the whole agent event loop.
+
+Stages are connected by bounded asyncio queues: when a downstream stage falls
+behind, upstream workers block on `put` (backpressure) and new requests are
+refused by `try_submit` until there is room again. Every job carries a
+deadline; stages started after it has passed, or still running when it
+passes, drop the job so it is picked up again on a later sync. A stage can
+also raise `JobDeferred` to drop a job on purpose for the same retry.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class JobDeferred(Exception):
+    """Raised by a stage to leave the request for a later sync (not counted as a failure)"""
+
+
+class VerificationJob:
+    def __init__(self, request_id, uri, deadline, logger):
+        self.request_id = request_id
+        self.uri = uri
+        self.deadline = time.monotonic() + deadline
+        self.logger = logger
+        self.created = time.monotonic()
+        self.timings = {}
+        # Filled in by the stages
+        self.image = None
+        self.embedding = None
+        self.search_results = None
+        self.searched_at = None
+        self.result = None
+        self.matched_token_id = 0
+        self.score = None
+
+    def remaining(self):
+        return self.deadline - time.monotonic()
+
+
+class Stage:
+    def __init__(self, name, fn, concurrency=1, enforce_deadline=True, skip=None):
+        self.name = name
+        self.fn = fn
+        self.concurrency = concurrency
+        # Stages with side effects (e.g. sending a transaction) must not be
+        # abandoned half-way, so they only check the deadline before starting
+        self.enforce_deadline = enforce_deadline
+        # Optional predicate: jobs for which it returns True pass straight through
+        self.skip = skip
+
+
+class Pipeline:
+    def __init__(self, stages, queue_size=32):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.queues = []
+        self.tasks = []
+        self.executor = None
+        self.logger = None
+        self.in_flight = set()
+        self.completed = 0
+        self.failed = 0
+        self.expired = 0
+        self.deferred = 0
+        # Optional callback(job, outcome) for jobs that leave the pipeline unfinished
+        self.on_drop = None
+
+    def start(self, logger):
+        """Spawn the stage workers on the running event loop"""
+        self.logger = logger
+        self.executor = ThreadPoolExecutor(
+            max_workers=sum(stage.concurrency for stage in self.stages),
+            thread_name_prefix="pipeline",
+        )
+        self.queues = [asyncio.Queue(maxsize=self.queue_size) for _ in self.stages]
+        for stage, queue in zip(self.stages, self.queues):
+            metrics.gauge("pipeline_queue_depth", stage=stage.name).set_function(queue.qsize)
+        metrics.gauge("pipeline_in_flight").set_function(lambda: len(self.in_flight))
+        for index, stage in enumerate(self.stages):
+            for _ in range(stage.concurrency):
+                self.tasks.append(asyncio.create_task(self._worker(index)))
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.executor.shutdown(wait=False)
+
+    def try_submit(self, job):
+        """Queue a job unless it is already in flight or the pipeline is full"""
+        if not self.queues or job.request_id in self.in_flight:
+            return False
+        try:
+            self.queues[0].put_nowait(job)
+        except asyncio.QueueFull:
+            return False
+        self.in_flight.add(job.request_id)
+        return True
+
+    async def drain(self, poll_interval=0.01):
+        """Wait until every submitted job has left the pipeline"""
+        while self.in_flight:
+            await asyncio.sleep(poll_interval)
+
+    def backlog(self):
+        return {stage.name: queue.qsize() for stage, queue in zip(self.stages, self.queues)}
+
+    async def _run_stage(self, stage, job):
+        if stage.skip is not None and stage.skip(job):
+            metrics.counter("pipeline_stage_skipped_total", stage=stage.name).inc()
+            return
+        remaining = job.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"deadline passed before {stage.name}")
+
+        start = time.perf_counter()
+        call = asyncio.get_running_loop().run_in_executor(self.executor, stage.fn, job)
+        if stage.enforce_deadline:
+            try:
+                await asyncio.wait_for(call, timeout=remaining)
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded(f"deadline passed during {stage.name}")
+        else:
+            await call
+        job.timings[stage.name] = time.perf_counter() - start
+        metrics.histogram("pipeline_stage_seconds", stage=stage.name).observe(job.timings[stage.name])
+
+    def _dropped(self, job, outcome):
+        if self.on_drop is not None:
+            self.on_drop(job, outcome)
+
+    async def _worker(self, index):
+        stage = self.stages[index]
+        queue = self.queues[index]
+        next_queue = self.queues[index + 1] if index + 1 < len(self.queues) else None
+
+        while True:
+            job = await queue.get()
+            try:
+                await self._run_stage(stage, job)
+            except DeadlineExceeded as e:
+                self.expired += 1
+                metrics.counter("pipeline_jobs_total", outcome="expired", stage=stage.name).inc()
+                self.in_flight.discard(job.request_id)
+                self.logger.warning(f"Verification #{job.request_id} dropped: {e}")
+                self._dropped(job, "expired")
+                continue
+            except JobDeferred as e:
+                self.deferred += 1
+                metrics.counter("pipeline_jobs_total", outcome="deferred", stage=stage.name).inc()
+                self.in_flight.discard(job.request_id)
+                self.logger.info(f"Verification #{job.request_id} deferred: {e}")
+                self._dropped(job, "deferred")
+                continue
+            except Exception as e:
+                self.failed += 1
+                metrics.counter("pipeline_jobs_total", outcome="failed", stage=stage.name).inc()
+                self.in_flight.discard(job.request_id)
+                self.logger.error(f"Failed to handle verification #{job.request_id} in {stage.name}: {e}")
+                self._dropped(job, "failed")
+                continue
+            finally:
+                queue.task_done()
+
+            if next_queue is not None:
+                await next_queue.put(job)
+            else:
+                self.completed += 1
+                metrics.counter("pipeline_jobs_total", outcome="completed", stage=stage.name).inc()
+                self.in_flight.discard(job.request_id)
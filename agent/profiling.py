@@ -0,0 +1,117 @@
+"""Runtime-switchable stack sampling profiler.
+
+`StackSampler` wakes up every `interval` seconds and records the Python stack
+of every thread (pipeline workers, batchers, the transaction tracker and the
+event loop alike). Stacks are aggregated in the folded "frame;frame;frame
+count" format that py-spy, flamegraph.pl and speedscope all read, with frames
+written as `function (file:line)` like py-spy's raw output.
+
+It is off by default; `routes()` exposes start/stop/dump endpoints for the
+metrics server so it can be switched on in a running agent:
+
+    curl 'localhost:8002/debug/sampling/start?interval=0.005'
+    curl localhost:8002/debug/sampling/stop > agent.folded
+"""
+import math
+import os
+import sys
+import threading
+from collections import Counter
+
+# Shortest accepted sampling interval; anything smaller keeps a core busy walking stacks
+MIN_INTERVAL = 0.001
+
+
+class StackSampler:
+    def __init__(self, interval=0.01, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopping = threading.Event()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, interval=None):
+        """Start sampling (no-op if already running); previous samples are kept until `reset`"""
+        if self.running:
+            return
+        if interval is not None:
+            self.interval = interval
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.running:
+            self.stopping.set()
+            self.thread.join()
+        self.thread = None
+
+    def reset(self):
+        with self.lock:
+            self.stacks.clear()
+            self.samples = 0
+
+    def _stack(self, frame):
+        frames = []
+        while frame is not None and len(frames) < self.max_depth:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(frames))
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self.stopping.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = [
+                f"{names.get(thread_id, thread_id)};{self._stack(frame)}"
+                for thread_id, frame in sys._current_frames().items() if thread_id != own_id
+            ]
+            with self.lock:
+                self.stacks.update(stacks)
+                self.samples += 1
+
+    def folded(self):
+        """Aggregated stacks, one `stack count` line each, most frequent first"""
+        with self.lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def routes(sampler):
+    """Metrics-server routes that switch `sampler` on and off at runtime"""
+    def start(query):
+        interval = None
+        if "interval" in query:
+            try:
+                interval = float(query["interval"][0])
+            except ValueError:
+                raise ValueError(f"interval must be a number of seconds, got {query['interval'][0]!r}")
+            if not (math.isfinite(interval) and interval >= MIN_INTERVAL):
+                raise ValueError(f"interval must be at least {MIN_INTERVAL}s, got {query['interval'][0]!r}")
+        if "reset" in query:
+            sampler.reset()
+        sampler.start(interval)
+        return "text/plain", f"sampling every {sampler.interval}s\n"
+
+    def stop(query):
+        sampler.stop()
+        return "text/plain", sampler.folded()
+
+    def dump(query):
+        return "text/plain", sampler.folded()
+
+    def status(query):
+        return "text/plain", f"running={sampler.running} interval={sampler.interval} samples={sampler.samples}\n"
+
+    return {
+        "/debug/sampling/start": start,
+        "/debug/sampling/stop": stop,
+        "/debug/sampling/folded": dump,
+        "/debug/sampling": status,
+    }
@@ -0,0 +1,56 @@
+"""web3 middleware counting JSON-RPC calls per method and contract function.
+
+`eth_call` and `eth_estimateGas` requests are attributed to a contract
+function by looking up the 4-byte selector at the start of their calldata in
+the ABIs the agent uses, so `rpc_requests_total` shows e.g. how many
+`hasAgentResponded` calls a sync tick costs. Unbatched requests are also
+timed in `rpc_request_seconds`.
+"""
+from eth_utils import function_abi_to_4byte_selector
+from web3 import Web3
+from web3.middleware import Web3Middleware
+
+import metrics
+
+DECODED_METHODS = {"eth_call", "eth_estimateGas"}
+
+
+def function_selectors(*abis):
+    """Map 0x-prefixed 4-byte selectors to function names"""
+    selectors = {}
+    for abi in abis:
+        for item in abi:
+            if item.get("type") == "function":
+                selectors[Web3.to_hex(function_abi_to_4byte_selector(item))] = item["name"]
+    return selectors
+
+
+class RpcMetricsMiddleware(Web3Middleware):
+    selectors = {}
+
+    def _function(self, method, params):
+        if method not in DECODED_METHODS or not params or not isinstance(params[0], dict):
+            return ""
+        data = params[0].get("data") or params[0].get("input") or ""
+        if isinstance(data, (bytes, bytearray)):
+            data = Web3.to_hex(data)
+        return self.selectors.get(data[:10].lower(), "unknown")
+
+    def request_processor(self, method, params):
+        # Runs for every request, batched or not
+        metrics.counter("rpc_requests_total", method=method, function=self._function(method, params)).inc()
+        return method, params
+
+    def wrap_make_request(self, make_request):
+        middleware = super().wrap_make_request(make_request)
+
+        def timed(method, params):
+            with metrics.timer("rpc_request_seconds", method=method):
+                return middleware(method, params)
+
+        return timed
+
+
+def rpc_metrics_middleware(*abis):
+    """A middleware class attributing calls to the functions of `abis`"""
+    return type("RpcMetricsMiddleware", (RpcMetricsMiddleware,), {"selectors": function_selectors(*abis)})
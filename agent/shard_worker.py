@@ -0,0 +1,53 @@
+"""Entry point of a verification shard process, started by shards.ShardPool.
+
+Imports only the verification stages and stores (verification.py) in the
+"shard" role, which opens the shared stores read-only, and serves requests
+from the coordinating agent until it disconnects. The wallet, contracts and
+uAgents identity stay in the agent process.
+"""
+import os
+
+os.environ["AGENT_ROLE"] = "shard"
+
+import asyncio  # noqa: E402
+import logging  # noqa: E402
+
+import metrics  # noqa: E402
+import verification  # noqa: E402
+from pipeline import Stage, VerificationJob  # noqa: E402
+from shards import ShardConnection  # noqa: E402
+
+# How often shard workers reload the NFTs the coordinator has indexed (seconds)
+SHARD_REFRESH_PERIOD = float(os.getenv("SHARD_REFRESH_PERIOD", "2"))
+SHARD_LOG_LEVEL = os.getenv("SHARD_LOG_LEVEL", "INFO")
+# The agent's metrics server settings; each shard serves on METRICS_PORT + 1 + its index
+METRICS_PORT = int(os.getenv("METRICS_PORT", "8002"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# The link to the coordinating agent, set by main()
+shard_connection = None
+
+
+def report_stage(job: VerificationJob):
+    # Hand the decision to the coordinating agent, which owns the wallet
+    shard_connection.report(job.request_id, job.result, job.matched_token_id)
+
+
+def main():
+    """Verify the requests routed here until the coordinator exits"""
+    global shard_connection
+    logging.basicConfig(level=SHARD_LOG_LEVEL, format="%(levelname)s: [%(name)s]: %(message)s")
+    logger = logging.getLogger(f"realia_shard_{os.environ['AGENT_SHARD_INDEX']}")
+    shard_connection = ShardConnection.from_environment()
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT + 1 + shard_connection.index, METRICS_HOST)
+    pipeline = verification.build_pipeline(Stage("report", report_stage))
+    asyncio.run(shard_connection.serve(
+        pipeline, logger,
+        lambda request_id, uri: VerificationJob(request_id, uri, verification.VERIFY_DEADLINE, logger),
+        verification.refresh_shared_stores, SHARD_REFRESH_PERIOD,
+    ))
+
+
+if __name__ == "__main__":
+    main()
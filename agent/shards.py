@@ -0,0 +1,253 @@
+"""Verification sharding across worker processes on one host.
+
+With VERIFY_WORKERS > 0 the agent process becomes a coordinator: it keeps
+the uAgents server, chat, NFT sync, verification intake and the wallet, and
+starts `shard_worker.py` processes that run the verification pipeline up to
+the decision. Requests are routed to workers by consistent hashing on the
+request id (`HashRing`), so a worker that dies or restarts only moves its own
+share of the requests. Workers open the coordinator's local vector index,
+embedding cache, image hashes and tile descriptors read-only (memory-mapped)
+and send their decisions back; the coordinator is the only process that
+submits transactions, so a single nonce stream and one answered-request set
+rule out double answers.
+
+Coordinator and workers talk over a `multiprocessing.connection` socket on
+localhost authenticated with a per-run key:
+
+    coordinator -> worker   ("verify", request_id, uri)
+    worker -> coordinator   ("hello", index, pid)
+                            ("result", request_id, result, matched_token_id)
+                            ("dropped", request_id, outcome)
+"""
+import asyncio
+import bisect
+import hashlib
+import os
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+import metrics
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "shard_worker.py")
+
+
+class HashRing:
+    """Consistent hashing of keys onto nodes, with `replicas` virtual points per node"""
+
+    def __init__(self, nodes=(), replicas=64):
+        self.replicas = replicas
+        self.points = []
+        self.owners = {}
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.sha256(str(value).encode("utf-8")).digest()[:8], "big")
+
+    def add(self, node):
+        for i in range(self.replicas):
+            point = self._hash(f"{node}:{i}")
+            if point not in self.owners:
+                bisect.insort(self.points, point)
+                self.owners[point] = node
+
+    def remove(self, node):
+        for i in range(self.replicas):
+            point = self._hash(f"{node}:{i}")
+            if self.owners.get(point) == node:
+                del self.owners[point]
+                self.points.pop(bisect.bisect_left(self.points, point))
+
+    def owner(self, key):
+        """The node responsible for `key`, or None if the ring is empty"""
+        if not self.points:
+            return None
+        index = bisect.bisect(self.points, self._hash(key)) % len(self.points)
+        return self.owners[self.points[index]]
+
+
+class ShardPool:
+    """Coordinator side: starts the workers and routes requests to them"""
+
+    def __init__(self, workers, on_result, queue_size=32, script=WORKER_SCRIPT):
+        self.workers = workers
+        # on_result(request_id, result, matched_token_id), called from a reader thread
+        self.on_result = on_result
+        self.queue_size = queue_size
+        self.script = script
+        self.authkey = os.urandom(16)
+        self.lock = threading.Lock()
+        self.ring = HashRing()
+        self.connections = {}
+        self.processes = {}
+        # request_id -> worker index, until the worker reports back
+        self.in_flight = {}
+        self.outstanding = {}
+        self.listener = None
+        self.logger = None
+        self.stopping = False
+
+    def start(self, logger):
+        self.logger = logger
+        self.listener = Listener(("127.0.0.1", 0), authkey=self.authkey)
+        metrics.gauge("shard_workers").set_function(lambda: len(self.connections))
+        metrics.gauge("shard_in_flight").set_function(lambda: len(self.in_flight))
+        threading.Thread(target=self._accept_loop, name="shard-accept", daemon=True).start()
+        for index in range(self.workers):
+            self._spawn(index)
+        threading.Thread(target=self._monitor, name="shard-monitor", daemon=True).start()
+
+    def stop(self):
+        self.stopping = True
+        for process in self.processes.values():
+            process.terminate()
+        for process in self.processes.values():
+            process.wait()
+        self.listener.close()
+
+    def _spawn(self, index):
+        host, port = self.listener.address
+        env = {
+            **os.environ,
+            "AGENT_SHARD_INDEX": str(index),
+            "AGENT_SHARD_ADDRESS": f"{host}:{port}",
+            "AGENT_SHARD_AUTHKEY": self.authkey.hex(),
+        }
+        self.processes[index] = subprocess.Popen([sys.executable, self.script], env=env)
+
+    def _monitor(self):
+        while not self.stopping:
+            time.sleep(1)
+            for index, process in list(self.processes.items()):
+                if process.poll() is None or self.stopping:
+                    continue
+                self.logger.warning(f"⚠️ Verification shard {index} exited with status {process.returncode}, restarting")
+                self._lost(index)
+                self._spawn(index)
+
+    def _accept_loop(self):
+        while not self.stopping:
+            try:
+                connection = self.listener.accept()
+                _, index, pid = connection.recv()
+            except Exception:
+                continue
+            with self.lock:
+                self.connections[index] = connection
+                self.outstanding[index] = 0
+                self.ring.add(index)
+            self.logger.info(f"🧩 Verification shard {index} (pid {pid}) connected")
+            threading.Thread(target=self._read_loop, args=(index, connection), name=f"shard-{index}", daemon=True).start()
+
+    def _read_loop(self, index, connection):
+        while True:
+            try:
+                message = connection.recv()
+            except (EOFError, OSError):
+                self._lost(index)
+                return
+            kind, request_id = message[0], message[1]
+            if kind == "result":
+                try:
+                    self.on_result(request_id, message[2], message[3])
+                except Exception as e:
+                    self.logger.error(f"Failed to handle shard result for #{request_id}: {e}")
+            metrics.counter("shard_jobs_total", shard=str(index), outcome=kind if kind == "result" else message[2]).inc()
+            # Only after on_result has recorded the answer, so intake never sees a gap
+            with self.lock:
+                if self.in_flight.pop(request_id, None) is not None:
+                    self.outstanding[index] = max(self.outstanding.get(index, 0) - 1, 0)
+
+    def _lost(self, index):
+        """Take a worker off the ring; its requests are re-routed by the next intake scan"""
+        with self.lock:
+            connection = self.connections.pop(index, None)
+            if connection is None:
+                return
+            self.ring.remove(index)
+            self.outstanding.pop(index, None)
+            for request_id in [r for r, owner in self.in_flight.items() if owner == index]:
+                del self.in_flight[request_id]
+        connection.close()
+
+    def dispatch(self, request_id, uri):
+        """Send a request to its worker; False if it is in flight, no worker is up or the worker is full"""
+        with self.lock:
+            if request_id in self.in_flight:
+                return False
+            index = self.ring.owner(request_id)
+            if index is None or self.outstanding[index] >= self.queue_size:
+                return False
+            try:
+                self.connections[index].send(("verify", request_id, uri))
+            except OSError:
+                return False
+            self.in_flight[request_id] = index
+            self.outstanding[index] += 1
+        return True
+
+
+class ShardConnection:
+    """Worker side: receives requests from the coordinator and reports decisions"""
+
+    def __init__(self, address, authkey, index):
+        self.index = index
+        self.connection = Client(address, authkey=authkey)
+        self.lock = threading.Lock()
+        self.send(("hello", index, os.getpid()))
+
+    @classmethod
+    def from_environment(cls):
+        host, port = os.environ["AGENT_SHARD_ADDRESS"].rsplit(":", 1)
+        return cls((host, int(port)), bytes.fromhex(os.environ["AGENT_SHARD_AUTHKEY"]),
+                   int(os.environ["AGENT_SHARD_INDEX"]))
+
+    def send(self, message):
+        # Pipeline worker threads report concurrently
+        with self.lock:
+            self.connection.send(message)
+
+    def report(self, request_id, result, matched_token_id):
+        self.send(("result", request_id, result, matched_token_id))
+
+    async def serve(self, pipeline, logger, make_job, refresh=None, refresh_period=2.0):
+        """Feed requests into `pipeline` until the coordinator goes away.
+
+        `make_job(request_id, uri)` builds the pipeline job, and `refresh()` (run
+        every `refresh_period` seconds) reloads the shared read-only stores.
+        """
+        loop = asyncio.get_running_loop()
+        requests = asyncio.Queue()
+
+        def receive():
+            while True:
+                try:
+                    message = self.connection.recv()
+                except (EOFError, OSError):
+                    loop.call_soon_threadsafe(requests.put_nowait, None)
+                    return
+                loop.call_soon_threadsafe(requests.put_nowait, message)
+
+        async def refresh_loop():
+            while True:
+                await asyncio.to_thread(refresh)
+                await asyncio.sleep(refresh_period)
+
+        pipeline.on_drop = lambda job, outcome: self.send(("dropped", job.request_id, outcome))
+        pipeline.start(logger)
+        threading.Thread(target=receive, name="shard-receive", daemon=True).start()
+        refresher = asyncio.create_task(refresh_loop()) if refresh is not None else None
+        while True:
+            message = await requests.get()
+            if message is None:
+                break
+            _, request_id, uri = message
+            if not pipeline.try_submit(make_job(request_id, uri)):
+                self.send(("dropped", request_id, "busy"))
+        if refresher is not None:
+            refresher.cancel()
+        await pipeline.stop()
@@ -0,0 +1,36 @@
+"""Small JSON-backed key/value store for agent state that must survive restarts."""
+import json
+import os
+import threading
+
+
+class AgentState:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.data = json.load(f)
+
+    def get(self, key, default=None):
+        with self.lock:
+            return self.data.get(key, default)
+
+    def set(self, key, value):
+        self.update(**{key: value})
+
+    def update(self, **values):
+        with self.lock:
+            self.data.update(values)
+            self._save()
+
+    def _save(self):
+        # Write to a temp file and rename so a crash never leaves a torn file
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,23 @@
+import os
+import tempfile
+
+# verification.py and agent.py read their settings and open their stores at
+# import; point them at a throwaway directory and offline placeholders
+_cache = tempfile.mkdtemp(prefix="realia-test-")
+os.environ.update({
+    "VECTOR_STORE_BACKEND": "local",
+    "LOCAL_INDEX_DIR": os.path.join(_cache, "vector_index"),
+    "EMBEDDING_CACHE_DIR": os.path.join(_cache, "embeddings"),
+    "IPFS_CACHE_DIR": os.path.join(_cache, "ipfs"),
+    "IMAGE_HASH_INDEX_PATH": os.path.join(_cache, "image_hashes.txt"),
+    "TILE_DESCRIPTOR_DIR": os.path.join(_cache, "tile_descriptors"),
+    "AGENT_STATE_PATH": os.path.join(_cache, "agent_state.json"),
+    "ALCHEMY_API_KEY": "test",
+    "REALIA_FACTORY_CONTRACT_ADDRESS": "0x00000000000000000000000000000000000000fa",
+    "REALIA_NFT_CONTRACT_ADDRESS": "0x00000000000000000000000000000000000000fb",
+    "WALLET_SEED": "realia test agent",
+    "WALLET_PRIVATE_KEY": "0x" + "01" * 32,
+    "ASI_ONE_API_KEY": "test",
+    "MULTICALL_ADDRESS": "",
+    "METRICS_PORT": "0",
+})
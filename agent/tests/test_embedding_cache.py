@@ -0,0 +1,77 @@
+import pytest
+
+from embedding_cache import EmbeddingCache
+
+DIM = 8
+
+
+def vector(seed):
+    return [float(seed + i) for i in range(DIM)]
+
+
+def test_keys_depend_on_model_and_bytes(tmp_path):
+    cache = EmbeddingCache(tmp_path, "model-a", dim=DIM)
+    other = EmbeddingCache(tmp_path / "b", "model-b", dim=DIM)
+    assert cache.key(b"image") == cache.key(b"image")
+    assert cache.key(b"image") != cache.key(b"other image")
+    assert cache.key(b"image") != other.key(b"image")
+
+
+def test_round_trip_through_memory_and_disk(tmp_path):
+    cache = EmbeddingCache(tmp_path, "model", dim=DIM, memory_size=1, initial_rows=1)
+    keys = [cache.key(bytes([i])) for i in range(5)]
+    for i, key in enumerate(keys):
+        cache.put(key, vector(i))
+
+    # Only the last key is still in memory; the others come back from the memory map
+    for i, key in enumerate(keys):
+        assert cache.get(key) == vector(i)
+    assert cache.get(cache.key(b"missing")) is None
+    stats = cache.stats()
+    assert stats["disk_entries"] == 5
+    assert stats["disk_hits"] >= 4
+    assert stats["misses"] == 1
+
+
+def test_entries_survive_reopening(tmp_path):
+    cache = EmbeddingCache(tmp_path, "model", dim=DIM, initial_rows=2)
+    keys = [cache.key(bytes([i])) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, vector(i))
+    cache.flush()
+
+    reopened = EmbeddingCache(tmp_path, "model", dim=DIM)
+    assert [reopened.get(key) for key in keys] == [vector(i) for i in range(3)]
+
+
+def test_rejects_wrong_dimension(tmp_path):
+    cache = EmbeddingCache(tmp_path, "model", dim=DIM)
+    with pytest.raises(ValueError):
+        cache.put(cache.key(b"image"), [0.0] * (DIM + 1))
+
+
+def test_read_only_cache_follows_the_writer(tmp_path):
+    writer = EmbeddingCache(tmp_path, "model", dim=DIM, initial_rows=1)
+    first = writer.key(b"first")
+    writer.put(first, vector(1))
+    reader = EmbeddingCache(tmp_path, "model", dim=DIM, read_only=True)
+    assert reader.get(first) == vector(1)
+
+    # Enough rows that the writer has to grow the file past the reader's mapping
+    keys = [writer.key(bytes([i])) for i in range(5)]
+    for i, key in enumerate(keys):
+        writer.put(key, vector(i))
+    assert reader.get(keys[-1]) is None
+    reader.refresh()
+    assert [reader.get(key) for key in keys] == [vector(i) for i in range(5)]
+
+
+def test_read_only_cache_keeps_its_own_puts_in_memory(tmp_path):
+    EmbeddingCache(tmp_path, "model", dim=DIM)
+    reader = EmbeddingCache(tmp_path, "model", dim=DIM, read_only=True)
+    key = reader.key(b"image")
+    reader.put(key, vector(3))
+    reader.flush()
+    assert reader.get(key) == vector(3)
+    assert reader.stats()["disk_entries"] == 0
+    assert EmbeddingCache(tmp_path, "model", dim=DIM).get(key) is None
@@ -0,0 +1,133 @@
+from types import SimpleNamespace
+
+from events import LogPoller
+from state import AgentState
+
+REQUESTED = "0x" + "11" * 32
+RESPONDED = "0x" + "22" * 32
+
+
+class StubEvent:
+    def __init__(self, name, topic):
+        self.name = name
+        self.topic = topic
+
+    def __call__(self):
+        return self
+
+    def process_log(self, log):
+        return {"event": self.name, "blockNumber": log["blockNumber"], "logIndex": log["logIndex"]}
+
+
+class StubChain:
+    """eth_getLogs over an in-memory list of logs, recording every requested range"""
+
+    def __init__(self, head):
+        self.block_number = head
+        self.logs = []
+        self.ranges = []
+
+    def emit(self, block, index=0, topic=REQUESTED, block_hash=None):
+        self.logs.append({
+            "blockNumber": block,
+            "blockHash": block_hash or bytes([block % 256]) * 32,
+            "logIndex": index,
+            "topics": [bytes.fromhex(topic[2:])],
+        })
+
+    def get_logs(self, params):
+        self.ranges.append((params["fromBlock"], params["toBlock"]))
+        assert params["topics"] == [[REQUESTED, RESPONDED]]
+        return [log for log in self.logs if params["fromBlock"] <= log["blockNumber"] <= params["toBlock"]]
+
+
+def poller(tmp_path, head, **options):
+    chain = StubChain(head)
+    contract = SimpleNamespace(
+        address="0x00000000000000000000000000000000000000fa",
+        events=SimpleNamespace(
+            VerificationRequested=StubEvent("VerificationRequested", REQUESTED),
+            VerificationResponseByAgent=StubEvent("VerificationResponseByAgent", RESPONDED),
+        ),
+    )
+    state = AgentState(str(tmp_path / "state.json"))
+    log_poller = LogPoller(SimpleNamespace(eth=chain), contract, ["VerificationRequested", "VerificationResponseByAgent"],
+                           state, "events_block", **options)
+    return log_poller, chain, state
+
+
+def blocks(events):
+    return [(event["event"], event["blockNumber"]) for event in events]
+
+
+def test_first_poll_starts_at_the_confirmed_head(tmp_path):
+    log_poller, chain, state = poller(tmp_path, head=100, confirmations=10)
+    chain.emit(85)
+    chain.emit(95)
+    assert blocks(log_poller.poll()) == [("VerificationRequested", 95)]
+    assert chain.ranges == [(91, 100)]
+    assert state.get("events_block") == 90
+
+
+def test_long_ranges_are_split_into_chunks(tmp_path):
+    log_poller, chain, state = poller(tmp_path, head=1000, confirmations=0, max_range=300)
+    state.set("events_block", 0)
+    chain.emit(1)
+    chain.emit(300)
+    chain.emit(301, topic=RESPONDED)
+    chain.emit(1000)
+    events = log_poller.poll()
+    assert chain.ranges == [(1, 300), (301, 600), (601, 900), (901, 1000)]
+    assert blocks(events) == [
+        ("VerificationRequested", 1), ("VerificationRequested", 300),
+        ("VerificationResponseByAgent", 301), ("VerificationRequested", 1000),
+    ]
+    assert state.get("events_block") == 1000
+
+
+def test_cursor_only_advances_to_confirmed_blocks(tmp_path):
+    log_poller, chain, state = poller(tmp_path, head=100, confirmations=10)
+    state.set("events_block", 80)
+    log_poller.poll()
+    assert state.get("events_block") == 90
+
+    chain.block_number = 95
+    log_poller.poll()
+    # The unconfirmed tail is scanned again on every poll
+    assert chain.ranges[-1] == (91, 95)
+    assert state.get("events_block") == 90
+
+    chain.block_number = 120
+    log_poller.poll()
+    assert chain.ranges[-1] == (91, 120)
+    assert state.get("events_block") == 110
+
+
+def test_rescanned_logs_are_yielded_once(tmp_path):
+    log_poller, chain, state = poller(tmp_path, head=100, confirmations=10)
+    state.set("events_block", 90)
+    chain.emit(95, index=0)
+    chain.emit(95, index=1)
+    assert len(log_poller.poll()) == 2
+
+    chain.block_number = 101
+    chain.emit(101)
+    assert blocks(log_poller.poll()) == [("VerificationRequested", 101)]
+    assert blocks(log_poller.poll()) == []
+    # Once confirmed, remembered logs are forgotten so the set does not grow forever
+    chain.block_number = 120
+    log_poller.poll()
+    assert log_poller.seen == {}
+
+
+def test_reorged_and_removed_logs(tmp_path):
+    log_poller, chain, state = poller(tmp_path, head=100, confirmations=10)
+    state.set("events_block", 90)
+    chain.emit(95, block_hash=b"\x01" * 32)
+    assert len(log_poller.poll()) == 1
+
+    # The block was replaced: the same log under a new block hash is a new event
+    chain.logs = []
+    chain.emit(96, block_hash=b"\x02" * 32)
+    chain.logs.append({**chain.logs[0], "blockNumber": 97, "logIndex": 5, "removed": True})
+    assert blocks(log_poller.poll()) == [("VerificationRequested", 96)]
@@ -0,0 +1,95 @@
+import pytest
+import requests
+
+import http_client
+from http_client import HttpClient
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    """Plays back `outcomes` (exceptions to raise or status codes to answer) in order"""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+        self.responses = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        self.responses.append(FakeResponse(outcome))
+        return self.responses[-1]
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # Take the top of each jittered backoff range so the schedule is deterministic
+    monkeypatch.setattr(http_client.random, "uniform", lambda low, high: high)
+    recorded = []
+    monkeypatch.setattr(http_client.time, "sleep", recorded.append)
+    return recorded
+
+
+def client(outcomes, **options):
+    http = HttpClient(**options)
+    session = FakeSession(outcomes)
+    http.sessions["qdrant.example"] = session
+    return http, session
+
+
+def test_transient_errors_are_retried_with_exponential_backoff(sleeps):
+    http, session = client([requests.ConnectionError(), requests.Timeout(), 503, 200], retries=3, backoff=0.25)
+    response = http.get("https://qdrant.example/collections")
+    assert response.status_code == 200
+    assert len(session.calls) == 4
+    assert sleeps == [0.25, 0.5, 1.0]
+    # The retried 503 was released back to the pool
+    assert session.responses[0].closed
+
+
+def test_backoff_is_capped(sleeps):
+    http, _ = client([503] * 5 + [200], retries=5, backoff=1.0, max_backoff=3.0)
+    http.get("https://qdrant.example/")
+    assert sleeps == [1.0, 2.0, 3.0, 3.0, 3.0]
+
+
+def test_last_attempt_is_returned_or_raised(sleeps):
+    http, session = client([502, 502, 502], retries=2)
+    response = http.get("https://qdrant.example/")
+    assert response.status_code == 502 and not response.closed
+    assert len(session.calls) == 3
+
+    http, _ = client([requests.ConnectionError()] * 3, retries=2)
+    with pytest.raises(requests.ConnectionError):
+        http.get("https://qdrant.example/")
+
+
+def test_client_errors_are_not_retried(sleeps):
+    http, session = client([404])
+    assert http.get("https://qdrant.example/missing").status_code == 404
+    assert len(session.calls) == 1 and sleeps == []
+
+
+def test_requests_get_the_default_timeout():
+    http, session = client([200, 200], timeout=(1, 2))
+    http.post("https://qdrant.example/points", json={})
+    http.get("https://qdrant.example/points", timeout=9)
+    assert [kwargs["timeout"] for _, _, kwargs in session.calls] == [(1, 2), 9]
+
+
+def test_one_pooled_session_per_host():
+    http = HttpClient(pool_size=4)
+    assert http.session("a.example") is http.session("a.example")
+    assert http.session("a.example") is not http.session("b.example")
+    adapter = http.session("a.example").get_adapter("https://a.example/")
+    assert adapter._pool_maxsize == 4
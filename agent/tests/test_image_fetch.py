@@ -0,0 +1,90 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image, JpegImagePlugin
+
+from image_fetch import ImageTooLarge, downscale, download
+
+
+class FakeResponse:
+    def __init__(self, body, headers=None):
+        self.body = body
+        self.headers = headers or {}
+        self.chunks_read = 0
+        self.closed = False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), chunk_size):
+            self.chunks_read += 1
+            yield self.body[start:start + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeHttp:
+    def __init__(self, response):
+        self.response = response
+
+    def get(self, url, stream=False):
+        assert stream
+        return self.response
+
+
+def encode(size, fmt="JPEG"):
+    buffer = BytesIO()
+    Image.new("RGB", size, (200, 120, 40)).save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def test_download_streams_the_body():
+    response = FakeResponse(b"x" * 100)
+    assert download(FakeHttp(response), "https://example/1.png", 100, chunk_size=16) == b"x" * 100
+    assert response.closed
+
+
+def test_download_rejects_a_large_content_length_before_reading():
+    response = FakeResponse(b"x" * 100, {"Content-Length": "100"})
+    with pytest.raises(ImageTooLarge):
+        download(FakeHttp(response), "https://example/1.png", 99)
+    assert response.chunks_read == 0 and response.closed
+
+
+def test_download_stops_once_the_cap_is_exceeded():
+    # No Content-Length (chunked transfer): the cap is enforced while streaming
+    response = FakeResponse(b"x" * 10_000)
+    with pytest.raises(ImageTooLarge):
+        download(FakeHttp(response), "https://example/1.png", 100, chunk_size=64)
+    assert response.chunks_read == 2 and response.closed
+
+
+def test_downscale_shrinks_the_shortest_side():
+    small = downscale(encode((1600, 1200)), short_side=448)
+    assert Image.open(BytesIO(small)).size == (597, 448)
+    assert Image.open(BytesIO(small)).format == "JPEG"
+
+
+def test_downscale_keeps_small_images_untouched():
+    original = encode((400, 300), "PNG")
+    assert downscale(original, short_side=448) is original
+
+
+def test_downscale_decodes_jpegs_at_reduced_scale(monkeypatch):
+    drafts = []
+    draft = JpegImagePlugin.JpegImageFile.draft
+
+    def record(image, mode, size):
+        drafts.append(size)
+        result = draft(image, mode, size)
+        drafts.append(image.size)
+        return result
+
+    monkeypatch.setattr(JpegImagePlugin.JpegImageFile, "draft", record)
+    downscale(encode((2000, 2000)), short_side=448)
+    requested, decoded = drafts
+    assert requested == (448, 448)
+    # JPEG decodes at 1/4 scale: the smallest 1/2^n scale still at least the target
+    assert decoded == (500, 500)
@@ -0,0 +1,74 @@
+import random
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from image_hash import BKTree, ImageHashIndex, hamming
+
+
+def encode(image, fmt="PNG", **options):
+    buffer = BytesIO()
+    image.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+def picture(seed, size=256):
+    # Smooth random blobs, so the perceptual hashes have structure to latch onto
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, size=(8, 8, 3), dtype=np.uint8)
+    return Image.fromarray(coarse).resize((size, size), Image.Resampling.BICUBIC)
+
+
+def test_bk_tree_search_matches_brute_force():
+    rng = random.Random(7)
+    codes = [rng.getrandbits(64) for _ in range(500)]
+    # Near copies so some searches land on several hits
+    codes += [code ^ (1 << rng.randrange(64)) for code in codes[:100]]
+    tree = BKTree()
+    for index, code in enumerate(codes):
+        tree.add(code, index)
+    assert tree.size == len(codes)
+
+    for query in codes[:50] + [rng.getrandbits(64) for _ in range(50)]:
+        for max_distance in (0, 2, 10):
+            expected = sorted((hamming(query, code), index) for index, code in enumerate(codes)
+                              if hamming(query, code) <= max_distance)
+            found = tree.search(query, max_distance)
+            assert sorted(found) == expected
+            assert [distance for distance, _ in found] == sorted(distance for distance, _ in found)
+
+
+def test_bk_tree_keeps_every_value_of_a_repeated_code():
+    tree = BKTree()
+    tree.add(0b1010, "a")
+    tree.add(0b1010, "b")
+    assert sorted(tree.search(0b1010, 0)) == [(0, "a"), (0, "b")]
+    assert BKTree().search(0, 64) == []
+
+
+def test_index_matches_identical_and_resized_copies(tmp_path):
+    index = ImageHashIndex(str(tmp_path / "hashes.txt"))
+    original = encode(picture(1))
+    index.add(1, original)
+    index.add(2, encode(picture(2)))
+
+    assert index.match(original) == (1, "sha256", 0)
+    token_id, kind, distance = index.match(encode(picture(1).resize((200, 200)), "JPEG", quality=90))
+    assert (token_id, kind) == (1, "phash")
+    assert distance <= 2
+    assert index.match(encode(picture(3))) is None
+
+
+def test_index_reloads_from_its_file_and_follows_a_writer(tmp_path):
+    path = str(tmp_path / "hashes.txt")
+    writer = ImageHashIndex(path)
+    writer.add(1, encode(picture(1)))
+    reader = ImageHashIndex(path, read_only=True)
+    assert 1 in reader
+
+    writer.add(2, encode(picture(2)))
+    assert 2 not in reader
+    reader.refresh()
+    assert 2 in reader and len(reader) == 2
+    assert ImageHashIndex(path).match(encode(picture(2)))[0] == 2
@@ -0,0 +1,141 @@
+import os
+import threading
+import time
+
+import pytest
+
+from image_fetch import ImageTooLarge
+from ipfs import IpfsClient, ipfs_path
+
+CID = "bafybeigdyrzt5sfp7udm7hu76uh7y26nf3efuylqabf3oclgtqy55fbzdi"
+
+
+class FakeResponse:
+    def __init__(self, body, status=200, chunk_delay=0.0):
+        self.body = body
+        self.status = status
+        self.chunk_delay = chunk_delay
+        self.headers = {}
+        self.chunks_sent = 0
+        self.closed = False
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise RuntimeError(f"HTTP {self.status}")
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), 4):
+            time.sleep(self.chunk_delay)
+            self.chunks_sent += 1
+            yield self.body[start:start + 4]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeGateways:
+    """Answers by gateway host; counts requests per gateway"""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+        self.served = []
+        self.lock = threading.Lock()
+
+    def get(self, url, stream=False):
+        gateway = url.split("/")[2]
+        with self.lock:
+            self.requests.append(gateway)
+        response = self.responses[gateway]()
+        self.served.append(response)
+        return response
+
+
+def client(tmp_path, responses, **options):
+    options.setdefault("hedge_delay", 0.05)
+    gateways = [f"https://{name}/ipfs/" for name in responses]
+    return IpfsClient(FakeGateways(responses), gateways, str(tmp_path), **options)
+
+
+def test_ipfs_path():
+    assert ipfs_path(f"ipfs://{CID}/1.png") == f"{CID}/1.png"
+    assert ipfs_path(f"https://ipfs.io/ipfs/{CID}") == CID
+    assert ipfs_path("https://example.com/1.png") is None
+
+
+def test_slow_gateway_is_hedged_and_cancelled(tmp_path):
+    ipfs = client(tmp_path, {
+        "slow": lambda: FakeResponse(b"x" * 400, chunk_delay=0.02),
+        "fast": lambda: FakeResponse(b"image bytes"),
+    })
+    assert ipfs.fetch(f"ipfs://{CID}", 1024) == b"image bytes"
+    assert ipfs.http.requests == ["slow", "fast"]
+
+    slow = ipfs.http.served[0]
+    deadline = time.monotonic() + 2
+    while not slow.closed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # The loser stopped at its next chunk instead of streaming the whole body
+    assert slow.closed
+    assert slow.chunks_sent < 100
+
+
+def test_failed_gateway_is_replaced_immediately(tmp_path):
+    ipfs = client(tmp_path, {
+        "down": lambda: FakeResponse(b"", status=502),
+        "up": lambda: FakeResponse(b"image bytes"),
+    }, hedge_delay=10)
+    start = time.monotonic()
+    assert ipfs.fetch(f"ipfs://{CID}", 1024) == b"image bytes"
+    assert time.monotonic() - start < 5
+
+
+def test_all_gateways_failing_raises(tmp_path):
+    ipfs = client(tmp_path, {
+        "a": lambda: FakeResponse(b"", status=504),
+        "b": lambda: FakeResponse(b"", status=502),
+    })
+    with pytest.raises(RuntimeError, match="All IPFS gateways failed"):
+        ipfs.fetch(f"ipfs://{CID}", 1024)
+    assert sorted(ipfs.http.requests) == ["a", "b"]
+
+
+def test_too_large_is_not_retried_elsewhere(tmp_path):
+    ipfs = client(tmp_path, {
+        "a": lambda: FakeResponse(b"x" * 64),
+        "b": lambda: FakeResponse(b"x" * 64),
+    }, hedge_delay=10)
+    with pytest.raises(ImageTooLarge):
+        ipfs.fetch(f"ipfs://{CID}", 16)
+    assert ipfs.http.requests == ["a"]
+
+
+def test_fetches_are_served_from_the_disk_cache(tmp_path):
+    ipfs = client(tmp_path, {"a": lambda: FakeResponse(b"image bytes")})
+    ipfs.fetch(f"ipfs://{CID}/1.png", 1024)
+    assert ipfs.fetch(f"https://other.gateway/ipfs/{CID}/1.png", 1024) == b"image bytes"
+    assert ipfs.http.requests == ["a"]
+    assert IpfsClient(None, ["https://a/ipfs/"], str(tmp_path)).fetch(f"ipfs://{CID}/1.png", 1024) == b"image bytes"
+    with pytest.raises(ImageTooLarge):
+        ipfs.fetch(f"ipfs://{CID}/1.png", 4)
+
+
+def test_overwriting_an_entry_does_not_grow_the_cache_size(tmp_path):
+    ipfs = client(tmp_path, {"a": lambda: FakeResponse(b"")})
+    for _ in range(3):
+        ipfs._cache_put(f"{CID}/1.png", b"x" * 100)
+    assert ipfs.cache_bytes == 100
+    assert IpfsClient(None, [], str(tmp_path)).cache_bytes == 100
+
+
+def test_eviction_drops_the_least_recently_used_entries(tmp_path):
+    ipfs = client(tmp_path, {"a": lambda: FakeResponse(b"")}, max_cache_bytes=350)
+    for i, name in enumerate(["a", "b", "c"]):
+        ipfs._cache_put(name, b"x" * 100)
+        # Distinct, increasing mtimes regardless of the filesystem's resolution
+        os.utime(ipfs._cache_file(name), (1000 + i, 1000 + i))
+    assert ipfs._cache_get("a") is not None
+
+    ipfs._cache_put("d", b"x" * 100)
+    assert [ipfs._cache_get(name) is not None for name in "abcd"] == [True, False, True, True]
+    assert ipfs.cache_bytes == 300
@@ -0,0 +1,80 @@
+import numpy as np
+
+from local_vector_store import LocalVectorStore
+
+DIM = 16
+
+
+def vectors(n, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, DIM)).astype(np.float32)
+
+
+def test_search_returns_the_closest_points(tmp_path):
+    store = LocalVectorStore(str(tmp_path), dim=DIM, initial_capacity=2)
+    points = vectors(20)
+    for id, vector in enumerate(points):
+        store.add(id, vector, {"token": id})
+
+    results = store.search(points[7], limit=3)
+    assert [result["id"] for result in results][0] == 7
+    assert results[0]["score"] > 0.999
+    assert results[0]["payload"] == {"token": 7}
+    assert [result["score"] for result in results] == sorted((result["score"] for result in results), reverse=True)
+
+
+def test_read_only_store_sees_flushed_points_after_refresh(tmp_path):
+    writer = LocalVectorStore(str(tmp_path), dim=DIM, initial_capacity=1)
+    points = vectors(10)
+    writer.add(0, points[0])
+    writer.flush()
+    reader = LocalVectorStore(str(tmp_path), dim=DIM, read_only=True)
+    assert reader.count() == 1
+
+    for id in range(1, 10):
+        writer.add(id, points[id])
+    reader.refresh()
+    # Not flushed yet
+    assert reader.count() == 1
+    writer.flush()
+    reader.refresh()
+    assert reader.count() == 10
+    assert reader.search(points[9], limit=1)[0]["id"] == 9
+
+
+def test_ivf_is_built_on_flush_not_on_search(tmp_path):
+    store = LocalVectorStore(str(tmp_path), dim=DIM, ivf_threshold=50, nprobe=64)
+    points = vectors(60)
+    for id, vector in enumerate(points):
+        store.add(id, vector)
+    assert store.search(points[3], limit=1)[0]["id"] == 3
+    assert store.centroids is None
+
+    store.flush()
+    assert store.centroids is not None and store.ivf_size == 60
+    assert sorted(np.concatenate(store.lists)) == list(range(60))
+    # Points added after the build join a list straight away; the rebuild waits for a flush at 2x
+    more = vectors(70, seed=1)
+    for id, vector in enumerate(more, start=60):
+        store.add(id, vector)
+    assert store.ivf_size == 60
+    assert sorted(np.concatenate(store.lists)) == list(range(130))
+    assert store.search(more[5], limit=1)[0]["id"] == 65
+    store.flush()
+    assert store.ivf_size == 130
+
+
+def test_read_only_store_builds_its_ivf_on_refresh(tmp_path):
+    writer = LocalVectorStore(str(tmp_path), dim=DIM, ivf_threshold=1000)
+    for id, vector in enumerate(vectors(60)):
+        writer.add(id, vector)
+    writer.flush()
+    reader = LocalVectorStore(str(tmp_path), dim=DIM, ivf_threshold=50, read_only=True)
+    assert reader.centroids is None
+    reader.refresh()
+    assert reader.ivf_size == 60
+    writer.add(60, vectors(1, seed=2)[0])
+    writer.flush()
+    reader.refresh()
+    # Below twice the last build: new points join the existing lists
+    assert reader.ivf_size == 60
+    assert sorted(np.concatenate(reader.lists)) == list(range(61))
@@ -0,0 +1,102 @@
+from web3 import Web3
+
+from multicall import Multicall, call_many
+
+FACTORY = Web3.to_checksum_address("0x00000000000000000000000000000000000000fa")
+AGENT = Web3.to_checksum_address("0x00000000000000000000000000000000000000aa")
+FACTORY_ABI = [
+    {"inputs": [{"internalType": "uint256", "name": "requestId", "type": "uint256"}, {"internalType": "address", "name": "agent", "type": "address"}], "name": "hasAgentResponded", "outputs": [{"internalType": "bool", "name": "hasResponded", "type": "bool"}], "stateMutability": "view", "type": "function"},
+    {"inputs": [], "name": "syncAgent", "outputs": [{"internalType": "uint256", "name": "total", "type": "uint256"}, {"internalType": "uint256[]", "name": "ids", "type": "uint256[]"}], "stateMutability": "view", "type": "function"},
+]
+
+w3 = Web3()
+factory = w3.eth.contract(address=FACTORY, abi=FACTORY_ABI)
+
+
+class StubAggregate3:
+    """Stands in for the Multicall3 contract; answers each chunk from `answer(calls)`"""
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.chunks = []
+        self.functions = self
+
+    def aggregate3(self, calls):
+        self.chunks.append(calls)
+        return type("Call", (), {"call": lambda _: self.answer(calls)})()
+
+
+class StubCall:
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    def call(self):
+        self.calls += 1
+        return self.result
+
+
+class StubMulticall:
+    def __init__(self, results=None, error=None):
+        self.results = results
+        self.error = error
+
+    def call(self, calls):
+        if self.error is not None:
+            raise self.error
+        return self.results
+
+
+def multicall(answer, chunk_size=500):
+    stub = StubAggregate3(answer)
+    instance = Multicall(w3, chunk_size=chunk_size)
+    instance.contract = stub
+    return instance, stub
+
+
+def responded(request_ids):
+    def answer(calls):
+        results = []
+        for _, _, data in calls:
+            request_id, _ = w3.codec.decode(["uint256", "address"], bytes.fromhex(data[10:]))
+            results.append((True, w3.codec.encode(["bool"], [request_id in request_ids])))
+        return results
+    return answer
+
+
+def test_calls_are_encoded_and_results_decoded():
+    instance, stub = multicall(responded({2, 3}))
+    calls = [factory.functions.hasAgentResponded(request_id, AGENT) for request_id in (1, 2, 3)]
+    assert instance.call(calls) == [False, True, True]
+
+    (chunk,) = stub.chunks
+    assert [(target, allow_failure) for target, allow_failure, _ in chunk] == [(FACTORY, True)] * 3
+    assert chunk[1][2] == factory.encode_abi("hasAgentResponded", args=[2, AGENT])
+
+
+def test_multiple_outputs_decode_to_a_tuple():
+    instance, _ = multicall(lambda calls: [(True, w3.codec.encode(["uint256", "uint256[]"], [2, [7, 9]]))])
+    assert instance.call([factory.functions.syncAgent()]) == [(2, (7, 9))]
+
+
+def test_failed_calls_decode_to_none_and_chunks_are_split():
+    def answer(calls):
+        return [(False, b"") if i == 1 else (True, w3.codec.encode(["bool"], [True])) for i, _ in enumerate(calls)]
+
+    instance, stub = multicall(answer, chunk_size=2)
+    calls = [factory.functions.hasAgentResponded(request_id, AGENT) for request_id in range(5)]
+    assert instance.call(calls) == [True, None, True, None, True]
+    assert [len(chunk) for chunk in stub.chunks] == [2, 2, 1]
+
+
+def test_call_many_uses_multicall_results():
+    calls = [StubCall(False), StubCall(False)]
+    assert call_many(StubMulticall([True, False]), calls) == [True, False]
+    assert [call.calls for call in calls] == [0, 0]
+
+
+def test_call_many_falls_back_to_individual_calls():
+    for fallback in (None, StubMulticall(error=ValueError("execution reverted")), StubMulticall([True, None])):
+        calls = [StubCall(True), StubCall(False)]
+        assert call_many(fallback, calls) == [True, False]
+        assert [call.calls for call in calls] == [1, 1]
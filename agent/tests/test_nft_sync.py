@@ -0,0 +1,124 @@
+import logging
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import agent
+import verification
+from state import AgentState
+
+ctx = SimpleNamespace(logger=logging.getLogger("test_nft_sync"))
+
+
+class FakeChain:
+    def __init__(self, latest):
+        self.latest = latest
+        self.functions = self
+
+    def tokenId(self):
+        return SimpleNamespace(call=lambda: self.latest)
+
+    def tokenURI(self, token_id):
+        return SimpleNamespace(call=lambda: f"ipfs://token/{token_id}")
+
+
+class FakeStore:
+    def __init__(self, existing=()):
+        self.stored = set(existing)
+        self.buffered = set()
+        self.flushes = 0
+        self.fail_flush = False
+
+    def existing_ids(self, ids):
+        return self.stored & set(ids)
+
+    def add(self, token_id):
+        self.buffered.add(token_id)
+
+    def flush(self):
+        if self.fail_flush:
+            raise ConnectionError("qdrant unavailable")
+        self.flushes += 1
+        self.stored |= self.buffered
+        self.buffered.clear()
+
+
+@pytest.fixture
+def sync(tmp_path, monkeypatch):
+    """incremental_nft_sync against a fake chain and store; `failing` tokens fail to index"""
+    env = SimpleNamespace(chain=FakeChain(0), store=FakeStore(), failing=set(), indexed=[])
+
+    def index_nft(ctx, token_id, uri):
+        if token_id in env.failing:
+            return False
+        assert uri == f"ipfs://token/{token_id}"
+        env.indexed.append(token_id)
+        env.store.add(token_id)
+        return True
+
+    monkeypatch.setattr(agent, "nft_contract", env.chain)
+    monkeypatch.setattr(agent, "index_nft", index_nft)
+    monkeypatch.setattr(agent, "agent_state", AgentState(str(tmp_path / "state.json")))
+    monkeypatch.setattr(agent, "index_ready", threading.Event())
+    monkeypatch.setattr(agent, "NFT_SYNC_CHUNK", 3)
+    monkeypatch.setattr(agent, "NFT_INDEX_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(verification, "vector_store", env.store)
+    env.run = lambda: agent.incremental_nft_sync(ctx)
+    env.watermark = lambda: agent.agent_state.get("last_synced_token_id", 0)
+    return env
+
+
+def test_backfill_advances_the_watermark_chunk_by_chunk(sync):
+    sync.chain.latest = 7
+    assert sync.run() == 7
+    assert sync.indexed == [1, 2, 3, 4, 5, 6, 7]
+    assert sync.watermark() == 7
+    # One flush per chunk, before its watermark update
+    assert sync.store.flushes == 3
+    assert agent.index_ready.is_set()
+
+
+def test_sync_resumes_from_the_watermark(sync):
+    sync.chain.latest = 4
+    sync.run()
+    sync.chain.latest = 6
+    sync.indexed.clear()
+    assert sync.run() == 2
+    assert sync.indexed == [5, 6]
+    assert sync.watermark() == 6
+    sync.indexed.clear()
+    assert sync.run() == 0 and sync.indexed == []
+
+
+def test_tokens_already_stored_are_not_reindexed(sync):
+    sync.store.stored = {2, 3}
+    sync.chain.latest = 4
+    assert sync.run() == 4
+    assert sync.indexed == [1, 4]
+    assert sync.watermark() == 4
+
+
+def test_a_failed_token_holds_the_watermark_until_it_is_skipped(sync):
+    sync.chain.latest = 7
+    sync.failing = {5}
+    assert sync.run() == 4
+    assert sync.watermark() == 4
+    assert not agent.index_ready.is_set()
+
+    # Second failure reaches NFT_INDEX_MAX_ATTEMPTS: the token is skipped
+    assert sync.run() == 3
+    assert sync.watermark() == 7
+    assert 5 not in sync.store.stored
+    assert agent.index_ready.is_set()
+
+
+def test_watermark_stays_put_when_the_flush_fails(sync):
+    sync.chain.latest = 3
+    sync.store.fail_flush = True
+    with pytest.raises(ConnectionError):
+        sync.run()
+    assert sync.watermark() == 0
+    sync.store.fail_flush = False
+    sync.run()
+    assert sync.watermark() == 3
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import threading
+import time
+
+from pipeline import JobDeferred, Pipeline, Stage, VerificationJob
+
+logger = logging.getLogger("test_pipeline")
+
+
+def job(request_id, deadline=10.0):
+    return VerificationJob(request_id, f"ipfs://{request_id}", deadline, logger)
+
+
+async def run(pipeline, jobs):
+    pipeline.start(logger)
+    accepted = [pipeline.try_submit(j) for j in jobs]
+    await asyncio.wait_for(pipeline.drain(), timeout=5)
+    await pipeline.stop()
+    return accepted
+
+
+def test_jobs_pass_through_every_stage_in_order():
+    seen = []
+    lock = threading.Lock()
+
+    def record(name):
+        def fn(j):
+            with lock:
+                seen.append((j.request_id, name))
+        return fn
+
+    pipeline = Pipeline([Stage("a", record("a"), 2), Stage("b", record("b"), 2), Stage("c", record("c"))])
+    asyncio.run(run(pipeline, [job(i) for i in range(10)]))
+
+    assert pipeline.completed == 10
+    assert not pipeline.in_flight
+    for request_id in range(10):
+        assert [name for r, name in seen if r == request_id] == ["a", "b", "c"]
+
+
+def test_duplicate_and_overflowing_submissions_are_refused():
+    async def scenario():
+        release = threading.Event()
+        pipeline = Pipeline([Stage("block", lambda j: release.wait(5))], queue_size=2)
+        pipeline.start(logger)
+        first = [pipeline.try_submit(job(1)), pipeline.try_submit(job(1))]
+        # One job is taken by the worker, two wait in the queue, the next is refused
+        await asyncio.sleep(0.05)
+        rest = [pipeline.try_submit(job(i)) for i in (2, 3, 4)]
+        release.set()
+        await asyncio.wait_for(pipeline.drain(), timeout=5)
+        await pipeline.stop()
+        return first, rest, pipeline
+
+    first, rest, pipeline = asyncio.run(scenario())
+    assert first == [True, False]
+    assert rest == [True, True, False]
+    assert pipeline.completed == 3
+
+
+def test_skip_predicate_bypasses_a_stage():
+    calls = []
+
+    def decide(j):
+        j.result = 1
+
+    pipeline = Pipeline([
+        Stage("decide", decide),
+        Stage("embed", lambda j: calls.append(j.request_id), skip=lambda j: j.result is not None),
+    ])
+    asyncio.run(run(pipeline, [job(1)]))
+    assert calls == []
+    assert pipeline.completed == 1
+
+
+def test_failures_and_expired_deadlines_are_counted_and_released():
+    def fail(j):
+        if j.request_id == 1:
+            raise RuntimeError("gateway down")
+        if j.request_id == 2:
+            time.sleep(0.3)
+
+    pipeline = Pipeline([Stage("work", fail, 3), Stage("after", lambda j: None)])
+    asyncio.run(run(pipeline, [job(1), job(2, deadline=0.1), job(3)]))
+
+    assert (pipeline.completed, pipeline.failed, pipeline.expired) == (1, 1, 1)
+    assert not pipeline.in_flight
+
+
+def test_deferred_jobs_leave_the_pipeline_for_a_later_retry():
+    def defer(j):
+        if j.request_id == 1:
+            raise JobDeferred("matched NFT not indexed yet")
+
+    pipeline = Pipeline([Stage("search", defer), Stage("submit", lambda j: None)])
+    asyncio.run(run(pipeline, [job(1), job(2)]))
+
+    assert (pipeline.completed, pipeline.deferred, pipeline.failed) == (1, 1, 0)
+    assert not pipeline.in_flight
+    # The same request can be submitted again once it has been dropped
+    assert asyncio.run(run(pipeline, [job(1)])) == [True]
+
+
+def test_on_drop_reports_every_unfinished_job_with_its_outcome():
+    def work(j):
+        if j.request_id == 1:
+            raise JobDeferred("not indexed yet")
+        if j.request_id == 2:
+            raise RuntimeError("gateway down")
+        if j.request_id == 3:
+            time.sleep(0.3)
+
+    dropped = []
+    pipeline = Pipeline([Stage("work", work, 4)])
+    pipeline.on_drop = lambda j, outcome: dropped.append((j.request_id, outcome))
+    asyncio.run(run(pipeline, [job(1), job(2), job(3, deadline=0.1), job(4)]))
+
+    assert sorted(dropped) == [(1, "deferred"), (2, "failed"), (3, "expired")]
+    assert pipeline.completed == 1
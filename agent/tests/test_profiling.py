@@ -0,0 +1,49 @@
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+import metrics
+from profiling import StackSampler, routes
+
+
+def get(server, path):
+    url = f"http://127.0.0.1:{server.server_address[1]}{path}"
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status, response.read().decode()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode()
+
+
+@pytest.fixture
+def server():
+    sampler = StackSampler(interval=0.01)
+    server = metrics.serve(0, routes=routes(sampler))
+    yield server
+    sampler.stop()
+    server.shutdown()
+
+
+@pytest.mark.parametrize("interval", ["abc", "0", "-1", "0.0000001", "nan", "inf"])
+def test_invalid_intervals_are_rejected(server, interval):
+    status, body = get(server, f"/debug/sampling/start?interval={interval}")
+    assert status == 400
+    assert "interval" in body
+    assert get(server, "/debug/sampling")[1].startswith("running=False")
+
+
+def test_sampling_can_be_switched_on_and_off(server):
+    assert get(server, "/debug/sampling/start?interval=0.002") == (200, "sampling every 0.002s\n")
+    time.sleep(0.1)
+    status, folded = get(server, "/debug/sampling/stop")
+    assert status == 200
+    # One "stack count" line per distinct stack, including the metrics server's own thread
+    assert "metrics;" in folded
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in folded.splitlines())
+    assert get(server, "/debug/sampling")[1].startswith("running=False")
+
+
+def test_unknown_paths_are_not_found(server):
+    assert get(server, "/debug/other")[0] == 404
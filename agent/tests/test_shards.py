@@ -0,0 +1,41 @@
+from collections import Counter
+
+from shards import HashRing
+
+KEYS = [f"ipfs://Qm{i:06d}" for i in range(2000)]
+
+
+def test_empty_ring_has_no_owner():
+    assert HashRing().owner("ipfs://x") is None
+    ring = HashRing([0])
+    ring.remove(0)
+    assert ring.owner("ipfs://x") is None
+
+
+def test_owners_are_deterministic_and_spread_across_nodes():
+    ring = HashRing(range(4))
+    owners = [ring.owner(key) for key in KEYS]
+    assert owners == [HashRing(range(4)).owner(key) for key in KEYS]
+    counts = Counter(owners)
+    assert set(counts) == {0, 1, 2, 3}
+    assert min(counts.values()) > len(KEYS) / 4 / 2
+
+
+def test_removing_a_node_only_moves_its_own_keys():
+    ring = HashRing(range(4))
+    before = {key: ring.owner(key) for key in KEYS}
+    ring.remove(2)
+    for key in KEYS:
+        if before[key] == 2:
+            assert ring.owner(key) != 2
+        else:
+            assert ring.owner(key) == before[key]
+
+
+def test_adding_a_node_only_takes_keys_onto_it():
+    ring = HashRing(range(3))
+    before = {key: ring.owner(key) for key in KEYS}
+    ring.add(3)
+    moved = [key for key in KEYS if ring.owner(key) != before[key]]
+    assert moved
+    assert all(ring.owner(key) == 3 for key in moved)
@@ -0,0 +1,33 @@
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from tile_descriptors import TileDescriptorStore, describe
+
+
+def encode(pixels):
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def picture(seed):
+    rng = np.random.default_rng(seed)
+    return encode(rng.integers(0, 256, size=(64, 64), dtype=np.uint8))
+
+
+def test_read_only_store_follows_the_writer(tmp_path):
+    writer = TileDescriptorStore(str(tmp_path), initial_rows=1)
+    writer.add(1, picture(1))
+    reader = TileDescriptorStore(str(tmp_path), read_only=True)
+    assert 1 in reader
+
+    for token_id in range(2, 6):
+        writer.add(token_id, picture(token_id))
+    assert 5 not in reader
+    reader.refresh()
+    scores = reader.scores(describe(picture(5)), [5, 1, 99])
+    assert scores[0] == 1.0
+    assert scores[1] < 1.0
+    assert np.isnan(scores[2])
@@ -0,0 +1,177 @@
+from types import SimpleNamespace
+
+import pytest
+
+from transactions import NonceManager, PendingTransaction, TransactionManager
+
+ADDRESS = "0x00000000000000000000000000000000000000aa"
+
+
+class StubEth:
+    def __init__(self, pending_count=0):
+        self.pending_count = pending_count
+        self.count_calls = 0
+        self.chain_id = 1
+        self.gas_price = 100
+        self.send_error = None
+
+    def get_transaction_count(self, address, block):
+        self.count_calls += 1
+        return self.pending_count
+
+    def send_raw_transaction(self, raw):
+        if self.send_error is not None:
+            raise self.send_error
+        return "0x" + raw.decode()
+
+
+class StubProvider:
+    """Batch RPC: broadcasts fail for the nonces in `rejected`; receipts come from `receipts`"""
+
+    def __init__(self):
+        self.rejected = set()
+        self.receipts = {}
+        self.batches = []
+
+    def make_batch_request(self, calls):
+        self.batches.append(calls)
+        responses = []
+        for method, params in calls:
+            if method == "eth_sendRawTransaction":
+                nonce, _ = bytes.fromhex(params[0][2:]).decode().split("-")
+                if int(nonce) in self.rejected:
+                    responses.append({"error": {"message": "nonce too low"}})
+                else:
+                    responses.append({"result": "0x" + bytes.fromhex(params[0][2:]).decode()})
+            else:
+                responses.append({"result": self.receipts.get(params[0])})
+        return responses
+
+
+class StubCall:
+    def __init__(self, error=None):
+        self.error = error
+
+    def build_transaction(self, tx):
+        if self.error is not None:
+            raise self.error
+        return dict(tx)
+
+
+class StubAccount:
+    address = ADDRESS
+
+    def sign_transaction(self, tx):
+        return SimpleNamespace(raw_transaction=f"{tx['nonce']}-{tx['gasPrice']}".encode())
+
+
+def manager(pending_count=0, **options):
+    w3 = SimpleNamespace(eth=StubEth(pending_count), provider=StubProvider())
+    tx_manager = TransactionManager(w3, StubAccount(), **options)
+    tx_manager.chain_id = w3.eth.chain_id
+    return tx_manager
+
+
+def send(tx_manager, *calls):
+    batch = [PendingTransaction(call, f"call {i}") for i, call in enumerate(calls)]
+    tx_manager._send_batch(batch)
+    return batch
+
+
+def test_nonces_are_allocated_released_and_resynced():
+    eth = StubEth(pending_count=7)
+    nonces = NonceManager(SimpleNamespace(eth=eth), ADDRESS)
+    assert [nonces.allocate(), nonces.allocate()] == [7, 8]
+    # Only the most recent nonce can be given back
+    nonces.release(7)
+    assert nonces.allocate() == 9
+    nonces.release(9)
+    assert nonces.allocate() == 9
+    assert eth.count_calls == 1
+
+    eth.pending_count = 4
+    nonces.reset()
+    assert nonces.allocate() == 4
+    assert eth.count_calls == 2
+
+
+def test_failed_build_releases_its_nonce():
+    tx_manager = manager(pending_count=3)
+    failed, sent = send(tx_manager, StubCall(ValueError("execution reverted")), StubCall())
+    with pytest.raises(ValueError):
+        failed.sent.result(timeout=0)
+    assert sent.nonce == 3
+    assert sent.sent.result(timeout=0) == "0x3-100"
+
+
+def test_failed_broadcast_resyncs_the_nonce():
+    tx_manager = manager(pending_count=3)
+    tx_manager.w3.eth.send_error = ValueError("nonce too low")
+    (pending,) = send(tx_manager, StubCall())
+    with pytest.raises(ValueError):
+        pending.receipt.result(timeout=0)
+    assert tx_manager.pending_count() == 0
+
+    tx_manager.w3.eth.send_error = None
+    tx_manager.w3.eth.pending_count = 5
+    (pending,) = send(tx_manager, StubCall())
+    assert pending.nonce == 5
+
+
+def test_batch_broadcast_reports_errors_per_transaction():
+    tx_manager = manager(pending_count=0, batch_size=3)
+    tx_manager.w3.provider.rejected = {1}
+    first, second, third = send(tx_manager, StubCall(), StubCall(), StubCall())
+
+    (batch,) = tx_manager.w3.provider.batches
+    assert [method for method, _ in batch] == ["eth_sendRawTransaction"] * 3
+    assert first.sent.result(timeout=0) == "0x0-100"
+    assert third.sent.result(timeout=0) == "0x2-100"
+    with pytest.raises(RuntimeError, match="nonce too low"):
+        second.sent.result(timeout=0)
+    assert sorted(tx_manager.in_flight) == [0, 2]
+    assert tx_manager.nonces.next_nonce is None
+
+
+def test_unmined_transaction_is_bumped_then_given_up_on():
+    tx_manager = manager(bump_after=0, max_bumps=2, bump_factor=1.125)
+    (pending,) = send(tx_manager, StubCall())
+
+    tx_manager._track_once()
+    tx_manager._track_once()
+    assert pending.hashes == ["0x0-100", "0x0-113", "0x0-128"]
+    assert pending.bumps == 2
+    assert not pending.receipt.done()
+
+    tx_manager._track_once()
+    with pytest.raises(TimeoutError):
+        pending.receipt.result(timeout=0)
+    assert tx_manager.pending_count() == 0
+    assert tx_manager.nonces.next_nonce is None
+
+
+def test_receipts_resolve_with_their_status():
+    tx_manager = manager()
+    received = []
+    batch = [PendingTransaction(StubCall(), f"call {i}", lambda f: received.append(f.result())) for i in range(2)]
+    tx_manager._send_batch(batch[:1])
+    tx_manager._send_batch(batch[1:])
+
+    tx_manager.w3.provider.receipts = {
+        "0x0-100": {"status": "0x1", "blockNumber": "0x10", "transactionHash": "0x0-100"},
+        "0x1-100": {"status": "0x0", "blockNumber": "0x10", "transactionHash": "0x1-100"},
+    }
+    tx_manager._track_once()
+    assert sorted((r["transactionHash"], r["status"], r["blockNumber"]) for r in received) == [
+        ("0x0-100", 1, 16), ("0x1-100", 0, 16),
+    ]
+    assert tx_manager.pending_count() == 0
+
+
+def test_a_receipt_for_any_bumped_hash_resolves_the_transaction():
+    tx_manager = manager(bump_after=0)
+    (pending,) = send(tx_manager, StubCall())
+    tx_manager._track_once()
+    tx_manager.w3.provider.receipts = {"0x0-100": {"status": "0x1"}}
+    tx_manager._track_once()
+    assert pending.receipt.result(timeout=0)["status"] == 1
@@ -0,0 +1,60 @@
+import pytest
+
+from vector_store import GroupedVectorStore, QdrantVectorStore
+
+
+class FlakyQdrant(QdrantVectorStore):
+    """Records the points of successful writes; fails the writes listed in `failures`"""
+
+    def __init__(self, failures=(), batch_size=4):
+        super().__init__(http=None, base_url="http://qdrant", api_key=None, batch_size=batch_size)
+        self.failures = set(failures)
+        self.writes = 0
+        self.stored = {}
+
+    def _write(self, points, wait):
+        self.writes += 1
+        if self.writes in self.failures:
+            raise ConnectionError("qdrant unavailable")
+        self.stored.update((point["id"], point["payload"]) for point in points)
+
+
+def add_tokens(store, ids):
+    for id in ids:
+        store.add(id, [0.0], {"tokenId": id})
+
+
+def test_failed_batch_write_is_retried_with_the_next_one():
+    store = FlakyQdrant(failures={1})
+    add_tokens(store, range(1, 7))
+    store.flush()
+    assert sorted(store.stored) == [1, 2, 3, 4, 5, 6]
+
+
+def test_failed_flush_keeps_the_points_buffered():
+    store = FlakyQdrant(failures={1, 2, 3})
+    add_tokens(store, range(1, 6))
+    with pytest.raises(ConnectionError):
+        store.flush()
+    assert store.stored == {}
+    store.flush()
+    assert sorted(store.stored) == [1, 2, 3, 4, 5]
+
+
+def test_flush_waits_on_the_last_unacknowledged_write():
+    store = FlakyQdrant()
+    add_tokens(store, range(1, 5))
+    assert store.writes == 1
+    store.flush()
+    # Nothing left buffered: the last point is re-sent as a barrier
+    assert store.writes == 2
+    store.flush()
+    assert store.writes == 2
+
+
+def test_grouped_upsert_applies_every_crop():
+    store = FlakyQdrant(batch_size=64)
+    GroupedVectorStore(store, group_size=4).upsert(7, [[0.0]] * 4, {"uri": "ipfs://x"})
+    assert sorted(store.stored) == [7 * 64 + i for i in range(4)]
+    assert store.buffer == []
+    assert store.stored[7 * 64 + 3] == {"uri": "ipfs://x", "tokenId": 7, "crop": 3}
@@ -0,0 +1,57 @@
+import logging
+
+import numpy as np
+
+from local_vector_store import LocalVectorStore
+from pipeline import VerificationJob
+from vector_store import GroupedVectorStore
+from verification import VerificationResult, decide_stage
+
+logger = logging.getLogger("test_verification")
+
+
+def decide(*hits):
+    job = VerificationJob(1, "ipfs://x", 10.0, logger)
+    job.search_results = list(hits)
+    decide_stage(job)
+    return job.result, job.matched_token_id
+
+
+def hit(token_id, score, **extra):
+    return {"id": token_id, "score": score, "payload": {"tokenId": token_id}, **extra}
+
+
+def test_thresholds():
+    assert decide(hit(5, 0.97), hit(6, 0.5)) == (VerificationResult.VERIFIED, 5)
+    assert decide(hit(5, 0.95)) == (VerificationResult.VERIFIED, 5)
+    assert decide(hit(5, 0.9)) == (VerificationResult.MODIFIED, 5)
+    assert decide(hit(5, 0.75)) == (VerificationResult.MODIFIED, 5)
+    assert decide(hit(5, 0.6)) == (VerificationResult.NOT_VERIFIED, 0)
+    assert decide() == (VerificationResult.NOT_VERIFIED, 0)
+
+
+def test_crop_match_is_never_verified():
+    assert decide(hit(5, 0.9999998, crop=4)) == (VerificationResult.MODIFIED, 5)
+    assert decide(hit(5, 0.9999998, crop=0)) == (VerificationResult.VERIFIED, 5)
+    assert decide(hit(5, 0.5, crop=4)) == (VerificationResult.NOT_VERIFIED, 0)
+
+
+def test_grouped_store_reports_which_crop_matched(tmp_path):
+    rng = np.random.default_rng(0)
+    full, crop, other = rng.normal(size=(3, 16))
+    store = GroupedVectorStore(LocalVectorStore(str(tmp_path), dim=16), group_size=2)
+    store.add(7, [full, crop])
+    store.add(8, [other, other])
+
+    best = store.search(crop, limit=2)[0]
+    assert (best["id"], best["crop"]) == (7, 1)
+    assert decide(best)[0] == VerificationResult.MODIFIED
+    best = store.search(full, limit=2)[0]
+    assert (best["id"], best["crop"]) == (7, 0)
+    assert decide(best)[0] == VerificationResult.VERIFIED
+
+
+def test_crop_falls_back_to_the_point_id():
+    store = GroupedVectorStore(None, group_size=4, stride=64)
+    hits = [{"id": 7 * 64 + 3, "score": 0.99, "payload": {}}, {"id": 7 * 64, "score": 0.9, "payload": {}}]
+    assert store._by_token(hits, 5) == [{"id": 7, "score": 0.99, "payload": {}, "crop": 3}]
@@ -0,0 +1,127 @@
+"""Per-token tile descriptors for re-ranking search candidates.
+
+A descriptor is the image as a 32x32 grayscale thumbnail cut into a 4x4 grid
+of 8x8 tiles (1 KiB per token). Two images are compared tile by tile (one
+minus the mean absolute pixel difference), and the score is the mean of the
+best 75% of tiles, so an edit confined to a corner does not sink the score.
+This separates near-identical siblings (e.g. generative collections) that
+CLIP embeds almost on top of each other.
+
+Descriptors live in a memory-mapped uint8 array (`descriptors.u8`) with an
+append-only `tokens.txt` giving each row's token id, and all candidates of a
+query are scored in one vectorized operation. A store opened with
+`read_only=True` maps another process's files and picks up the tokens it has
+added on `refresh()`.
+"""
+import os
+import threading
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+GRID = 4
+TILE = 8
+SIZE = GRID * TILE
+ROW_BYTES = SIZE * SIZE
+
+
+def describe(image_bytes):
+    """Return the (GRID*GRID, TILE*TILE) uint8 tile descriptor of an encoded image"""
+    image = Image.open(BytesIO(image_bytes))
+    image.draft("L", (SIZE * 2, SIZE * 2))
+    pixels = np.asarray(image.convert("L").resize((SIZE, SIZE), Image.Resampling.BOX), dtype=np.uint8)
+    return pixels.reshape(GRID, TILE, GRID, TILE).transpose(0, 2, 1, 3).reshape(GRID * GRID, TILE * TILE)
+
+
+def similarity(query, candidates, keep=0.75):
+    """Scores in [0, 1] of one (tiles, pixels) descriptor against a (n, tiles, pixels) stack"""
+    diff = np.abs(candidates.astype(np.int16) - query.astype(np.int16)[None])
+    tiles = 1.0 - diff.mean(axis=2) / 255.0
+    best = np.sort(tiles, axis=1)[:, -max(1, int(tiles.shape[1] * keep)):]
+    return best.mean(axis=1)
+
+
+class TileDescriptorStore:
+    def __init__(self, directory, initial_rows=1024, read_only=False):
+        self.directory = directory
+        self.read_only = read_only
+        self.lock = threading.Lock()
+        self.data_path = os.path.join(directory, "descriptors.u8")
+        self.tokens_path = os.path.join(directory, "tokens.txt")
+        os.makedirs(directory, exist_ok=True)
+
+        self.rows = {}
+        self.tokens_offset = 0
+        self._read_tokens()
+        self._open(max(initial_rows, len(self.rows)))
+        self.tokens_file = None if read_only else open(self.tokens_path, "a")
+
+    def _read_tokens(self):
+        if not os.path.exists(self.tokens_path):
+            return
+        with open(self.tokens_path, "rb") as f:
+            f.seek(self.tokens_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Still being written
+                    break
+                self.rows[int(line)] = len(self.rows)
+                self.tokens_offset += len(line)
+
+    def refresh(self):
+        """Read-only stores: pick up the descriptors the writer has added since the last refresh"""
+        if not self.read_only:
+            return
+        with self.lock:
+            self._read_tokens()
+            if len(self.rows) > self.data.shape[0]:
+                self._open(len(self.rows))
+
+    def _open(self, capacity):
+        if self.read_only:
+            capacity = os.path.getsize(self.data_path) // ROW_BYTES
+            self.data = np.memmap(self.data_path, dtype=np.uint8, mode="r", shape=(capacity, GRID * GRID, TILE * TILE))
+            return
+        with open(self.data_path, "ab"):
+            pass
+        if os.path.getsize(self.data_path) < capacity * ROW_BYTES:
+            os.truncate(self.data_path, capacity * ROW_BYTES)
+        capacity = os.path.getsize(self.data_path) // ROW_BYTES
+        self.data = np.memmap(self.data_path, dtype=np.uint8, mode="r+", shape=(capacity, GRID * GRID, TILE * TILE))
+
+    def __contains__(self, token_id):
+        with self.lock:
+            return token_id in self.rows
+
+    def add(self, token_id, image_bytes):
+        """Describe and store a token's image (no-op if it is already stored)"""
+        if token_id in self:
+            return
+        descriptor = describe(image_bytes)
+        with self.lock:
+            if token_id in self.rows:
+                return
+            row = len(self.rows)
+            if row >= self.data.shape[0]:
+                self.data.flush()
+                self._open(self.data.shape[0] * 2)
+            self.data[row] = descriptor
+            self.tokens_file.write(f"{token_id}\n")
+            self.tokens_file.flush()
+            self.rows[token_id] = row
+
+    def scores(self, query, token_ids, missing=np.nan):
+        """Similarity of a query descriptor to each token.
+
+        Tokens without a descriptor get `missing` (a scalar, or one value per token).
+        """
+        scores = np.broadcast_to(np.asarray(missing, dtype=np.float64), (len(token_ids),)).copy()
+        with self.lock:
+            found = [(i, self.rows[token_id]) for i, token_id in enumerate(token_ids) if token_id in self.rows]
+            if not found:
+                return scores
+            positions, rows = zip(*found)
+            candidates = self.data[list(rows)]
+        scores[list(positions)] = similarity(query, candidates)
+        return scores
@@ -0,0 +1,288 @@
+"""Nonce management and pipelined transaction submission for the agent wallet.
+
+All on-chain writes go through a single TransactionManager, which owns the
+wallet nonce. Calls are queued, built with consecutive locally-allocated
+nonces and broadcast without waiting for the previous transaction to be mined.
+With `batch_size > 1`, calls queued within `batch_wait_ms` of each other are
+broadcast together in one JSON-RPC batch of `eth_sendRawTransaction`.
+
+A background tracker polls receipts for everything in flight (one JSON-RPC
+batch per poll) and re-sends transactions that stay unmined for `bump_after`
+seconds with the same nonce and a higher gas price.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from web3 import Web3
+
+import metrics
+
+
+class NonceManager:
+    """Hands out consecutive nonces, syncing from the node's pending count when needed"""
+
+    def __init__(self, w3, address):
+        self.w3 = w3
+        self.address = address
+        self.lock = threading.Lock()
+        self.next_nonce = None
+
+    def allocate(self):
+        with self.lock:
+            if self.next_nonce is None:
+                self.next_nonce = self.w3.eth.get_transaction_count(self.address, "pending")
+            nonce = self.next_nonce
+            self.next_nonce += 1
+            return nonce
+
+    def release(self, nonce):
+        """Give back the most recently allocated nonce if its transaction was never sent"""
+        with self.lock:
+            if self.next_nonce == nonce + 1:
+                self.next_nonce = nonce
+
+    def reset(self):
+        with self.lock:
+            self.next_nonce = None
+
+
+class PendingTransaction:
+    def __init__(self, call, label, on_receipt=None):
+        self.call = call
+        self.label = label
+        self.tx = None
+        self.nonce = None
+        self.hashes = []
+        self.sent_at = None
+        self.first_sent_at = None
+        self.bumps = 0
+        # Resolves with the tx hash once broadcast, then with the receipt once mined
+        self.sent = Future()
+        self.receipt = Future()
+        if on_receipt is not None:
+            self.receipt.add_done_callback(on_receipt)
+
+    @property
+    def hash(self):
+        return self.hashes[-1] if self.hashes else None
+
+
+def _to_hex(value):
+    return value if isinstance(value, str) else Web3.to_hex(value)
+
+
+class TransactionManager:
+    def __init__(self, w3, account, batch_size=1, batch_wait_ms=50, poll_interval=2.0,
+                 bump_after=60.0, bump_factor=1.125, max_bumps=5):
+        self.w3 = w3
+        self.account = account
+        self.nonces = NonceManager(w3, account.address)
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000
+        self.poll_interval = poll_interval
+        self.bump_after = bump_after
+        self.bump_factor = bump_factor
+        self.max_bumps = max_bumps
+        self.chain_id = None
+        self.queue = queue.Queue()
+        self.in_flight = {}
+        self.in_flight_lock = threading.Lock()
+        self.started = False
+
+    def start(self):
+        if self.started:
+            return
+        self.started = True
+        self.chain_id = self.w3.eth.chain_id
+        metrics.gauge("tx_in_flight").set_function(self.pending_count)
+        threading.Thread(target=self._send_loop, name="tx-sender", daemon=True).start()
+        threading.Thread(target=self._track_loop, name="tx-tracker", daemon=True).start()
+
+    def submit(self, call, label="", on_receipt=None):
+        """Queue a contract function call; returns a PendingTransaction immediately"""
+        pending = PendingTransaction(call, label, on_receipt)
+        self.queue.put(pending)
+        return pending
+
+    def transact(self, call, label="", timeout=120):
+        """Submit a call and block until its receipt is available"""
+        return self.submit(call, label).receipt.result(timeout=timeout)
+
+    def pending_count(self):
+        with self.in_flight_lock:
+            return len(self.in_flight)
+
+    # ------------------------------------------------------------------
+    # Sending
+    # ------------------------------------------------------------------
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _sign(self, tx):
+        return self.account.sign_transaction(tx).raw_transaction
+
+    def _build(self, pending, gas_price):
+        nonce = self.nonces.allocate()
+        try:
+            pending.tx = pending.call.build_transaction({
+                "from": self.account.address,
+                "nonce": nonce,
+                "gasPrice": gas_price,
+                "chainId": self.chain_id,
+            })
+        except Exception:
+            # e.g. the call reverts during gas estimation; the nonce was never used
+            self.nonces.release(nonce)
+            raise
+        pending.nonce = nonce
+        return self._sign(pending.tx)
+
+    def _rpc_batch(self, method, params_list):
+        """Issue several calls of one RPC method, batched when the provider supports it"""
+        calls = [(method, params) for params in params_list]
+        # Issued on the provider directly, so the RPC metrics middleware does not see them
+        metrics.counter("rpc_requests_total", method=method, function="").inc(len(calls))
+        if hasattr(self.w3.provider, "make_batch_request"):
+            return self.w3.provider.make_batch_request(calls)
+        return [self.w3.provider.make_request(method, params) for method, params in calls]
+
+    def _broadcast(self, raw_transactions):
+        """Send signed transactions, returning a tx hash or exception per transaction"""
+        if len(raw_transactions) == 1:
+            try:
+                return [_to_hex(self.w3.eth.send_raw_transaction(raw_transactions[0]))]
+            except Exception as e:
+                return [e]
+
+        responses = self._rpc_batch("eth_sendRawTransaction", [[_to_hex(raw)] for raw in raw_transactions])
+        results = []
+        for response in responses:
+            if "error" in response:
+                results.append(RuntimeError(response["error"].get("message", response["error"])))
+            else:
+                results.append(response["result"])
+        return results
+
+    def _send_loop(self):
+        while True:
+            self._send_batch(self._collect())
+
+    def _send_batch(self, batch):
+        try:
+            gas_price = self.w3.eth.gas_price
+        except Exception as e:
+            for pending in batch:
+                pending.sent.set_exception(e)
+                pending.receipt.set_exception(e)
+            return
+
+        built, raw_transactions = [], []
+        for pending in batch:
+            try:
+                raw_transactions.append(self._build(pending, gas_price))
+                built.append(pending)
+            except Exception as e:
+                pending.sent.set_exception(e)
+                pending.receipt.set_exception(e)
+        if not built:
+            return
+
+        try:
+            results = self._broadcast(raw_transactions)
+        except Exception as e:
+            results = [e] * len(built)
+
+        for pending, result in zip(built, results):
+            if isinstance(result, Exception):
+                # The node's view of our nonce may differ from ours; resync
+                self.nonces.reset()
+                metrics.counter("tx_failed_total", reason="broadcast").inc()
+                pending.sent.set_exception(result)
+                pending.receipt.set_exception(result)
+                continue
+            pending.hashes.append(result)
+            pending.sent_at = pending.first_sent_at = time.monotonic()
+            metrics.counter("tx_sent_total").inc()
+            with self.in_flight_lock:
+                self.in_flight[pending.nonce] = pending
+            pending.sent.set_result(result)
+
+    # ------------------------------------------------------------------
+    # Receipt tracking
+    # ------------------------------------------------------------------
+
+    def _fetch_receipts(self, hashes):
+        responses = self._rpc_batch("eth_getTransactionReceipt", [[tx_hash] for tx_hash in hashes])
+        receipts = {}
+        for tx_hash, response in zip(hashes, responses):
+            receipt = response.get("result")
+            if receipt:
+                receipt = dict(receipt)
+                for key in ("status", "blockNumber", "gasUsed"):
+                    if isinstance(receipt.get(key), str):
+                        receipt[key] = int(receipt[key], 16)
+                receipts[tx_hash] = receipt
+        return receipts
+
+    def _bump(self, pending):
+        pending.tx["gasPrice"] = int(pending.tx["gasPrice"] * self.bump_factor) + 1
+        try:
+            tx_hash = _to_hex(self.w3.eth.send_raw_transaction(self._sign(pending.tx)))
+        except Exception:
+            # Most likely an earlier attempt was mined ("nonce too low"); the
+            # next receipt poll will pick it up
+            pending.sent_at = time.monotonic()
+            return
+        pending.hashes.append(tx_hash)
+        pending.sent_at = time.monotonic()
+        pending.bumps += 1
+        metrics.counter("tx_gas_bumps_total").inc()
+
+    def _track_loop(self):
+        while True:
+            time.sleep(self.poll_interval)
+            self._track_once()
+
+    def _track_once(self):
+        """Resolve mined transactions and bump (or give up on) the ones left unmined"""
+        with self.in_flight_lock:
+            tracked = list(self.in_flight.values())
+        if not tracked:
+            return
+
+        try:
+            receipts = self._fetch_receipts([h for pending in tracked for h in pending.hashes])
+        except Exception:
+            return
+
+        for pending in tracked:
+            receipt = next((receipts[h] for h in pending.hashes if h in receipts), None)
+            if receipt is not None:
+                with self.in_flight_lock:
+                    self.in_flight.pop(pending.nonce, None)
+                metrics.histogram("tx_confirmation_seconds").observe(time.monotonic() - pending.first_sent_at)
+                metrics.counter("tx_receipts_total", status=str(receipt.get("status"))).inc()
+                pending.receipt.set_result(receipt)
+            elif time.monotonic() - pending.sent_at >= self.bump_after:
+                if pending.bumps >= self.max_bumps:
+                    with self.in_flight_lock:
+                        self.in_flight.pop(pending.nonce, None)
+                    self.nonces.reset()
+                    metrics.counter("tx_failed_total", reason="unmined").inc()
+                    pending.receipt.set_exception(
+                        TimeoutError(f"{pending.label} not mined after {pending.bumps} gas bumps"))
+                else:
+                    self._bump(pending)
@@ -0,0 +1,275 @@
+"""Vector stores for NFT embeddings.
+
+`VectorStore` is the interface the agent codes against. `QdrantVectorStore`
+talks to Qdrant over HTTP with buffered upserts, batched search and bulk
+lookups; `local_vector_store.LocalVectorStore` is an in-process alternative.
+`GroupedVectorStore` wraps either to store several vectors per token.
+Search results use Qdrant's shape: `[{"id", "score", "payload"}, ...]`.
+"""
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class VectorStore:
+    def ensure_collection(self):
+        """Create the underlying collection/index if needed; returns a status string"""
+        raise NotImplementedError
+
+    def upsert(self, id, vector, payload=None):
+        """Store one point durably"""
+        raise NotImplementedError
+
+    def add(self, id, vector, payload=None):
+        """Store one point, possibly buffered until `flush`"""
+        self.upsert(id, vector, payload)
+
+    def flush(self):
+        """Make every point added so far durable"""
+
+    def refresh(self):
+        """Pick up points another process has written (only read-only local stores need to)"""
+
+    def search(self, vector, limit=5):
+        raise NotImplementedError
+
+    def search_batch(self, vectors, limit=5):
+        return [self.search(vector, limit) for vector in vectors]
+
+    def existing_ids(self, ids):
+        raise NotImplementedError
+
+    def exists(self, id):
+        return bool(self.existing_ids([id]))
+
+    def count(self):
+        raise NotImplementedError
+
+
+class QdrantVectorStore(VectorStore):
+    def __init__(self, http, base_url, api_key, collection="realia", dim=512, batch_size=64):
+        self.http = http
+        self.base_url = base_url
+        self.api_key = api_key
+        self.collection = collection
+        self.dim = dim
+        self.batch_size = batch_size
+        self.buffer = []
+        self.buffer_lock = threading.Lock()
+        # Last point sent with wait=false; re-sent with wait=true as a barrier
+        self.last_unacked = None
+
+    @property
+    def url(self):
+        return f"{self.base_url}/collections/{self.collection}"
+
+    def _headers(self):
+        return {"Content-Type": "application/json", "api-key": self.api_key}
+
+    def _call(self, method, path, body=None, params=None):
+        r = self.http.request(method, f"{self.url}{path}", headers=self._headers(),
+                              data=json.dumps(body) if body is not None else None, params=params)
+        r.raise_for_status()
+        return r.json()
+
+    def ensure_collection(self):
+        r = self.http.get(self.url, headers=self._headers())
+        if r.status_code == 200:
+            return "already exists"
+        self._call("PUT", "", {"vectors": {"size": self.dim, "distance": "Cosine"}})
+        return "created"
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def _write(self, points, wait):
+        self._call("PUT", "/points", {"points": points}, params={"wait": "true" if wait else "false"})
+
+    def upsert(self, id, vector, payload=None):
+        """Write one point immediately and wait for it to be applied"""
+        self._write([{"id": id, "vector": vector, "payload": payload or {}}], wait=True)
+
+    def add(self, id, vector, payload=None):
+        """Buffer a point; full buffers are sent without waiting for Qdrant to apply them.
+
+        A batch whose write fails stays buffered, so nothing is lost before `flush()`.
+        """
+        with self.buffer_lock:
+            self.buffer.append({"id": id, "vector": vector, "payload": payload or {}})
+            if len(self.buffer) < self.batch_size:
+                return
+            points, self.buffer = self.buffer, []
+        try:
+            self._write(points, wait=False)
+        except Exception:
+            # Keep the batch for the next write; flush() reports the failure if it persists
+            self._requeue(points)
+            return
+        self.last_unacked = points[-1]
+
+    def _requeue(self, points):
+        with self.buffer_lock:
+            self.buffer[:0] = points
+
+    def flush(self):
+        """Send buffered points and block until every earlier write is applied.
+
+        Qdrant applies updates to a collection in order, so waiting on the
+        final write is a barrier for all the wait=false writes before it.
+        """
+        with self.buffer_lock:
+            points, self.buffer = self.buffer, []
+        if not points and self.last_unacked is not None:
+            points = [self.last_unacked]
+        if points:
+            try:
+                self._write(points, wait=True)
+            except Exception:
+                if points[-1] is not self.last_unacked:
+                    self._requeue(points)
+                raise
+        self.last_unacked = None
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def search(self, vector, limit=5):
+        return self._call("POST", "/points/search", {"vector": vector, "limit": limit, "with_payload": True})["result"]
+
+    def search_batch(self, vectors, limit=5):
+        """Run several searches in one request; returns one result list per vector"""
+        searches = [{"vector": vector, "limit": limit, "with_payload": True} for vector in vectors]
+        return self._call("POST", "/points/search/batch", {"searches": searches})["result"]
+
+    def existing_ids(self, ids, chunk_size=1000):
+        """Return the subset of `ids` that are stored, retrieved by id list in bulk"""
+        found = set()
+        ids = list(ids)
+        for start in range(0, len(ids), chunk_size):
+            body = {"ids": ids[start:start + chunk_size], "with_payload": False, "with_vector": False}
+            found.update(point["id"] for point in self._call("POST", "/points", body)["result"])
+        return found
+
+    def count(self):
+        r = self.http.get(self.url, headers=self._headers())
+        if r.status_code == 200:
+            return r.json()["result"]["points_count"]
+        return 0
+
+
+class GroupedVectorStore(VectorStore):
+    """Several vectors per token (e.g. the full image plus crops) in an underlying store.
+
+    Vector `i` of token `t` is stored as point `t * stride + i` with the token
+    id and `crop` index in its payload. Searches over-fetch `group_size`
+    results per requested hit from the underlying store (still one request)
+    and keep each token's best-scoring vector, so results are per token; a
+    result's `crop` says which vector matched.
+    """
+
+    def __init__(self, store, group_size, stride=64):
+        if group_size > stride:
+            raise ValueError(f"group_size {group_size} exceeds the id stride {stride}")
+        self.store = store
+        self.group_size = group_size
+        self.stride = stride
+
+    def ensure_collection(self):
+        return self.store.ensure_collection()
+
+    def _points(self, id, vectors, payload):
+        return [(id * self.stride + i, vector, {**(payload or {}), "tokenId": id, "crop": i})
+                for i, vector in enumerate(vectors)]
+
+    def upsert(self, id, vectors, payload=None):
+        # Every crop must be applied, not only the last: buffer them all, then flush
+        self.add(id, vectors, payload)
+        self.store.flush()
+
+    def add(self, id, vectors, payload=None):
+        """Buffer all of a token's vectors (`vectors` is a list of embeddings)"""
+        for point in self._points(id, vectors, payload):
+            self.store.add(*point)
+
+    def flush(self):
+        self.store.flush()
+
+    def refresh(self):
+        self.store.refresh()
+
+    def _by_token(self, results, limit):
+        """Each token's best hit, with the index of the vector that scored it in `crop` (0: full image)"""
+        best = {}
+        for hit in results:
+            payload = hit.get("payload", {})
+            token_id = payload.get("tokenId", hit["id"] // self.stride)
+            # Results arrive best first, so the first hit of a token is its best
+            if token_id not in best:
+                best[token_id] = {**hit, "id": token_id, "crop": payload.get("crop", hit["id"] % self.stride)}
+        return list(best.values())[:limit]
+
+    def search(self, vector, limit=5):
+        return self._by_token(self.store.search(vector, limit * self.group_size), limit)
+
+    def search_batch(self, vectors, limit=5):
+        results = self.store.search_batch(vectors, limit * self.group_size)
+        return [self._by_token(hits, limit) for hits in results]
+
+    def existing_ids(self, ids):
+        """Tokens whose full-image vector (index 0) is stored"""
+        ids = list(ids)
+        found = self.store.existing_ids([id * self.stride for id in ids])
+        return {id for id in ids if id * self.stride in found}
+
+    def count(self):
+        """Number of stored vectors (not tokens)"""
+        return self.store.count()
+
+
+class SearchBatcher:
+    """Coalesces searches issued concurrently by pipeline workers into batch requests"""
+
+    def __init__(self, store, max_batch_size=16, max_wait_ms=5):
+        self.store = store
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue()
+        threading.Thread(target=self._run, name="search-batcher", daemon=True).start()
+
+    def search(self, vector, limit=5):
+        future = Future()
+        self.queue.put((vector, limit, future))
+        return future.result()
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            limit = max(limit for _, limit, _ in batch)
+            try:
+                if len(batch) == 1:
+                    results = [self.store.search(batch[0][0], limit)]
+                else:
+                    results = self.store.search_batch([vector for vector, _, _ in batch], limit)
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, requested, future), result in zip(batch, results):
+                future.set_result(result[:requested])
@@ -0,0 +1,287 @@
+"""Verification stages and the stores they read.
+
+Shared by the agent (agent.py) and its verification shard processes
+(shard_worker.py): the settings, HTTP/IPFS clients, embedding cache, vector
+store, image hashes and tile descriptors, and the pipeline stages from fetch
+to decide. Nothing here touches the chain or uAgents, so a shard process can
+import it without building a wallet, contracts or an agent identity. In a
+shard process (AGENT_ROLE=shard) the on-disk stores are opened read-only.
+"""
+import base64
+import os
+import time
+
+from embedding_cache import EmbeddingCache
+from http_client import HttpClient
+from image_fetch import downscale
+from image_hash import ImageHashIndex
+from ipfs import IpfsClient, DEFAULT_GATEWAYS
+from pipeline import Pipeline, Stage, VerificationJob
+from tile_descriptors import TileDescriptorStore, describe
+from vector_store import GroupedVectorStore, QdrantVectorStore, SearchBatcher
+import metrics
+
+# VerificationResult enum values (matching the Solidity enum)
+class VerificationResult:
+    NONE = 0
+    VERIFIED = 1
+    MODIFIED = 2
+    NOT_VERIFIED = 3
+
+# ============================================================================
+# Settings
+# ============================================================================
+QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+QDRANT_BASE_URL = os.getenv("QDRANT_BASE_URL")
+EMBEDDING_URL = os.getenv("EMBEDDING_URL")
+# Binary endpoint taking the image as the request body; empty to use base64 JSON on EMBEDDING_URL
+EMBEDDING_RAW_URL = os.getenv("EMBEDDING_RAW_URL", f"{EMBEDDING_URL}_raw" if EMBEDDING_URL else "")
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(20 * 1024 * 1024)))
+METADATA_MAX_BYTES = int(os.getenv("METADATA_MAX_BYTES", str(1024 * 1024)))
+IMAGE_SHORT_SIDE = int(os.getenv("IMAGE_SHORT_SIDE", "448"))
+# Comma-separated gateway base URLs, raced with hedged requests
+IPFS_GATEWAYS = [g.strip() for g in os.getenv("IPFS_GATEWAYS", ",".join(DEFAULT_GATEWAYS)).split(",") if g.strip()]
+IPFS_HEDGE_DELAY = float(os.getenv("IPFS_HEDGE_DELAY", "0.5"))
+IPFS_CACHE_DIR = os.getenv("IPFS_CACHE_DIR", ".cache/ipfs")
+IPFS_CACHE_MAX_BYTES = int(os.getenv("IPFS_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+QDRANT_UPSERT_BATCH_SIZE = int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", "64"))
+QDRANT_SEARCH_BATCH_SIZE = int(os.getenv("QDRANT_SEARCH_BATCH_SIZE", "16"))
+# "qdrant" uses Qdrant Cloud, "local" keeps an in-process index under LOCAL_INDEX_DIR
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "qdrant")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", ".cache/vector_index")
+# "single" stores one vector per NFT; "tiles" also stores EMBEDDING_CROP_GRID^2
+# overlapping crops per NFT (in QDRANT_TILES_COLLECTION) so cropped copies
+# still match, and search keeps each token's best-scoring vector
+EMBEDDING_INDEX_MODE = os.getenv("EMBEDDING_INDEX_MODE", "single")
+EMBEDDING_CROP_GRID = int(os.getenv("EMBEDDING_CROP_GRID", "2"))
+EMBEDDING_CROPS_URL = os.getenv(
+    "EMBEDDING_CROPS_URL", f"{EMBEDDING_URL.rsplit('/', 1)[0]}/get_image_crop_embeddings" if EMBEDDING_URL else ""
+)
+QDRANT_TILES_COLLECTION = os.getenv("QDRANT_TILES_COLLECTION", "realia_tiles")
+# Verification pipeline: per-stage worker counts, queue bound and per-request deadline (seconds)
+VERIFY_FETCH_CONCURRENCY = int(os.getenv("VERIFY_FETCH_CONCURRENCY", "8"))
+VERIFY_EMBED_CONCURRENCY = int(os.getenv("VERIFY_EMBED_CONCURRENCY", "4"))
+VERIFY_SEARCH_CONCURRENCY = int(os.getenv("VERIFY_SEARCH_CONCURRENCY", "4"))
+VERIFY_QUEUE_SIZE = int(os.getenv("VERIFY_QUEUE_SIZE", "32"))
+VERIFY_DEADLINE = float(os.getenv("VERIFY_DEADLINE", "120"))
+# Perceptual-hash prefilter: byte-identical images, or images within these
+# pHash/dHash Hamming distances of a minted NFT, are VERIFIED without CLIP
+PREFILTER_ENABLED = os.getenv("PREFILTER_ENABLED", "true").lower() == "true"
+PREFILTER_PHASH_DISTANCE = int(os.getenv("PREFILTER_PHASH_DISTANCE", "2"))
+PREFILTER_DHASH_DISTANCE = int(os.getenv("PREFILTER_DHASH_DISTANCE", "2"))
+IMAGE_HASH_INDEX_PATH = os.getenv("IMAGE_HASH_INDEX_PATH", ".cache/image_hashes.txt")
+# Re-rank: when the runner-up's CLIP score is within RERANK_MARGIN of the best,
+# the top RERANK_TOP_K candidates are re-ordered by a blend of CLIP and tile
+# similarity (weight RERANK_WEIGHT), unless RERANK_BUDGET_MS has passed since the search
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "true").lower() == "true"
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "5"))
+RERANK_MARGIN = float(os.getenv("RERANK_MARGIN", "0.05"))
+RERANK_WEIGHT = float(os.getenv("RERANK_WEIGHT", "0.5"))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "25"))
+TILE_DESCRIPTOR_DIR = os.getenv("TILE_DESCRIPTOR_DIR", ".cache/tile_descriptors")
+
+# Thresholds for verification
+VERIFIED_THRESHOLD = 0.95
+MODIFIED_THRESHOLD = 0.75
+
+# Set by shard_worker.py: a verification worker of a coordinating agent (see shards.py),
+# which opens the coordinator's caches and indexes read-only
+SHARD_WORKER = os.getenv("AGENT_ROLE", "agent") == "shard"
+
+# ============================================================================
+# Shared Clients and Stores
+# ============================================================================
+
+# Keep-alive sessions per host with timeouts and jittered retries; tracks per-host latency
+http = HttpClient(
+    timeout=(float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05")), float(os.getenv("HTTP_READ_TIMEOUT", "30"))),
+    retries=int(os.getenv("HTTP_RETRIES", "3")),
+)
+
+def ensure_qdrant_collection():
+    return vector_store.ensure_collection()
+
+def search_points(vector, limit=5):
+    """Search for similar NFTs; concurrent searches are sent as one batch request"""
+    return search_batcher.search(vector, limit)
+
+# Shared with the embedding server: same key scheme (sha256 of model name + image bytes)
+embedding_cache = EmbeddingCache(
+    os.getenv("EMBEDDING_CACHE_DIR", ".cache/embeddings"),
+    os.getenv("EMBEDDING_MODEL", "openai/clip-vit-base-patch32"),
+    read_only=SHARD_WORKER,
+)
+
+def fetch_image(uri):
+    """Resolve a token/verification metadata URI and download the image bytes"""
+    imageLink = ipfs.resolve_image(uri, METADATA_MAX_BYTES)
+    return ipfs.fetch(imageLink, IMAGE_MAX_BYTES)
+
+def embed_image(image_bytes):
+    # The cache is keyed on the original bytes, before any resizing
+    cache_key = embedding_cache.key(image_bytes)
+    embedding = embedding_cache.get(cache_key)
+    if embedding is not None:
+        return embedding
+    if EMBEDDING_RAW_URL:
+        # Send a pre-resized image as the raw request body instead of base64 JSON
+        r = http.post(EMBEDDING_RAW_URL, data=downscale(image_bytes, IMAGE_SHORT_SIDE),
+                      headers={"Content-Type": "application/octet-stream"})
+    else:
+        b64 = base64.b64encode(image_bytes).decode("utf-8")
+        payload = {"image": b64}
+        r = http.post(EMBEDDING_URL, json=payload)
+    r.raise_for_status()
+    embedding = r.json()["embedding"]
+    embedding_cache.put(cache_key, embedding)
+    return embedding
+
+def embed_image_crops(image_bytes):
+    """Embeddings of the full image and its EMBEDDING_CROP_GRID x EMBEDDING_CROP_GRID crops, in one request"""
+    cache_key = embedding_cache.key(image_bytes)
+    keys = [cache_key] + [f"{cache_key}:grid{EMBEDDING_CROP_GRID}:{i}" for i in range(1, EMBEDDING_CROP_GRID ** 2 + 1)]
+    embeddings = [embedding_cache.get(key) for key in keys]
+    if all(embedding is not None for embedding in embeddings):
+        return embeddings
+    # Crops need more pixels than the full view: keep enough that each still covers CLIP's 224px input
+    r = http.post(EMBEDDING_CROPS_URL, params={"grid": EMBEDDING_CROP_GRID},
+                  data=downscale(image_bytes, max(IMAGE_SHORT_SIDE, 224 * (EMBEDDING_CROP_GRID + 1) // 2)),
+                  headers={"Content-Type": "application/octet-stream"})
+    r.raise_for_status()
+    embeddings = r.json()["embeddings"]
+    for key, embedding in zip(keys, embeddings):
+        embedding_cache.put(key, embedding)
+    return embeddings
+
+ipfs = IpfsClient(http, IPFS_GATEWAYS, IPFS_CACHE_DIR, hedge_delay=IPFS_HEDGE_DELAY, max_cache_bytes=IPFS_CACHE_MAX_BYTES)
+TILED_INDEX = EMBEDDING_INDEX_MODE == "tiles"
+if VECTOR_STORE_BACKEND == "local":
+    from local_vector_store import LocalVectorStore
+    vector_store = LocalVectorStore(f"{LOCAL_INDEX_DIR}-tiles" if TILED_INDEX else LOCAL_INDEX_DIR, read_only=SHARD_WORKER)
+else:
+    vector_store = QdrantVectorStore(http, QDRANT_BASE_URL, QDRANT_API_KEY, batch_size=QDRANT_UPSERT_BATCH_SIZE,
+                                     collection=QDRANT_TILES_COLLECTION if TILED_INDEX else "realia")
+if TILED_INDEX:
+    # Tokens are keyed by their full-image vector, so existing_ids() and search results stay per token
+    vector_store = GroupedVectorStore(vector_store, group_size=1 + EMBEDDING_CROP_GRID ** 2)
+search_batcher = SearchBatcher(vector_store, max_batch_size=QDRANT_SEARCH_BATCH_SIZE)
+# SHA-256 + pHash/dHash of every indexed NFT, for the prefilter stage
+image_index = ImageHashIndex(IMAGE_HASH_INDEX_PATH, read_only=SHARD_WORKER)
+# 32x32 grayscale tile descriptors of every indexed NFT, for the re-rank stage
+tile_store = TileDescriptorStore(TILE_DESCRIPTOR_DIR, read_only=SHARD_WORKER)
+metrics.gauge("cache_hit_ratio", cache="embedding").set_function(lambda: embedding_cache.stats()["hit_rate"])
+metrics.gauge("cache_entries", cache="embedding").set_function(lambda: embedding_cache.stats()["disk_entries"])
+metrics.gauge("cache_hit_ratio", cache="ipfs").set_function(lambda: ipfs.stats()["hit_rate"])
+metrics.gauge("cache_bytes", cache="ipfs").set_function(lambda: ipfs.stats()["cache_bytes"])
+
+def refresh_shared_stores():
+    """Shard workers: load what the coordinating agent has indexed since the last refresh"""
+    vector_store.refresh()
+    embedding_cache.refresh()
+    image_index.refresh()
+    tile_store.refresh()
+
+# ============================================================================
+# Verification Pipeline Stages
+# ============================================================================
+
+def fetch_stage(job: VerificationJob):
+    job.logger.info(f"Verification URI: {job.uri}")
+    job.image = fetch_image(job.uri)
+
+def prefilter_stage(job: VerificationJob):
+    # Identical or near-identical copies of a minted NFT need no embedding or search
+    match = image_index.match(job.image, PREFILTER_PHASH_DISTANCE, PREFILTER_DHASH_DISTANCE)
+    if match is None:
+        return
+    token_id, kind, distance = match
+    metrics.counter("prefilter_matches_total", kind=kind).inc()
+    job.result = VerificationResult.VERIFIED
+    job.matched_token_id = token_id
+    job.score = 1.0
+    job.logger.info(f"✓ VERIFIED by {kind} match with NFT #{token_id} (distance {distance})")
+
+def is_decided(job: VerificationJob):
+    return job.result is not None
+
+def embed_stage(job: VerificationJob):
+    # Get embedding for the verification image
+    job.embedding = embed_image(job.image)
+    job.logger.info(f"✓ Embedding generated for verification #{job.request_id}")
+
+def search_stage(job: VerificationJob):
+    # Search Qdrant for similar NFTs
+    job.search_results = search_points(job.embedding, limit=max(5, RERANK_TOP_K))
+    job.searched_at = time.monotonic()
+
+def rerank_stage(job: VerificationJob):
+    """Re-order close CLIP candidates by tile similarity to the submitted image"""
+    results = job.search_results
+    if not results or len(results) < 2:
+        return
+    best_score = results[0]["score"]
+    finalists = [r for r in results[:RERANK_TOP_K]
+                 if r["score"] >= MODIFIED_THRESHOLD and best_score - r["score"] <= RERANK_MARGIN]
+    if len(finalists) < 2:
+        # A clear winner (or nothing above MODIFIED): the top-1 decision stands
+        return
+    
+    # The budget runs from the end of the search, so time spent queued for a re-rank worker counts
+    if (time.monotonic() - job.searched_at) * 1000 >= RERANK_BUDGET_MS:
+        metrics.counter("rerank_skipped_total", reason="budget").inc()
+        return
+    query = describe(job.image)
+    token_ids = [r.get("payload", {}).get("tokenId", r["id"]) for r in finalists]
+    # Candidates without a descriptor yet are ranked on their CLIP score alone
+    clip_scores = [r["score"] for r in finalists]
+    tile_scores = tile_store.scores(query, token_ids, missing=clip_scores)
+    combined = [(1 - RERANK_WEIGHT) * clip + RERANK_WEIGHT * tile for clip, tile in zip(clip_scores, tile_scores)]
+    order = sorted(range(len(finalists)), key=lambda i: combined[i], reverse=True)
+    job.search_results = [finalists[i] for i in order] + [r for r in results if r not in finalists]
+    if order[0] != 0:
+        metrics.counter("rerank_changed_total").inc()
+        job.logger.info(f"Re-rank: NFT #{token_ids[order[0]]} replaces NFT #{token_ids[0]} as best match")
+
+def decide_stage(job: VerificationJob):
+    logger = job.logger
+    search_results = job.search_results
+    
+    if not search_results or len(search_results) == 0:
+        logger.warning("No matching NFTs found. Responding with NOT_VERIFIED")
+        job.result = VerificationResult.NOT_VERIFIED
+        job.matched_token_id = 0
+        return
+    
+    # Get the best match
+    best_match = search_results[0]
+    similarity_score = best_match.get("score", 0)
+    matched_token_id = best_match.get("payload", {}).get("tokenId", 0)
+    job.score = similarity_score
+    
+    logger.info(f"Search results: {len(search_results)} matches found")
+    logger.info(f"Best match: NFT #{matched_token_id}, Similarity: {similarity_score:.4f}")
+    
+    if similarity_score >= VERIFIED_THRESHOLD and not best_match.get("crop"):
+        job.result = VerificationResult.VERIFIED
+        logger.info(f"✓ VERIFIED! Exact match with NFT #{matched_token_id}")
+    elif similarity_score >= MODIFIED_THRESHOLD:
+        # A crop of the NFT matching (tiled index) is at best a modified copy, however close
+        job.result = VerificationResult.MODIFIED
+        logger.info(f"⚠ MODIFIED! Similar to NFT #{matched_token_id} but with modifications")
+    else:
+        job.result = VerificationResult.NOT_VERIFIED
+        matched_token_id = 0
+        logger.info(f"✗ NOT_VERIFIED. Similarity too low.")
+    job.matched_token_id = matched_token_id
+
+def build_pipeline(final_stage):
+    """The verification stages up to the decision, followed by `final_stage` (submit or report)"""
+    return Pipeline([
+        Stage("fetch", fetch_stage, VERIFY_FETCH_CONCURRENCY),
+        *([Stage("prefilter", prefilter_stage, VERIFY_FETCH_CONCURRENCY)] if PREFILTER_ENABLED else []),
+        Stage("embed", embed_stage, VERIFY_EMBED_CONCURRENCY, skip=is_decided),
+        Stage("search", search_stage, VERIFY_SEARCH_CONCURRENCY, skip=is_decided),
+        *([Stage("rerank", rerank_stage, VERIFY_SEARCH_CONCURRENCY, skip=is_decided)] if RERANK_ENABLED else []),
+        Stage("decide", decide_stage, skip=is_decided),
+        final_stage,
+    ], queue_size=VERIFY_QUEUE_SIZE)
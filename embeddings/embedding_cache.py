@@ -0,0 +1,127 @@
+"""Content-addressed embedding cache.
+
+Embeddings are keyed by sha256(model name + image bytes). Lookups go through
+an in-memory LRU first, then a disk tier made of a memory-mapped float32 array
+(`vectors.f32`) plus an append-only key log (`keys.txt`) giving each key's row.
+
+The same module is shipped with the agent (agent/embedding_cache.py) so both
+sides compute identical keys.
+"""
+import hashlib
+import mmap
+import os
+import threading
+from array import array
+from collections import OrderedDict
+
+FLOAT_SIZE = 4
+
+
+class EmbeddingCache:
+    def __init__(self, directory, model_name, dim=512, memory_size=4096, initial_rows=1024):
+        self.directory = directory
+        self.model_name = model_name
+        self.dim = dim
+        self.memory_size = memory_size
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()
+        self.rows = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self.keys_path = os.path.join(directory, "keys.txt")
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path) as f:
+                for row, line in enumerate(f):
+                    self.rows[line.strip()] = row
+
+        if not os.path.exists(self.vectors_path):
+            open(self.vectors_path, "wb").close()
+        self.vectors_file = open(self.vectors_path, "r+b")
+        min_size = max(initial_rows, len(self.rows)) * dim * FLOAT_SIZE
+        if os.path.getsize(self.vectors_path) < min_size:
+            self.vectors_file.truncate(min_size)
+        self._map()
+        self.keys_file = open(self.keys_path, "a")
+
+    def _map(self):
+        self.mmap = mmap.mmap(self.vectors_file.fileno(), 0)
+        self.vectors = memoryview(self.mmap).cast("f")
+
+    def _grow(self):
+        size = os.path.getsize(self.vectors_path)
+        self.vectors.release()
+        self.mmap.close()
+        self.vectors_file.truncate(size * 2)
+        self._map()
+
+    def key(self, image_bytes):
+        h = hashlib.sha256(self.model_name.encode("utf-8"))
+        h.update(b"\0")
+        h.update(image_bytes)
+        return h.hexdigest()
+
+    def _remember(self, key, embedding):
+        self.memory[key] = embedding
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached embedding for `key` as a list of floats, or None"""
+        with self.lock:
+            embedding = self.memory.get(key)
+            if embedding is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return embedding
+
+            row = self.rows.get(key)
+            if row is None:
+                self.misses += 1
+                return None
+
+            start = row * self.dim
+            embedding = self.vectors[start:start + self.dim].tolist()
+            self._remember(key, embedding)
+            self.hits += 1
+            self.disk_hits += 1
+            return embedding
+
+    def put(self, key, embedding):
+        if len(embedding) != self.dim:
+            raise ValueError(f"Expected a {self.dim}-d embedding, got {len(embedding)}")
+        with self.lock:
+            self._remember(key, list(embedding))
+            if key in self.rows:
+                return
+
+            row = len(self.rows)
+            while (row + 1) * self.dim > len(self.vectors):
+                self._grow()
+            start = row * self.dim * FLOAT_SIZE
+            self.mmap[start:start + self.dim * FLOAT_SIZE] = array("f", embedding).tobytes()
+            self.keys_file.write(key + "\n")
+            self.keys_file.flush()
+            self.rows[key] = row
+
+    def flush(self):
+        with self.lock:
+            self.mmap.flush()
+            self.keys_file.flush()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "disk_entries": len(self.rows),
+            }
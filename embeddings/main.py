@@ -2,24 +2,273 @@
 from flask import Flask, request, jsonify
 from PIL import Image
 import torch
-from transformers import CLIPProcessor, CLIPModel
 import base64
+import functools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
 from io import BytesIO
 
+from backends import load_backend
+from embedding_cache import EmbeddingCache
+
+MODEL_NAME = "openai/clip-vit-base-patch32"
+
+# Micro-batching: concurrent single-image requests are gathered into one
+# forward pass of at most MAX_BATCH_SIZE images, waiting at most MAX_WAIT_MS
+# for the batch to fill up.
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "16"))
+MAX_WAIT_MS = float(os.getenv("MAX_WAIT_MS", "10"))
+
+# Inference backend ("fp32" or "int8"); a quantized backend must stay within
+# EMBEDDING_TOLERANCE of fp32 on the calibration images or fp32 is served
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "fp32")
+EMBEDDING_TOLERANCE = float(os.getenv("EMBEDDING_TOLERANCE", "0.01"))
+EMBEDDING_CALIBRATION_DIR = os.getenv("EMBEDDING_CALIBRATION_DIR")
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", ".cache/embeddings")
+
+# Multi-crop embeddings: the full image plus a CROP_GRID x CROP_GRID set of
+# overlapping crops (each 2/(grid+1) of the image per side)
+CROP_GRID = int(os.getenv("CROP_GRID", "2"))
+MAX_CROP_GRID = 4
+
 app = Flask(__name__)
-model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
-processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
+# Set by load_model(), on first use or ahead of time (serve.py loads before forking)
+model = None
+processor = None
+backend_report = None
+CACHE_MODEL_NAME = None
+cache = None
+model_load_seconds = None
+model_lock = threading.Lock()
+
+# Throughput per batch size: {batch_size: {"batches": n, "images": n, "seconds": s}}
+batch_stats = {}
+batch_stats_lock = threading.Lock()
+
+
+def from_pretrained(cls):
+    # Use the local Hugging Face cache without asking the hub for updates; download only on a miss
+    try:
+        return cls.from_pretrained(MODEL_NAME, local_files_only=True)
+    except OSError:
+        return cls.from_pretrained(MODEL_NAME)
+
+
+def load_model():
+    """Load CLIP and the configured backend once; later calls return immediately"""
+    global model, processor, backend_report, CACHE_MODEL_NAME, cache, model_load_seconds
+    if cache is not None:
+        return
+    with model_lock:
+        if cache is not None:
+            return
+        start = time.perf_counter()
+        from transformers import CLIPProcessor, CLIPModel
+        processor = from_pretrained(CLIPProcessor)
+        clip = from_pretrained(CLIPModel)
+        clip.eval()
+        model, backend_report = load_backend(EMBEDDING_BACKEND, clip, processor, EMBEDDING_TOLERANCE,
+                                             EMBEDDING_CALIBRATION_DIR)
+        # Quantized embeddings differ slightly from fp32 ones, so they get their own cache keys
+        CACHE_MODEL_NAME = MODEL_NAME if backend_report["backend"] == "fp32" else f"{MODEL_NAME}:{backend_report['backend']}"
+        model_load_seconds = time.perf_counter() - start
+        # Assigned last: a non-None cache means everything above is ready
+        cache = EmbeddingCache(EMBEDDING_CACHE_DIR, CACHE_MODEL_NAME)
+
+
+def requires_model(view):
+    """Route decorator: wait for the model to finish loading"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        load_model()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def decode_image(image_data, size=224):
+    image = Image.open(BytesIO(image_data))
+    # CLIP only needs 224x224: let the JPEG decoder skip detail we would throw away
+    image.draft("RGB", (size, size))
+    return image.convert("RGB")
+
+
+def crop_boxes(width, height, grid):
+    """The full image followed by grid x grid overlapping crops"""
+    boxes = [(0, 0, width, height)]
+    crop_width, crop_height = 2 * width / (grid + 1), 2 * height / (grid + 1)
+    for row in range(grid):
+        for col in range(grid):
+            x, y = col * width / (grid + 1), row * height / (grid + 1)
+            boxes.append((round(x), round(y), round(x + crop_width), round(y + crop_height)))
+    return boxes
+
+
+def crop_cache_keys(image_data, grid):
+    # The full view shares its key with the single-image endpoints
+    key = cache.key(image_data)
+    return [key] + [f"{key}:grid{grid}:{i}" for i in range(1, grid * grid + 1)]
+
+
+def cached_embedding(image_data):
+    """Embed raw image bytes, consulting the content-addressed cache first"""
+    key = cache.key(image_data)
+    embedding = cache.get(key)
+    if embedding is None:
+        embedding = batcher.submit(decode_image(image_data)).result()
+        cache.put(key, embedding)
+    return embedding
+
+
+def embed_images(images):
+    """Run one CLIP forward pass over a list of PIL images"""
+    start = time.perf_counter()
+    with torch.inference_mode():
+        inputs = processor(images=images, return_tensors="pt")
+        outputs = model.get_image_features(**inputs)
+        embeddings = torch.nn.functional.normalize(outputs, p=2, dim=-1).tolist()
+    elapsed = time.perf_counter() - start
+
+    with batch_stats_lock:
+        stats = batch_stats.setdefault(len(images), {"batches": 0, "images": 0, "seconds": 0.0})
+        stats["batches"] += 1
+        stats["images"] += len(images)
+        stats["seconds"] += elapsed
+    return embeddings
+
+
+class MicroBatcher:
+    """Collects images submitted from concurrent requests and embeds them together"""
+
+    def __init__(self, embed_fn, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.embed_fn = embed_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue()
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def submit(self, image):
+        future = Future()
+        self.queue.put((image, future))
+        return future
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            images = [image for image, _ in batch]
+            try:
+                embeddings = self.embed_fn(images)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+
+batcher = MicroBatcher(embed_images)
+
 
 @app.route("/get_image_embedding", methods=["POST"])
+@requires_model
 def embed():
     data = request.json
-    image_data = base64.b64decode(data["image"])
-    image = Image.open(BytesIO(image_data))
-    input = processor(images=image, return_tensors="pt")
-    outputs = model.get_image_features(**input)
-    embedding = torch.nn.functional.normalize(outputs, p=2, dim=-1)
-    embedding = embedding[0].tolist()
+    embedding = cached_embedding(base64.b64decode(data["image"]))
+
+    return jsonify(embedding=embedding)
+
+
+@app.route("/get_image_embedding_raw", methods=["POST"])
+@requires_model
+def embed_raw():
+    # Image bytes as the request body (application/octet-stream), no base64 overhead
+    embedding = cached_embedding(request.get_data())
 
     return jsonify(embedding=embedding)
 
-app.run(port=5004)
\ No newline at end of file
+
+@app.route("/get_image_embeddings", methods=["POST"])
+@requires_model
+def embed_batch():
+    data = request.json
+    blobs = [base64.b64decode(b64) for b64 in data["images"]]
+    keys = [cache.key(blob) for blob in blobs]
+    embeddings = [cache.get(key) for key in keys]
+    futures = {
+        i: batcher.submit(decode_image(blob))
+        for i, blob in enumerate(blobs) if embeddings[i] is None
+    }
+    for i, future in futures.items():
+        embeddings[i] = future.result()
+        cache.put(keys[i], embeddings[i])
+
+    return jsonify(embeddings=embeddings)
+
+
+@app.route("/get_image_crop_embeddings", methods=["POST"])
+@requires_model
+def embed_crops():
+    # Image bytes as the request body; ?grid=N selects the crop grid
+    grid = max(1, min(int(request.args.get("grid", CROP_GRID)), MAX_CROP_GRID))
+    image_data = request.get_data()
+    keys = crop_cache_keys(image_data, grid)
+    embeddings = [cache.get(key) for key in keys]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        # Decode with enough resolution that each crop still covers 224 pixels
+        image = decode_image(image_data, 224 * (grid + 1) // 2)
+        boxes = crop_boxes(image.width, image.height, grid)
+        # Queued back to back, so the crops share a forward pass
+        futures = {i: batcher.submit(image.crop(boxes[i])) for i in missing}
+        for i, future in futures.items():
+            embeddings[i] = future.result()
+            cache.put(keys[i], embeddings[i])
+
+    return jsonify(embeddings=embeddings, grid=grid)
+
+
+@app.route("/stats", methods=["GET"])
+@requires_model
+def stats():
+    with batch_stats_lock:
+        report = {
+            str(size): {
+                "batches": s["batches"],
+                "images": s["images"],
+                "images_per_sec": s["images"] / s["seconds"] if s["seconds"] else 0.0,
+            }
+            for size, s in sorted(batch_stats.items())
+        }
+    return jsonify(max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS, batch_sizes=report, cache=cache.stats(),
+                   backend=backend_report, pid=os.getpid(), torch_threads=torch.get_num_threads(),
+                   model_load_seconds=model_load_seconds)
+
+
+@app.route("/health", methods=["GET"])
+def health():
+    # 503 until the model is loaded, so load balancers hold traffic during startup
+    ready = cache is not None
+    return jsonify(ready=ready), 200 if ready else 503
+
+
+if __name__ == "__main__":
+    # Development server; use serve.py for multi-process serving. The port opens
+    # right away and requests wait for the model loading in the background.
+    threading.Thread(target=load_model, name="model-loader", daemon=True).start()
+    app.run(port=5004, threaded=True)
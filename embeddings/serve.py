@@ -0,0 +1,98 @@
+"""Production entry point: N pre-forked worker processes on one listening socket.
+
+The parent loads CLIP through `main.load_model()` (quantizing and checking it
+if requested), binds the port, then forks the workers. Forking after the load
+lets every worker share the model weights copy-on-write instead of holding
+its own copy; inference never writes to them. The kernel spreads incoming
+connections across the workers accepting on the shared socket.
+
+Each worker pins torch to TORCH_THREADS_PER_WORKER intra-op threads so the
+workers do not oversubscribe the cores, and gets its own micro-batcher thread
+and its own embedding cache directory (the cache is single-writer).
+
+    EMBEDDING_WORKERS=4 python serve.py
+"""
+import os
+import signal
+import socket
+import sys
+
+import torch
+
+WORKERS = int(os.getenv("EMBEDDING_WORKERS", "2"))
+TORCH_THREADS_PER_WORKER = int(os.getenv("TORCH_THREADS_PER_WORKER", str(max(1, (os.cpu_count() or 1) // WORKERS))))
+HOST = os.getenv("EMBEDDING_HOST", "127.0.0.1")
+PORT = int(os.getenv("EMBEDDING_PORT", "5004"))
+
+# Keep the parent single-threaded while it loads and checks the model: an
+# OpenMP pool started before fork() is not usable in the children
+torch.set_num_threads(1)
+
+import main  # noqa: E402
+from embedding_cache import EmbeddingCache  # noqa: E402
+from werkzeug.serving import make_server  # noqa: E402
+
+
+def run_worker(index, listener):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    torch.set_num_threads(TORCH_THREADS_PER_WORKER)
+    # Threads do not survive fork(): give the worker its own batcher, and its own cache files
+    main.cache = EmbeddingCache(os.path.join(main.EMBEDDING_CACHE_DIR, f"worker-{index}"), main.CACHE_MODEL_NAME)
+    main.batcher = main.MicroBatcher(main.embed_images)
+
+    server = make_server(HOST, PORT, main.app, threaded=True, fd=listener.fileno())
+    print(f"🧵 Worker {index} (pid {os.getpid()}) serving with {TORCH_THREADS_PER_WORKER} torch threads")
+    server.serve_forever()
+
+
+def spawn(index, listener):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(index, listener)
+        finally:
+            os._exit(1)
+    return pid
+
+
+def serve():
+    # Load once, before forking, so the workers share the weights
+    main.load_model()
+    print(f"📦 Model loaded in {main.model_load_seconds:.1f}s")
+    listener = socket.create_server((HOST, PORT), backlog=128)
+    workers = {spawn(index, listener): index for index in range(WORKERS)}
+    print(f"🚀 Embedding service on {HOST}:{PORT} with {WORKERS} workers "
+          f"(backend {main.backend_report['backend']})")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = workers.pop(pid, None)
+        if index is None or stopping:
+            continue
+        print(f"⚠️ Worker {index} (pid {pid}) exited with status {status}, restarting")
+        workers[spawn(index, listener)] = index
+
+    listener.close()
+
+
+if __name__ == "__main__":
+    serve()
+    sys.exit(0)
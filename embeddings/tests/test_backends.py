@@ -0,0 +1,80 @@
+import copy
+
+import pytest
+import torch
+
+import backends
+from backends import check_tolerance, load_backend
+
+
+class TinyTower(torch.nn.Module):
+    """A linear stand-in for the CLIP image tower: flattened pixels -> 8-d features"""
+
+    def __init__(self, weight):
+        super().__init__()
+        self.proj = torch.nn.Linear(weight.shape[1], weight.shape[0], bias=False)
+        with torch.no_grad():
+            self.proj.weight.copy_(weight)
+
+    def get_image_features(self, pixel_values):
+        return self.proj(pixel_values.flatten(1))
+
+
+def random(*shape, seed):
+    return torch.randn(*shape, generator=torch.Generator().manual_seed(seed))
+
+
+WEIGHT = random(8, 12, seed=0)
+PIXELS = random(6, 3, 2, 2, seed=1)
+
+
+def processor(images, return_tensors):
+    assert return_tensors == "pt"
+    return {"pixel_values": PIXELS}
+
+
+def drifted(scale):
+    return TinyTower(WEIGHT + scale * random(8, 12, seed=2))
+
+
+def test_identical_model_is_within_tolerance():
+    report = check_tolerance(TinyTower(WEIGHT), TinyTower(WEIGHT), PIXELS, tolerance=1e-4)
+    assert report["ok"]
+    assert report["images"] == 6
+    assert max(report["self_drift"], report["pairwise_drift"], report["cross_drift"]) < 1e-5
+
+
+def test_drifting_model_is_reported():
+    report = check_tolerance(TinyTower(WEIGHT), drifted(0.5), PIXELS, tolerance=0.01)
+    assert not report["ok"]
+    assert max(report["self_drift"], report["pairwise_drift"], report["cross_drift"]) > 0.01
+
+
+def test_quantized_backend_falls_back_to_fp32_beyond_tolerance(monkeypatch):
+    reference = TinyTower(WEIGHT)
+    monkeypatch.setattr(backends, "quantize_int8", lambda model: drifted(0.5))
+    model, report = load_backend("int8", reference, processor, tolerance=0.01)
+    assert model is reference
+    assert (report["requested"], report["backend"], report["ok"]) == ("int8", "fp32", False)
+
+
+def test_quantized_backend_is_served_within_tolerance(monkeypatch):
+    reference = TinyTower(WEIGHT)
+    candidate = copy.deepcopy(reference)
+    monkeypatch.setattr(backends, "quantize_int8", lambda model: candidate)
+    model, report = load_backend("int8", reference, processor, tolerance=0.01)
+    assert model is candidate
+    assert (report["requested"], report["backend"], report["ok"]) == ("int8", "int8", True)
+
+
+def test_fp32_and_unknown_backends():
+    reference = TinyTower(WEIGHT)
+    assert load_backend("fp32", reference, processor) == (reference, {"backend": "fp32", "requested": "fp32"})
+    with pytest.raises(ValueError):
+        load_backend("fp16", reference, processor)
+
+
+def test_synthetic_calibration_set_is_fixed():
+    first, second = backends.calibration_images(count=3), backends.calibration_images(count=3)
+    assert [image.size for image in first] == [(256, 256)] * 3
+    assert [image.tobytes() for image in first] == [image.tobytes() for image in second]
@@ -0,0 +1,57 @@
+import threading
+import time
+
+import pytest
+
+from main import MicroBatcher
+
+
+class RecordingEmbedder:
+    """Embeds an "image" (any value) as [value]; records every batch"""
+
+    def __init__(self, fail_on=None):
+        self.batches = []
+        self.fail_on = fail_on
+        self.lock = threading.Lock()
+
+    def __call__(self, images):
+        with self.lock:
+            self.batches.append(list(images))
+        if self.fail_on in images:
+            raise RuntimeError("CUDA out of memory")
+        return [[image] for image in images]
+
+
+def test_concurrent_submissions_share_one_forward_pass():
+    embedder = RecordingEmbedder()
+    batcher = MicroBatcher(embedder, max_batch_size=16, max_wait_ms=200)
+    futures = [batcher.submit(i) for i in range(5)]
+    assert [future.result(timeout=5) for future in futures] == [[i] for i in range(5)]
+    assert embedder.batches == [[0, 1, 2, 3, 4]]
+
+
+def test_batches_are_capped_at_max_batch_size():
+    embedder = RecordingEmbedder()
+    batcher = MicroBatcher(embedder, max_batch_size=4, max_wait_ms=200)
+    futures = [batcher.submit(i) for i in range(10)]
+    assert [future.result(timeout=5) for future in futures] == [[i] for i in range(10)]
+    assert [len(batch) for batch in embedder.batches] == [4, 4, 2]
+
+
+def test_a_lone_request_waits_at_most_max_wait():
+    embedder = RecordingEmbedder()
+    batcher = MicroBatcher(embedder, max_batch_size=16, max_wait_ms=50)
+    start = time.monotonic()
+    assert batcher.submit("only").result(timeout=5) == ["only"]
+    assert 0.04 <= time.monotonic() - start < 1
+    assert embedder.batches == [["only"]]
+
+
+def test_a_failed_batch_fails_its_requests_and_the_next_batch_runs():
+    embedder = RecordingEmbedder(fail_on="bad")
+    batcher = MicroBatcher(embedder, max_batch_size=2, max_wait_ms=200)
+    failed = [batcher.submit("bad"), batcher.submit("ok")]
+    for future in failed:
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+    assert batcher.submit("next").result(timeout=5) == ["next"]